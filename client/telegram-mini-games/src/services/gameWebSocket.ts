@@ -72,7 +72,10 @@ class GameWebSocketService {
     }
 
     // Обработка глобальных событий
-    if (type === 'pong') {
+    if (type === 'ping') {
+      // Серверный heartbeat: без ответа соединение будет закрыто
+      this.send({ action: 'pong' });
+    } else if (type === 'pong') {
       console.log('Pong received');
     }
   }
@@ -1,7 +1,9 @@
 from fastapi import APIRouter, HTTPException, Depends
 from typing import List, Optional
-from sqlalchemy.orm import Session, joinedload
-from ..database_sqlite import get_db, User, NFTItem, UserNFT, Case, RouletteDraw, Transaction
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from ..database_sqlite import get_async_db, User, NFTItem, UserNFT, Case, RouletteDraw, Transaction
 from ..models_nft import NFTItemResponse, UserNFTResponse, CaseResponse
 import logging
 
@@ -9,10 +11,10 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/nft", tags=["nft"])
 
 @router.get("/cases", response_model=List[CaseResponse])
-async def get_available_cases(db: Session = Depends(get_db)):
+async def get_available_cases(db: AsyncSession = Depends(get_async_db)):
     """Получить список доступных кейсов"""
     try:
-        cases = db.query(Case).filter(Case.is_active == True).all()
+        cases = (await db.scalars(select(Case).where(Case.is_active == True))).all()
         return [CaseResponse.from_orm(case) for case in cases]
     except Exception as e:
         logger.error(f"Error fetching cases: {e}")
@@ -24,28 +26,28 @@ async def get_user_nft_collection(
     nft_type: Optional[str] = None,
     rarity: Optional[str] = None,
     equipped_only: bool = False,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получить NFT коллекцию пользователя"""
     try:
         # Проверяем существование пользователя
-        user = db.query(User).filter(User.telegram_id == user_id).first()
+        user = await db.scalar(select(User).where(User.telegram_id == user_id))
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
         # Формируем запрос с джойном к NFTItem
-        query = db.query(UserNFT).join(NFTItem).filter(UserNFT.user_id == user.id)
+        query = select(UserNFT).join(NFTItem).where(UserNFT.user_id == user.id)
         
         # Применяем фильтры
         if nft_type:
-            query = query.filter(NFTItem.nft_type == nft_type)
+            query = query.where(NFTItem.nft_type == nft_type)
         if rarity:
-            query = query.filter(NFTItem.rarity == rarity)
+            query = query.where(NFTItem.rarity == rarity)
         if equipped_only:
-            query = query.filter(UserNFT.is_equipped == True)
+            query = query.where(UserNFT.is_equipped == True)
         
         # Загружаем данные с включением NFTItem
-        user_nfts = query.options(joinedload(UserNFT.nft_item)).all()
+        user_nfts = (await db.scalars(query.options(joinedload(UserNFT.nft_item)))).unique().all()
         
         # Формируем ответ
         nfts = []
@@ -98,34 +100,34 @@ async def get_user_nft_collection(
 async def equip_nft(
     user_id: str,
     nft_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Экипировать NFT"""
     try:
         # Находим пользователя
-        user = db.query(User).filter(User.telegram_id == user_id).first()
+        user = await db.scalar(select(User).where(User.telegram_id == user_id))
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        # Находим NFT пользователя
-        user_nft = db.query(UserNFT).filter(
+        # Находим NFT пользователя (вместе с предметом: ленивая загрузка в async недоступна)
+        user_nft = await db.scalar(select(UserNFT).options(selectinload(UserNFT.nft_item)).where(
             UserNFT.id == nft_id,
             UserNFT.user_id == user.id
-        ).first()
+        ))
         
         if not user_nft:
             raise HTTPException(status_code=404, detail="NFT not found")
         
         # Снимаем экипировку с других NFT того же типа
-        db.query(UserNFT).join(NFTItem).filter(
+        await db.execute(update(UserNFT).where(
             UserNFT.user_id == user.id,
-            NFTItem.nft_type == user_nft.nft_item.nft_type,
+            UserNFT.nft_item_id.in_(select(NFTItem.id).where(NFTItem.nft_type == user_nft.nft_item.nft_type)),
             UserNFT.id != nft_id
-        ).update({"is_equipped": False})
+        ).values(is_equipped=False))
         
         # Экипируем выбранный NFT
         user_nft.is_equipped = True
-        db.commit()
+        await db.commit()
         
         return {"message": "NFT equipped successfully"}
         
@@ -139,27 +141,27 @@ async def equip_nft(
 async def unequip_nft(
     user_id: str,
     nft_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Снять экипировку NFT"""
     try:
         # Находим пользователя
-        user = db.query(User).filter(User.telegram_id == user_id).first()
+        user = await db.scalar(select(User).where(User.telegram_id == user_id))
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
         # Находим NFT пользователя
-        user_nft = db.query(UserNFT).filter(
+        user_nft = await db.scalar(select(UserNFT).where(
             UserNFT.id == nft_id,
             UserNFT.user_id == user.id
-        ).first()
+        ))
         
         if not user_nft:
             raise HTTPException(status_code=404, detail="NFT not found")
         
         # Снимаем экипировку
         user_nft.is_equipped = False
-        db.commit()
+        await db.commit()
         
         return {"message": "NFT unequipped successfully"}
         
@@ -172,20 +174,20 @@ async def unequip_nft(
 @router.get("/user/{user_id}/equipped")
 async def get_equipped_nfts(
     user_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получить экипированные NFT пользователя"""
     try:
         # Находим пользователя
-        user = db.query(User).filter(User.telegram_id == user_id).first()
+        user = await db.scalar(select(User).where(User.telegram_id == user_id))
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
         # Получаем экипированные NFT
-        equipped_nfts = db.query(UserNFT).join(NFTItem).filter(
+        equipped_nfts = (await db.scalars(select(UserNFT).join(NFTItem).where(
             UserNFT.user_id == user.id,
             UserNFT.is_equipped == True
-        ).options(joinedload(UserNFT.nft_item)).all()
+        ).options(joinedload(UserNFT.nft_item)))).unique().all()
         
         # Группируем по типу NFT
         equipped_by_type = {}
@@ -220,27 +222,27 @@ async def get_marketplace_nfts(
     max_price: Optional[int] = None,
     limit: int = 50,
     offset: int = 0,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получить NFT доступные в маркетплейсе (пока заглушка)"""
     try:
         # Пока возвращаем все NFT предметы как доступные
-        query = db.query(NFTItem)
+        query = select(NFTItem)
         
         if nft_type:
-            query = query.filter(NFTItem.nft_type == nft_type)
+            query = query.where(NFTItem.nft_type == nft_type)
         if rarity:
-            query = query.filter(NFTItem.rarity == rarity)
+            query = query.where(NFTItem.rarity == rarity)
         if min_price:
-            query = query.filter(NFTItem.stars_value >= min_price)
+            query = query.where(NFTItem.stars_value >= min_price)
         if max_price:
-            query = query.filter(NFTItem.stars_value <= max_price)
+            query = query.where(NFTItem.stars_value <= max_price)
         
-        nft_items = query.offset(offset).limit(limit).all()
+        nft_items = (await db.scalars(query.offset(offset).limit(limit))).all()
         
         return {
             "nfts": [NFTItemResponse.from_orm(item) for item in nft_items],
-            "total": query.count()
+            "total": await db.scalar(select(func.count()).select_from(query.subquery()))
         }
         
     except Exception as e:
@@ -252,19 +254,19 @@ async def get_user_nft_history(
     user_id: str,
     limit: int = 50,
     offset: int = 0,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получить историю NFT операций пользователя"""
     try:
         # Находим пользователя
-        user = db.query(User).filter(User.telegram_id == user_id).first()
+        user = await db.scalar(select(User).where(User.telegram_id == user_id))
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
         # Получаем историю рулетки (открытия кейсов)
-        roulette_history = db.query(RouletteDraw).filter(
+        roulette_history = (await db.scalars(select(RouletteDraw).where(
             RouletteDraw.user_id == user.id
-        ).order_by(RouletteDraw.created_at.desc()).offset(offset).limit(limit).all()
+        ).order_by(RouletteDraw.created_at.desc()).offset(offset).limit(limit))).all()
         
         history = []
         for draw in roulette_history:
@@ -280,7 +282,7 @@ async def get_user_nft_history(
         
         return {
             "history": history,
-            "total": db.query(RouletteDraw).filter(RouletteDraw.user_id == user.id).count()
+            "total": await db.scalar(select(func.count()).select_from(RouletteDraw).where(RouletteDraw.user_id == user.id))
         }
         
     except HTTPException:
@@ -3,13 +3,15 @@ API endpoints для платежной системы и NFT
 """
 
 from fastapi import APIRouter, HTTPException, Depends, Request, BackgroundTasks
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional, Dict, Any
 import json
 import logging
 from datetime import datetime
 
-from server.database_sqlite import get_db, User, Transaction, NFTItem as DBNFTItem, UserNFT as DBUserNFT, Case as DBCase, CaseItem, RouletteDraw
+from server.balances import complete_pending, credit, debit, transactions
+from server.database_sqlite import get_async_db, AsyncSessionLocal, User, Transaction, NFTItem as DBNFTItem, UserNFT as DBUserNFT, Case as DBCase, CaseItem, RouletteDraw
 from server.models_nft import (
     PaymentRequest, TONConnectRequest, TelegramStarsRequest, 
     NFTListResponse, PaymentResponse, CaseOpenResult, NFTItem, UserNFT
@@ -30,12 +32,12 @@ stars_service = TelegramStarsService(bot_token=settings.TELEGRAM_BOT_TOKEN)
 @router.post("/stars/create-invoice")
 async def create_stars_invoice(
     request: TelegramStarsRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Создает инвойс для оплаты Telegram Stars"""
     try:
         # Проверяем пользователя
-        user = db.query(User).filter(User.id == request.user_id).first()
+        user = await db.get(User, request.user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -56,8 +58,7 @@ async def create_stars_invoice(
             description=f"Purchase {request.amount_stars} stars"
         )
         db.add(transaction)
-        db.commit()
-        db.refresh(transaction)
+        await db.commit()
         
         # Создаем инвойс
         if hasattr(user, 'telegram_id') and user.telegram_id:
@@ -88,7 +89,7 @@ async def create_stars_invoice(
         else:
             # Отменяем транзакцию при ошибке
             transaction.status = "failed"
-            db.commit()
+            await db.commit()
             raise HTTPException(status_code=400, detail=result["error"])
             
     except Exception as e:
@@ -98,12 +99,12 @@ async def create_stars_invoice(
 @router.post("/ton/create-payment")
 async def create_ton_payment(
     request: TONConnectRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Создает платеж TON Connect"""
     try:
         # Проверяем пользователя
-        user = db.query(User).filter(User.id == request.user_id).first()
+        user = await db.get(User, request.user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -120,8 +121,7 @@ async def create_ton_payment(
             description=f"TON deposit {request.amount_ton} TON"
         )
         db.add(transaction)
-        db.commit()
-        db.refresh(transaction)
+        await db.commit()
         
         # Генерируем платежную ссылку
         payment_link = await ton_service.generate_payment_link(
@@ -146,7 +146,7 @@ async def create_ton_payment(
 async def stars_webhook(
     request: Request,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Webhook для обработки Telegram Stars платежей"""
     try:
@@ -170,12 +170,9 @@ async def stars_webhook(
             )
             
         elif payment_result["type"] == "successful_payment":
-            # Обрабатываем успешный платеж в фоне
-            background_tasks.add_task(
-                process_successful_stars_payment,
-                payment_result,
-                db
-            )
+            # Обрабатываем успешный платеж в фоне (со своей сессией: сессия запроса
+            # закрывается вместе с ответом)
+            background_tasks.add_task(process_successful_stars_payment, payment_result)
         
         return {"ok": True}
         
@@ -183,31 +180,29 @@ async def stars_webhook(
         logger.error(f"Error processing stars webhook: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-async def process_successful_stars_payment(payment_data: Dict[str, Any], db: Session):
+async def process_successful_stars_payment(payment_data: Dict[str, Any]):
     """Обрабатывает успешный Stars платеж в фоне"""
     try:
         # Извлекаем transaction_id из payload
         payload = payment_data["payload"]
         transaction_id = payload.split(":")[0]
         
-        # Находим транзакцию
-        transaction = db.query(Transaction).filter(Transaction.id == transaction_id).first()
-        if not transaction:
-            logger.error(f"Transaction {transaction_id} not found")
-            return
-        
-        # Обновляем статус транзакции
-        transaction.status = "success"
-        transaction.telegram_payment_id = payment_data["payment_id"]
-        transaction.updated_at = datetime.now()
-        
-        # Начисляем звезды пользователю
-        user = db.query(User).filter(User.id == transaction.user_id).first()
-        if user:
-            user.stars_balance += transaction.amount
+        async with AsyncSessionLocal() as db:
+            # Переводим транзакцию в success, только если она ещё ожидает оплаты:
+            # повторная доставка платежа не начислит звёзды второй раз
+            transaction = await complete_pending(
+                db, transactions.c.id == transaction_id,
+                telegram_payment_id=payment_data["payment_id"],
+                updated_at=datetime.now()
+            )
+            if not transaction:
+                logger.error(f"Transaction {transaction_id} not found or already processed")
+                return
             
-        db.commit()
-        logger.info(f"Stars payment processed: {transaction.amount} stars to user {user.id}")
+            # Начисляем звезды пользователю
+            await credit(db, transaction.user_id, transaction.amount)
+            await db.commit()
+        logger.info(f"Stars payment processed: {transaction.amount} stars to user {transaction.user_id}")
         
     except Exception as e:
         logger.error(f"Error processing stars payment: {e}")
@@ -216,7 +211,7 @@ async def process_successful_stars_payment(payment_data: Dict[str, Any], db: Ses
 async def ton_webhook(
     request: Request,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Webhook для обработки TON платежей"""
     try:
@@ -233,23 +228,24 @@ async def ton_webhook(
             transaction_id = memo.replace("deposit_", "")
             
             # Находим транзакцию
-            transaction = db.query(Transaction).filter(Transaction.id == transaction_id).first()
+            transaction = await db.get(Transaction, transaction_id)
             if transaction:
                 # Проверяем статус транзакции в блокчейне
                 tx_status = await ton_service.check_transaction_status(tx_hash)
                 
                 if tx_status["confirmed"] and tx_status["success"]:
-                    # Обновляем транзакцию
-                    transaction.status = "success"
-                    transaction.ton_transaction_hash = tx_hash
-                    transaction.updated_at = datetime.now()
+                    # Обновляем транзакцию, если она ещё ожидает (повторный webhook пропускается)
+                    completed = await complete_pending(
+                        db, transactions.c.id == transaction_id,
+                        ton_transaction_hash=tx_hash,
+                        updated_at=datetime.now()
+                    )
                     
                     # Начисляем звезды
-                    user = db.query(User).filter(User.id == transaction.user_id).first()
-                    if user:
-                        user.stars_balance += transaction.amount
+                    if completed:
+                        await credit(db, completed.user_id, completed.amount)
                     
-                    db.commit()
+                    await db.commit()
         
         return {"ok": True}
         
@@ -262,19 +258,19 @@ async def ton_webhook(
 @nft_router.get("/user/{user_id}/collection")
 async def get_user_nft_collection(
     user_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> NFTListResponse:
     """Получает коллекцию NFT пользователя"""
     try:
         # Получаем NFT пользователя
-        user_nfts = db.query(DBUserNFT).filter(DBUserNFT.user_id == user_id).all()
+        user_nfts = (await db.scalars(select(DBUserNFT).where(DBUserNFT.user_id == user_id))).all()
         
         # Подсчитываем общую стоимость
         total_value_stars = 0
         total_value_ton = 0.0
         
         for user_nft in user_nfts:
-            nft_item = db.query(DBNFTItem).filter(DBNFTItem.id == user_nft.nft_item_id).first()
+            nft_item = await db.get(DBNFTItem, user_nft.nft_item_id)
             if nft_item:
                 total_value_stars += nft_item.stars_value
                 if nft_item.ton_value:
@@ -298,10 +294,10 @@ async def get_user_nft_collection(
         raise HTTPException(status_code=500, detail=str(e))
 
 @nft_router.get("/cases")
-async def get_available_cases(db: Session = Depends(get_db)):
+async def get_available_cases(db: AsyncSession = Depends(get_async_db)):
     """Получает доступные кейсы"""
     try:
-        cases = db.query(DBCase).filter(DBCase.is_active == True).all()
+        cases = (await db.scalars(select(DBCase).where(DBCase.is_active == True))).all()
         return [
             {
                 "id": case.id,
@@ -322,16 +318,16 @@ async def get_available_cases(db: Session = Depends(get_db)):
 async def open_case(
     case_id: str,
     user_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Открывает кейс и выдает NFT"""
     try:
         # Проверяем пользователя и кейс
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.get(User, user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        case = db.query(DBCase).filter(DBCase.id == case_id, DBCase.is_active == True).first()
+        case = await db.scalar(select(DBCase).where(DBCase.id == case_id, DBCase.is_active == True))
         if not case:
             raise HTTPException(status_code=404, detail="Case not found")
         
@@ -340,13 +336,10 @@ async def open_case(
             raise HTTPException(status_code=400, detail="Insufficient balance")
         
         # Получаем предметы в кейсе
-        case_items = db.query(CaseItem).filter(CaseItem.case_id == case_id).all()
+        case_items = (await db.scalars(select(CaseItem).where(CaseItem.case_id == case_id))).all()
         if not case_items:
             raise HTTPException(status_code=400, detail="Case has no items")
         
-        # Списываем стоимость кейса
-        user.stars_balance -= case.price_stars
-        
         # Определяем выпавший предмет (упрощенная логика)
         import random
         total_chance = sum(float(item.drop_chance) for item in case_items)
@@ -364,7 +357,7 @@ async def open_case(
             selected_item = case_items[0]  # Fallback
         
         # Получаем информацию о NFT предмете
-        nft_item = db.query(DBNFTItem).filter(DBNFTItem.id == selected_item.nft_item_id).first()
+        nft_item = await db.get(DBNFTItem, selected_item.nft_item_id)
         if not nft_item:
             raise HTTPException(status_code=400, detail="NFT item not found")
         
@@ -377,21 +370,19 @@ async def open_case(
         )
         db.add(user_nft)
         
-        # Создаем транзакцию списания через прямой SQL (только с существующими полями)
-        import uuid
-        from sqlalchemy import text
-        transaction_id = str(uuid.uuid4())
-        db.execute(text("""
-            INSERT INTO transactions (id, user_id, type, amount, description, room_id, created_at)
-            VALUES (:transaction_id, :user_id, 'case_purchase', :amount, :description, NULL, datetime('now'))
-        """), {
-            'transaction_id': transaction_id,
-            'user_id': user_id,
-            'amount': -case.price_stars,
-            'description': f'Opened case: {case.name}'
-        })
-        
-        db.commit()
+        # Списываем стоимость кейса условным UPDATE вместе с транзакцией списания:
+        # параллельные открытия не уводят баланс в минус
+        remaining_balance = await debit(
+            db, user_id, case.price_stars,
+            type="case_purchase",
+            status="success",
+            description=f"Opened case: {case.name}"
+        )
+        if remaining_balance is None:
+            await db.rollback()
+            raise HTTPException(status_code=400, detail="Insufficient balance")
+        
+        await db.commit()
         
         return {
             "success": True,
@@ -406,24 +397,24 @@ async def open_case(
             },
             "total_value": float(nft_item.stars_value),
             "user_nft_id": user_nft.id,
-            "remaining_balance": user.stars_balance
+            "remaining_balance": remaining_balance
         }
         
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error opening case: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @nft_router.get("/balance/{user_id}")
 async def get_payment_balance(
     user_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получает баланс пользователя"""
     try:
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.get(User, user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -0,0 +1,123 @@
+"""
+Атомарные изменения баланса звёзд (User.stars_balance) в базе.
+
+Каждое изменение — один UPDATE с вычислением на стороне базы, а не чтение
+пользователя, изменение в Python и commit: параллельные запросы не теряют
+обновления и не уходят в минус.
+- debit() списывает только при достаточном балансе:
+  UPDATE users SET stars_balance = stars_balance - :x WHERE id = :id AND stars_balance >= :x RETURNING
+- debit_many() списывает одну сумму у нескольких игроков одним UPDATE ... WHERE id IN (...)
+  (ставки комнаты) и возвращает, у кого списание прошло.
+- credit() начисляет: stars_balance = stars_balance + :x.
+- complete_pending() переводит ожидающую транзакцию в success условным UPDATE:
+  повторный вебхук не находит строку в статусе pending и не начисляет второй раз.
+Строка transactions добавляется в той же транзакции базы, только если баланс изменён.
+Функции не делают commit — вызывающий код объединяет их с остальными изменениями.
+conditional_debit() — тот же условный UPDATE для синхронного кода (резервы ставок ledger).
+"""
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert, update
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from server.database_sqlite import Transaction, User
+
+users = User.__table__
+transactions = Transaction.__table__
+
+
+def conditional_debit(amount: int, *conditions):
+    """
+    UPDATE users: списание amount у пользователей по conditions, только если
+    stars_balance >= amount; RETURNING (id, stars_balance) списанных строк.
+    """
+    return (
+        update(users)
+        .where(*conditions, users.c.stars_balance >= amount)
+        .values(stars_balance=users.c.stars_balance - amount)
+        .returning(users.c.id, users.c.stars_balance)
+    )
+
+
+async def debit(db: AsyncSession, user_id: str, amount: int, **transaction: Any) -> Optional[int]:
+    """
+    Списывает amount, если на балансе достаточно средств.
+    Args:
+        db (AsyncSession): сессия; commit — за вызывающим кодом
+        user_id (str): ID пользователя
+        amount (int): сумма списания (> 0)
+        **transaction: поля строки transactions (type, description, status, room_id...);
+            amount строки — -amount
+    Returns:
+        Optional[int]: новый баланс; None — пользователя нет или средств недостаточно
+    """
+    row = (await db.execute(conditional_debit(amount, users.c.id == user_id))).first()
+    if row is None:
+        return None
+    await db.execute(insert(transactions).values(user_id=user_id, amount=-amount, **transaction))
+    return row.stars_balance
+
+
+async def debit_many(db: AsyncSession, user_ids: List[str], amount: int, **transaction: Any) -> Dict[str, int]:
+    """
+    Списывает amount у каждого пользователя с достаточным балансом.
+    Если списано не у всех, вызывающий код откатывает транзакцию (rollback).
+    Args:
+        db (AsyncSession): сессия; commit — за вызывающим кодом
+        user_ids (List[str]): ID пользователей
+        amount (int): сумма списания у каждого (> 0)
+        **transaction: поля строк transactions, по строке на списание
+    Returns:
+        Dict[str, int]: user_id -> новый баланс для успешных списаний
+    """
+    result = await db.execute(conditional_debit(amount, users.c.id.in_(user_ids)))
+    balances = dict(result.all())
+    if balances:
+        await db.execute(insert(transactions), [
+            {"user_id": user_id, "amount": -amount, **transaction} for user_id in balances
+        ])
+    return balances
+
+
+async def credit(db: AsyncSession, user_id: str, amount: int, **transaction: Any) -> Optional[int]:
+    """
+    Начисляет amount на баланс.
+    Args:
+        db (AsyncSession): сессия; commit — за вызывающим кодом
+        user_id (str): ID пользователя
+        amount (int): сумма начисления
+        **transaction: поля строки transactions; без полей строка не добавляется
+            (начисление по уже существующей транзакции)
+    Returns:
+        Optional[int]: новый баланс; None — пользователя нет
+    """
+    balance = await db.scalar(
+        update(users)
+        .where(users.c.id == user_id)
+        .values(stars_balance=users.c.stars_balance + amount)
+        .returning(users.c.stars_balance)
+    )
+    if balance is not None and transaction:
+        await db.execute(insert(transactions).values(user_id=user_id, amount=amount, **transaction))
+    return balance
+
+
+async def complete_pending(db: AsyncSession, *conditions, **values: Any) -> Optional[Row]:
+    """
+    Переводит одну транзакцию из pending в success.
+    Args:
+        db (AsyncSession): сессия; commit — за вызывающим кодом
+        *conditions: условия поиска транзакции (по id, платежу, хешу)
+        **values: дополнительные поля для записи (telegram_payment_id, ton_transaction_hash...)
+    Returns:
+        Optional[Row]: (id, user_id, amount) завершённой транзакции; None — нет
+            ожидающей транзакции (не найдена или уже обработана)
+    """
+    result = await db.execute(
+        update(transactions)
+        .where(*conditions, transactions.c.status == "pending")
+        .values(status="success", **values)
+        .returning(transactions.c.id, transactions.c.user_id, transactions.c.amount)
+    )
+    return result.first()
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from server import codec
+
+logger = logging.getLogger(__name__)
+
+
+class BatchSink:
+    """
+    Получатель пачек BatchWriter. write() синхронный и вызывается писателем
+    в отдельном потоке по одной пачке за раз; исключение — пачка будет повторена.
+    """
+
+    def write(self, records: List[Any]):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class BatchWriter:
+    """
+    Асинхронный пакетный писатель (write-behind) для истории игр и журнала балансов.
+    - submit() только кладёт запись в очередь: игровой цикл не ждёт базу или диск.
+    - Фоновая задача сбрасывает очередь пачками до batch_size записей, как только
+      набралась пачка или прошло flush_interval секунд; запись идёт в потоке
+      (asyncio.to_thread), чтобы синхронный драйвер не блокировал цикл событий.
+    - Ошибка записи — пачка возвращается в начало очереди и повторяется после
+      паузы; после max_attempts неудач подряд пачка выбрасывается в лог (dropped).
+      max_attempts=None — повторять без предела (записи, которые нельзя терять).
+    - Очередь ограничена max_pending: при переполнении теряются самые старые
+      записи; max_pending=None — без ограничения.
+    - on_written(batch) вызывается в цикле событий после успешной записи пачки.
+    """
+
+    def __init__(self, sink: BatchSink, batch_size: int = 200, flush_interval: float = 1.0,
+                 max_pending: Optional[int] = 100000, max_attempts: Optional[int] = 5,
+                 on_written: Optional[Callable[[List[Any]], None]] = None, name: str = "Game history"):
+        """
+        Args:
+            sink (BatchSink): куда писать пачки
+            batch_size (int): записей в одной транзакции / записи в файл
+            flush_interval (float): максимальная задержка записи, сек
+            max_pending (Optional[int]): предел очереди в памяти
+            max_attempts (Optional[int]): попыток записи одной пачки
+            on_written (Optional[Callable]): уведомление об успешно записанной пачке
+            name (str): имя писателя в логах
+        """
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.on_written = on_written
+        self.name = name
+        self._pending: Deque[Any] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._attempts = 0
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+        self.dropped = 0
+
+    def submit(self, record: Any):
+        """Ставит запись в очередь (не блокирует)."""
+        if self.max_pending is not None and len(self._pending) >= self.max_pending:
+            self._pending.popleft()
+            self.dropped += 1
+            logger.warning(f"{self.name} queue is full, dropping the oldest record")
+        self._pending.append(record)
+        self._ensure_started()
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def _ensure_started(self):
+        if self._task is not None and not self._task.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._write_lock = asyncio.Lock()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            timed_out = False
+            if len(self._pending) < self.batch_size:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    timed_out = True
+            # Полные пачки пишутся сразу, неполная — только по истечении flush_interval
+            while self._pending and (timed_out or len(self._pending) >= self.batch_size):
+                if not await self._write_batch():
+                    await asyncio.sleep(self.flush_interval)  # Пауза перед повтором
+                    break
+
+    async def _write_batch(self) -> bool:
+        """Пишет одну пачку из начала очереди; False — запись не удалась."""
+        async with self._write_lock:
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            if not batch:
+                return True
+            try:
+                await asyncio.to_thread(self.sink.write, batch)
+            except Exception as e:
+                self.failures += 1
+                self._attempts += 1
+                if self.max_attempts is not None and self._attempts >= self.max_attempts:
+                    self._attempts = 0
+                    self.dropped += len(batch)
+                    logger.error(f"{self.name} batch dropped after {self.max_attempts} attempts: {e}; "
+                                 f"records: {codec.dumps(batch)}")
+                else:
+                    self._pending.extendleft(reversed(batch))
+                    logger.warning(f"{self.name} write failed (attempt {self._attempts}): {e}")
+                return False
+            self._attempts = 0
+            self.written += len(batch)
+            self.batches += 1
+            if self.on_written is not None:
+                self.on_written(batch)
+            return True
+
+    async def flush(self):
+        """Записывает всё из очереди сейчас (до первой неудачной пачки)."""
+        if self._write_lock is None:
+            return
+        while self._pending and await self._write_batch():
+            pass
+
+    async def close(self):
+        """Останавливает фоновую задачу, дописывает очередь и закрывает получатель."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            await self.flush()
+        await asyncio.to_thread(self.sink.close)
+
+    def stats(self) -> Dict[str, int]:
+        """Счётчики для /health."""
+        return {
+            "pending": len(self._pending),
+            "written": self.written,
+            "batches": self.batches,
+            "failures": self.failures,
+            "dropped": self.dropped,
+        }
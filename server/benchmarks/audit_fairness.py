@@ -0,0 +1,356 @@
+"""
+Офлайн-аудит честности DiceGame и RPSGame методом Монте-Карло.
+
+Игры проходят через настоящие движки: кубики — DiceGame.roll_round,
+check_round_completion и prepare_reroll (переброс до победителя), RPS —
+RPSGame.player_choice и finish_game со случайными равновероятными выборами.
+Для каждого числа игроков (2-4) отчёт содержит:
+- распределение исходов и побед по местам игроков (место — порядок входа в комнату);
+- для кубиков — частоты граней и сумм, гистограмму глубины перебросов и долю
+  полных ничьих в сравнении с теоретической;
+- критерий хи-квадрат для граней, сумм, мест победителей и исходов RPS;
+- инварианты баланса: выплаты не превышают банк, остаток от деления банка
+  меньше числа победителей, при ничьей RPS ставки возвращаются полностью.
+Игры делятся на пачки и считаются в процессах multiprocessing. Узкое место —
+SHA-256 на каждый бросок, векторизовать его NumPy нельзя; если NumPy установлен,
+частоты граней считаются им.
+Код возврата 1, если какой-либо p-value меньше --alpha или нарушен инвариант.
+
+Запуск:
+    python -m server.benchmarks.audit_fairness --games 1000000 --players 2 3 4
+    python -m server.benchmarks.audit_fairness --game rps --games 200000 --json
+"""
+import argparse
+import json
+import logging
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from server.games.dice_game import DiceGame
+from server.games.rps_game import RPSGame
+from server.models import DiceResult
+from server.runtime_models import RuntimePlayer
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+BET = 100
+CHUNK = 5000
+RPS_CHOICES = ("rock", "paper", "scissors")
+
+
+# Статистика
+
+def chi2_sf(statistic: float, dof: int) -> float:
+    """
+    P(X >= statistic) для распределения хи-квадрат с dof степенями свободы
+    (регуляризованная верхняя неполная гамма-функция Q(dof/2, statistic/2)).
+    """
+    if statistic <= 0:
+        return 1.0
+    a, x = dof / 2.0, statistic / 2.0
+    log_prefix = a * math.log(x) - x - math.lgamma(a)
+    if x < a + 1:
+        # Ряд для нижней функции P, Q = 1 - P
+        term = total = 1.0 / a
+        n = a
+        while abs(term) > abs(total) * 1e-15:
+            n += 1
+            term *= x / n
+            total += term
+        return max(0.0, 1.0 - total * math.exp(log_prefix))
+    # Цепная дробь (метод Лентца) для Q
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 10000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return min(1.0, h * math.exp(log_prefix))
+
+
+def chi_square(observed: Dict[Any, int], expected: Dict[Any, float]) -> Dict[str, float]:
+    """
+    Критерий согласия хи-квадрат.
+    Args:
+        observed (Dict): наблюдаемые частоты по категориям
+        expected (Dict): вероятности категорий (сумма 1)
+    Returns:
+        Dict: statistic, dof, p_value
+    """
+    total = sum(observed.values())
+    statistic = 0.0
+    for key, probability in expected.items():
+        mean = total * probability
+        if mean > 0:
+            statistic += (observed.get(key, 0) - mean) ** 2 / mean
+    dof = len(expected) - 1
+    return {"statistic": round(statistic, 3), "dof": dof, "p_value": chi2_sf(statistic, dof)}
+
+
+def dice_sum_probabilities() -> Dict[int, float]:
+    """Распределение суммы двух честных кубиков."""
+    return {total: (6 - abs(total - 7)) / 36 for total in range(2, 13)}
+
+
+def rps_outcome_probabilities(players: int) -> Dict[str, float]:
+    """Вероятности исходов RPS при равновероятных выборах всех игроков."""
+    space = 3 ** players
+    tie = 3 / space
+    win = 3 * (2 ** players - 2) / space
+    return {"tie": tie, "win": win, "complex_tie": 1 - tie - win}
+
+
+# Симуляция (выполняется в процессах-исполнителях)
+
+def _make_players(count: int) -> List[RuntimePlayer]:
+    return [
+        RuntimePlayer(id=f"seat-{seat}", telegram_id=str(seat), username=f"seat-{seat}", balance=10 * BET, bet_amount=BET)
+        for seat in range(count)
+    ]
+
+
+def _check_payout(pool: int, winners: int, prize: int, stats: Dict[str, Any]):
+    """Инвариант баланса: выплаты не больше банка, остаток меньше числа победителей."""
+    remainder = pool - prize * winners
+    stats["house_remainder"] += remainder
+    if winners == 0 or remainder < 0 or remainder >= winners:
+        stats["violations"] += 1
+
+
+def simulate_dice(players: int, games: int) -> Dict[str, Any]:
+    """Пачка игр в кубики через DiceGame с перебросами до победителя."""
+    seats = {f"seat-{seat}": seat for seat in range(players)}
+    faces: List[int] = []
+    stats: Dict[str, Any] = {
+        "games": games, "rounds": 0, "sums": Counter(), "faces": Counter(), "depth": Counter(),
+        "sole_winner_seat": Counter(), "winners_count": Counter(), "house_remainder": 0, "violations": 0,
+    }
+    for _ in range(games):
+        game = DiceGame("audit", _make_players(players), bet_amount=BET)
+        depth = 0
+        while True:
+            stats["rounds"] += 1
+            for player_id, (dice1, dice2) in game.roll_round().items():
+                game.results[player_id] = DiceResult(
+                    player_id=player_id, player_name=player_id, dice1=dice1, dice2=dice2, total=dice1 + dice2
+                )
+                game.player_actions[player_id] = True
+                faces.append(dice1)
+                faces.append(dice2)
+                stats["sums"][dice1 + dice2] += 1
+            completion = game.check_round_completion()
+            if not completion.get("tie"):
+                break
+            depth += 1
+            game.prepare_reroll()
+
+        winners = completion["winners"]
+        stats["depth"][depth] += 1
+        stats["winners_count"][len(winners)] += 1
+        if len(winners) == 1:
+            stats["sole_winner_seat"][seats[winners[0]]] += 1
+        _check_payout(completion["total_prize"], len(winners), completion["prize_per_winner"], stats)
+
+    if numpy is not None:
+        counts = numpy.bincount(numpy.frombuffer(bytes(faces), dtype=numpy.uint8), minlength=7)
+        stats["faces"] = Counter({face: int(counts[face]) for face in range(1, 7)})
+    else:
+        stats["faces"] = Counter(faces)
+    return stats
+
+
+def simulate_rps(players: int, games: int, seed: int) -> Dict[str, Any]:
+    """Пачка игр RPS через RPSGame со случайными выборами."""
+    rng = random.Random(seed)
+    seats = {f"seat-{seat}": seat for seat in range(players)}
+    stats: Dict[str, Any] = {
+        "games": games, "outcomes": Counter(), "win_seat": Counter(),
+        "winners_count": Counter(), "house_remainder": 0, "violations": 0,
+    }
+    for _ in range(games):
+        roster = _make_players(players)
+        game = RPSGame("audit", roster, bet_amount=BET)
+        for player in roster:
+            if not game.player_choice(player.id, rng.choice(RPS_CHOICES)):
+                stats["violations"] += 1
+        result = game.finish_game([player.id for player in roster])
+        stats["outcomes"][result["result"]] += 1
+        pot = BET * players
+        if result["result"] == "win":
+            winners = result["winners"]
+            stats["winners_count"][len(winners)] += 1
+            for winner_id in winners:
+                stats["win_seat"][seats[winner_id]] += 1
+            # Как RoomManager._finish_rps_game: банк делится поровну между победителями
+            _check_payout(pot, len(winners), pot // len(winners) if winners else 0, stats)
+        elif "winners" in result:
+            stats["violations"] += 1  # ничья не должна объявлять победителей
+    return stats
+
+
+def _run_chunk(task: Tuple[str, int, int, int]) -> Dict[str, Any]:
+    game, players, games, seed = task
+    logging.disable(logging.CRITICAL)
+    if game == "dice":
+        return simulate_dice(players, games)
+    return simulate_rps(players, games, seed)
+
+
+def merge(total: Optional[Dict[str, Any]], part: Dict[str, Any]) -> Dict[str, Any]:
+    """Складывает статистику двух пачек (счётчики и числа)."""
+    if total is None:
+        return part
+    for key, value in part.items():
+        total[key] = total[key] + value
+    return total
+
+
+def simulate(game: str, players: int, games: int, workers: int, seed: int = 0) -> Dict[str, Any]:
+    """
+    Запускает games игр, деля их на пачки по процессам.
+    Args:
+        game (str): "dice" или "rps"
+        players (int): игроков в комнате
+        games (int): число игр
+        workers (int): число процессов; 1 — в текущем процессе
+        seed (int): seed генератора выборов RPS (у каждой пачки свой)
+    """
+    tasks = []
+    for index, start in enumerate(range(0, games, CHUNK)):
+        tasks.append((game, players, min(CHUNK, games - start), seed * 1_000_003 + index))
+    total = None
+    if workers <= 1 or len(tasks) == 1:
+        for task in tasks:
+            total = merge(total, _run_chunk(task))
+        return total
+    with multiprocessing.Pool(workers) as pool:
+        for part in pool.imap_unordered(_run_chunk, tasks):
+            total = merge(total, part)
+    return total
+
+
+# Отчёт
+
+def analyse_dice(players: int, stats: Dict[str, Any]) -> Dict[str, Any]:
+    sums = dice_sum_probabilities()
+    tie_rate = sum(p ** players for p in sums.values())
+    depth = stats["depth"]
+    seats = {seat: 1 / players for seat in range(players)}
+    return {
+        "games": stats["games"],
+        "rounds": stats["rounds"],
+        "reroll_depth": {str(d): depth[d] for d in sorted(depth)},
+        "max_reroll_depth": max(depth),
+        "full_tie_rate": stats["rounds"] and (stats["rounds"] - stats["games"]) / stats["rounds"],
+        "expected_full_tie_rate": tie_rate,
+        "winners_count": {str(k): v for k, v in sorted(stats["winners_count"].items())},
+        "house_remainder": stats["house_remainder"],
+        "violations": stats["violations"],
+        "tests": {
+            "faces": chi_square(stats["faces"], {face: 1 / 6 for face in range(1, 7)}),
+            "sums": chi_square(stats["sums"], sums),
+            "sole_winner_seat": chi_square(stats["sole_winner_seat"], seats),
+        },
+    }
+
+
+def analyse_rps(players: int, stats: Dict[str, Any]) -> Dict[str, Any]:
+    seats = {seat: 1 / players for seat in range(players)}
+    return {
+        "games": stats["games"],
+        "outcomes": dict(stats["outcomes"]),
+        "expected_outcomes": rps_outcome_probabilities(players),
+        "winners_count": {str(k): v for k, v in sorted(stats["winners_count"].items())},
+        "house_remainder": stats["house_remainder"],
+        "violations": stats["violations"],
+        "tests": {
+            "outcomes": chi_square(stats["outcomes"], rps_outcome_probabilities(players)),
+            "win_seat": chi_square(stats["win_seat"], seats),
+        },
+    }
+
+
+def failures(report: Dict[str, Any], alpha: float) -> List[str]:
+    """Проваленные проверки: p-value < alpha или нарушенные инварианты."""
+    failed = []
+    for name, section in report.items():
+        if section["violations"]:
+            failed.append(f"{name}: {section['violations']} invariant violations")
+        for test, result in section["tests"].items():
+            if result["p_value"] < alpha:
+                failed.append(f"{name}: {test} p={result['p_value']:.2e}")
+    return failed
+
+
+def print_report(report: Dict[str, Any], elapsed: float):
+    for name, section in report.items():
+        print(f"\n{name}: {section['games']:,} games")
+        if "rounds" in section:
+            print(f"  rounds {section['rounds']:,}, full ties {section['full_tie_rate']:.4%} "
+                  f"(expected {section['expected_full_tie_rate']:.4%}), max reroll depth {section['max_reroll_depth']}")
+            print(f"  reroll depth histogram: {section['reroll_depth']}")
+        else:
+            expected = section["expected_outcomes"]
+            print("  outcomes: " + ", ".join(
+                f"{k} {v / section['games']:.4f} (expected {expected[k]:.4f})" for k, v in sorted(section["outcomes"].items())
+            ))
+        print(f"  winners per game: {section['winners_count']}")
+        print(f"  house remainder {section['house_remainder']:,}, invariant violations {section['violations']}")
+        for test, result in section["tests"].items():
+            print(f"  chi2 {test:<17} stat {result['statistic']:10.3f}  dof {result['dof']}  p {result['p_value']:.4f}")
+    print(f"\nelapsed {elapsed:.1f}s")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--game", choices=("dice", "rps", "all"), default="all", help="какие движки проверять")
+    parser.add_argument("--players", type=int, nargs="+", default=[2, 3, 4], help="числа игроков в комнате")
+    parser.add_argument("--games", type=int, default=100_000, help="игр на каждую конфигурацию")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="процессов-исполнителей")
+    parser.add_argument("--seed", type=int, default=0, help="seed выборов RPS")
+    parser.add_argument("--alpha", type=float, default=0.001, help="порог p-value для провала проверки")
+    parser.add_argument("--json", action="store_true", help="вывести отчёт в JSON")
+    args = parser.parse_args(argv)
+    logging.disable(logging.CRITICAL)
+
+    games = ("dice", "rps") if args.game == "all" else (args.game,)
+    started = time.perf_counter()
+    report = {}
+    for game in games:
+        analyse = analyse_dice if game == "dice" else analyse_rps
+        for players in args.players:
+            stats = simulate(game, players, args.games, args.workers, args.seed)
+            report[f"{game}/{players}p"] = analyse(players, stats)
+    elapsed = time.perf_counter() - started
+
+    failed = failures(report, args.alpha)
+    if args.json:
+        print(json.dumps({"report": report, "failures": failed, "elapsed": elapsed}, indent=2))
+    else:
+        print_report(report, elapsed)
+        print("FAILED:\n  " + "\n  ".join(failed) if failed else "all checks passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
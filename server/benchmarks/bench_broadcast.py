@@ -0,0 +1,150 @@
+"""
+Бенчмарк рассылки событий комнаты (RoomManager._broadcast_room_update).
+
+Моделирует N одновременных комнат по 4 игрока; каждая комната рассылает событие,
+одновременно в полёте не более --concurrency рассылок. Задержка рассылки — время
+от вызова до получения события последним быстрым сокетом комнаты. Выводит
+p50/p99/max. Флаг --legacy включает прежнюю последовательную отправку для сравнения.
+Часть сокетов может быть "медленной" — они проверяют, что одна зависшая
+отправка не тормозит остальных игроков комнаты.
+
+Запуск:
+    python -m server.benchmarks.bench_broadcast --rooms 10000 --players 4
+    python -m server.benchmarks.bench_broadcast --rooms 10000 --slow-ratio 0.01 --legacy
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import statistics
+import time
+from datetime import datetime
+
+from server.models import GameType
+from server.room_manager import RoomManager
+from server.runtime_models import RuntimePlayer, RuntimeRoom
+
+
+class FakeWebSocket:
+    """Заглушка WebSocket: отдаёт управление циклу событий при каждой отправке."""
+
+    def __init__(self, room_id: str, delay: float, on_delivery):
+        self.room_id = room_id
+        self.delay = delay
+        self.on_delivery = on_delivery
+
+    async def send_text(self, data: str):
+        await asyncio.sleep(self.delay)
+        if not self.delay:
+            self.on_delivery(self.room_id)
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def _percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def build_manager(rooms: int, players: int, slow_ratio: float, slow_delay: float, on_delivery):
+    manager = RoomManager()
+    fast_sockets = {}
+    for r in range(rooms):
+        room_id = f"r{r}"
+        room = manager.rooms[room_id] = RuntimeRoom(
+            id=room_id,
+            game_type=GameType.DICE,
+            bet_amount=100,
+            created_at=datetime.now(),
+        )
+        fast_sockets[room_id] = 0
+        for i in range(players):
+            player_id = f"{room_id}-p{i}"
+            manager._add_player(room, RuntimePlayer(
+                id=player_id,
+                telegram_id=player_id,
+                username=f"user{i}",
+                balance=1000,
+                bet_amount=100,
+            ))
+            delay = slow_delay if random.random() < slow_ratio else 0.0
+            fast_sockets[room_id] += 0 if delay else 1
+            connection = await manager.connect_player(player_id, FakeWebSocket(room_id, delay, on_delivery))
+            connection.send_timeout = 0.25
+    return manager, fast_sockets
+
+
+def use_legacy_broadcast(manager: RoomManager):
+    """Прежнее поведение: кодирование и отправка каждому игроку по очереди, без таймаута."""
+    async def broadcast(room_id, update_type, data):
+        room = manager.rooms[room_id]
+        message = {"type": update_type, "room_id": room_id, "data": data, "room": room.to_dict()}
+        for player in room.players:
+            if player.id in manager.player_connections:
+                try:
+                    await manager.player_connections[player.id].websocket.send_text(json.dumps(message, default=str))
+                except Exception:
+                    await manager.disconnect_player(player.id)
+    manager._broadcast_room_update = broadcast
+
+
+async def run(rooms: int, players: int, slow_ratio: float, slow_delay: float, concurrency: int, legacy: bool):
+    started_at = {}
+    remaining = {}
+    delivered = {}
+    latencies = []
+
+    def on_delivery(room_id: str):
+        remaining[room_id] -= 1
+        if remaining[room_id] == 0:
+            latencies.append(time.perf_counter() - started_at[room_id])
+            delivered[room_id].set()
+
+    manager, fast_sockets = await build_manager(rooms, players, slow_ratio, slow_delay, on_delivery)
+    remaining.update(fast_sockets)
+    delivered.update((room_id, asyncio.Event()) for room_id in fast_sockets)
+    if legacy:
+        use_legacy_broadcast(manager)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def broadcast(room_id: str):
+        async with semaphore:
+            started_at[room_id] = time.perf_counter()
+            await manager._broadcast_room_update(room_id, "player_ready", {"player_id": f"{room_id}-p0", "ready_count": 1})
+            # Держим слот, пока событие не доставлено, чтобы в полёте было не больше concurrency рассылок
+            if remaining[room_id] > 0:
+                await delivered[room_id].wait()
+
+    wall_started = time.perf_counter()
+    await asyncio.gather(*(broadcast(room_id) for room_id in list(manager.rooms)))
+    wall = time.perf_counter() - wall_started
+
+    mode = "legacy" if legacy else "queued fan-out"
+    print(f"mode={mode} rooms={rooms} players/room={players} slow_ratio={slow_ratio} concurrency={concurrency}")
+    print(f"wall time:  {wall * 1000:.1f} ms")
+    print(f"p50:        {statistics.median(latencies) * 1000:.2f} ms")
+    print(f"p99:        {_percentile(latencies, 99) * 1000:.2f} ms")
+    print(f"max:        {max(latencies) * 1000:.2f} ms")
+
+    for connection in list(manager.player_connections.values()):
+        await connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=10000)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--slow-ratio", type=float, default=0.0, help="доля медленных сокетов")
+    parser.add_argument("--slow-delay", type=float, default=5.0, help="задержка медленного сокета, сек")
+    parser.add_argument("--concurrency", type=int, default=1000, help="рассылок в полёте одновременно")
+    parser.add_argument("--legacy", action="store_true", help="последовательная отправка без таймаута")
+    args = parser.parse_args()
+    logging.getLogger("server.realtime.connection").setLevel(logging.ERROR)
+    asyncio.run(run(args.rooms, args.players, args.slow_ratio, args.slow_delay, args.concurrency, args.legacy))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Микробенчмарк JSON-кодеков (server.codec) на типичных нагрузках.
+
+Нагрузки:
+- room_event — событие комнаты с патчем (как в _broadcast_room_update);
+- room_snapshot — полный снимок комнаты на 4 игрока (room_snapshot / REST);
+- news — ответ /api/news на 50 новостей с кириллицей.
+Для каждого установленного бэкенда (stdlib, orjson, msgspec) выводит число
+операций кодирования и декодирования в секунду и ускорение относительно stdlib.
+
+Запуск:
+    python -m server.benchmarks.bench_codec --seconds 1
+"""
+import argparse
+import logging
+import time
+from datetime import datetime, timedelta
+
+from server.codec import CODECS
+from server.models import GameType, PlayerStatus
+from server.runtime_models import RuntimePlayer, RuntimeRoom
+
+
+def room_snapshot() -> dict:
+    room = RuntimeRoom(id="a1b2c3d4", game_type=GameType.DICE, bet_amount=100, created_at=datetime.now())
+    for i in range(4):
+        room.players.append(RuntimePlayer(id=f"player-{i}", telegram_id=str(100000000 + i), username=f"Игрок {i}",
+                                          balance=900, status=PlayerStatus.READY, bet_amount=100, is_creator=i == 0))
+    room.pot = 400
+    room.version = 7
+    return room.to_dict()
+
+
+def room_event() -> dict:
+    return {
+        "type": "player_ready",
+        "room_id": "a1b2c3d4",
+        "data": {"player_id": "player-2", "ready_count": 3},
+        "base_version": 6,
+        "version": 7,
+        "patch": [
+            {"op": "replace", "path": "/players/2/status", "value": PlayerStatus.READY},
+            {"op": "replace", "path": "/players/2/balance", "value": 900},
+            {"op": "replace", "path": "/pot", "value": 300},
+        ],
+    }
+
+
+def news() -> dict:
+    now = datetime.now()
+    return {
+        "success": True,
+        "news": [
+            {
+                "id": f"tg_channel_{i}",
+                "title": f"Новость {i}: обновление подарков и NFT в Telegram",
+                "text": "Telegram представил новые коллекционные подарки. " * 6,
+                "link": f"https://t.me/channel/{i}",
+                "date": (now - timedelta(minutes=i)).isoformat(),
+                "source": "Telegram News",
+                "category": "telegram",
+                "channel": "telegram_news",
+            }
+            for i in range(50)
+        ],
+        "total": 50,
+        "category": "all",
+    }
+
+
+def rate(func, payload, seconds: float) -> float:
+    count, started = 0, time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(100):
+            func(payload)
+        count += 100
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=1.0, help="длительность замера одной операции")
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    codecs = []
+    for name, factory in CODECS.items():
+        try:
+            codecs.append(factory())
+        except ImportError:
+            print(f"{name}: не установлен, пропущен")
+    codecs.sort(key=lambda codec: codec.name != "stdlib")
+
+    for payload_name, payload in (("room_event", room_event()), ("room_snapshot", room_snapshot()), ("news", news())):
+        size = len(codecs[0].dumps_bytes(payload))
+        print(f"\n{payload_name} ({size} bytes)")
+        baseline = None
+        for codec in codecs:
+            encoded = codec.dumps(payload)
+            encode = rate(codec.dumps, payload, args.seconds)
+            decode = rate(codec.loads, encoded, args.seconds)
+            baseline = baseline or (encode, decode)
+            print(f"  {codec.name:<8} encode {encode:11,.0f}/s (x{encode / baseline[0]:4.1f})   "
+                  f"decode {decode:11,.0f}/s (x{decode / baseline[1]:4.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Бенчмарк влияния запросов к базе на задержку WebSocket-событий.
+
+Тикер каждые --tick мс отправляет "событие комнаты" и меряет, на сколько позже
+срока он проснулся, — так же опаздывает рассылка игрокам, когда цикл событий занят.
+Одновременно --clients клиентов шлют REST-запросы: баланс пользователя и сумма
+его транзакций. Режим sync — прежние обработчики: синхронная Session прямо
+в async-обработчике блокирует цикл на время запроса. Режим async — AsyncSession
+(aiosqlite / asyncpg): цикл событий свободен, пока база отвечает.
+Выводит p50/p99/max опоздания тикера и число обработанных запросов.
+
+Запуск:
+    python -m server.benchmarks.bench_db_latency --mode sync
+    python -m server.benchmarks.bench_db_latency --mode async --clients 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from server.database_sqlite import Base, Transaction, User, async_database_url
+
+
+def _percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def populate(url: str, users: int, transactions: int):
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+    with engine.begin() as connection:
+        connection.execute(insert(User), [
+            {"id": user_id, "telegram_id": str(i), "username": f"user{i}", "stars_balance": 1000}
+            for i, user_id in enumerate(user_ids)
+        ])
+        connection.execute(insert(Transaction), [
+            {"id": str(uuid.uuid4()), "user_id": user_ids[i % users], "type": "bet", "amount": -10,
+             "payment_method": "internal", "status": "success"}
+            for i in range(transactions)
+        ])
+    engine.dispose()
+
+
+def _balance_query(telegram_id: str):
+    return (
+        select(User.stars_balance, func.coalesce(func.sum(Transaction.amount), 0))
+        .outerjoin(Transaction, Transaction.user_id == User.id)
+        .where(User.telegram_id == telegram_id)
+        .group_by(User.id)
+    )
+
+
+async def run(mode: str, users: int, transactions: int, clients: int, duration: float, tick: float):
+    with tempfile.TemporaryDirectory() as directory:
+        url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        populate(url, users, transactions)
+
+        if mode == "sync":
+            engine = create_engine(url)
+            sessions = sessionmaker(engine)
+
+            async def request(telegram_id: str):
+                with sessions() as db:
+                    db.execute(_balance_query(telegram_id)).one()
+        else:
+            engine = create_async_engine(async_database_url(url))
+            sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+            async def request(telegram_id: str):
+                async with sessions() as db:
+                    (await db.execute(_balance_query(telegram_id))).one()
+
+        deadline = time.perf_counter() + duration
+        lags = []
+        served = 0
+
+        async def ticker():
+            interval = tick / 1000
+            expected = time.perf_counter() + interval
+            while time.perf_counter() < deadline:
+                await asyncio.sleep(max(0.0, expected - time.perf_counter()))
+                now = time.perf_counter()
+                lags.append(now - expected)
+                expected = now + interval
+
+        async def client(index: int):
+            nonlocal served
+            while time.perf_counter() < deadline:
+                await request(str((index * 7919 + served) % users))
+                served += 1
+                await asyncio.sleep(0)
+
+        await asyncio.gather(ticker(), *(client(i) for i in range(clients)))
+        if mode == "sync":
+            engine.dispose()
+        else:
+            await engine.dispose()
+
+    print(f"mode={mode} clients={clients} users={users} transactions={transactions} tick={tick} ms")
+    print(f"requests:   {served} ({served / duration:.0f}/s)")
+    print(f"lag p50:    {statistics.median(lags) * 1000:.2f} ms")
+    print(f"lag p99:    {_percentile(lags, 99) * 1000:.2f} ms")
+    print(f"lag max:    {max(lags) * 1000:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("sync", "async"), default="async")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--transactions", type=int, default=200000)
+    parser.add_argument("--clients", type=int, default=20, help="одновременных REST-клиентов")
+    parser.add_argument("--duration", type=float, default=5.0, help="длительность замера, сек")
+    parser.add_argument("--tick", type=float, default=10.0, help="период событий комнаты, мс")
+    args = parser.parse_args()
+    asyncio.run(run(args.mode, args.users, args.transactions, args.clients, args.duration, args.tick))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Пропускная способность генерации кубиков (server.games.fair_dice), бросков в секунду.
+
+Варианты:
+- legacy — прежний DiceGame._generate_dice_for_player: hexdigest и int(hex, 16) % 6;
+- reference — эталон roll_dice, один игрок за вызов;
+- round — roll_round, все игроки раунда одной пачкой (как DiceGame.roll_round);
+- simulation — roll_rounds, много раундов подряд для симуляций.
+Бросок — пара кубиков одного игрока.
+
+Запуск:
+    python -m server.benchmarks.bench_dice --players 4 --seconds 1
+"""
+import argparse
+import hashlib
+import time
+
+from server.games.fair_dice import roll_dice, roll_round, roll_rounds
+
+SEED = "1700000000000000-1a2b3c4d-5e6f7a8b"
+NONCE = "0123456789abcdef"
+
+
+def legacy_roll(player_id: str, round_num: int):
+    digest = hashlib.sha256(f"{SEED}-{NONCE}-{player_id}-round{round_num}".encode("utf-8")).hexdigest()
+    return int(digest[:2], 16) % 6 + 1, int(digest[2:4], 16) % 6 + 1
+
+
+def rate(step, rolls_per_step: int, seconds: float) -> float:
+    """Бросков в секунду: step() выполняется, пока не пройдёт seconds."""
+    count, started = 0, time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        step()
+        count += rolls_per_step
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", type=int, default=4, help="игроков в раунде")
+    parser.add_argument("--rounds", type=int, default=1000, help="раундов за вызов roll_rounds")
+    parser.add_argument("--seconds", type=float, default=1.0, help="длительность замера варианта")
+    args = parser.parse_args()
+
+    players = [f"player-{i}" for i in range(args.players)]
+
+    def legacy():
+        for player_id in players:
+            legacy_roll(player_id, 1)
+
+    def reference():
+        for player_id in players:
+            roll_dice(SEED, NONCE, player_id, 1)
+
+    results = [
+        ("legacy", rate(legacy, len(players), args.seconds)),
+        ("reference", rate(reference, len(players), args.seconds)),
+        ("round", rate(lambda: roll_round(SEED, NONCE, players, 1), len(players), args.seconds)),
+        ("simulation", rate(lambda: roll_rounds(SEED, NONCE, players, args.rounds), len(players) * args.rounds, args.seconds)),
+    ]
+    baseline = results[0][1]
+    print(f"players={args.players} rounds/call={args.rounds}")
+    for name, rolls in results:
+        print(f"  {name:<11} {rolls:12,.0f} rolls/s (x{rolls / baseline:4.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Бенчмарк частых запросов API до и после миграции с индексами (0001 -> 0002).
+
+Создаёт SQLite-базу миграцией 0001 (схема без индексов), наполняет её:
+--users пользователей, --transactions транзакций, --rooms комнат по 4 участника,
+по 2 NFT на пользователя и кейсы с предметами. Замеряет запросы (медиана
+по --repeat случайным параметрам), применяет миграцию 0002 и замеряет снова.
+
+Запуск:
+    python -m server.benchmarks.bench_indexes
+    python -m server.benchmarks.bench_indexes --users 10000 --transactions 100000 --rooms 10000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, text
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+
+CHUNK = 50000
+
+
+def migration_config(url: str) -> Config:
+    """Конфигурация alembic для явно заданной базы (без настройки логирования)."""
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("sqlalchemy.url", url)
+    config.attributes["configure_logger"] = False
+    return config
+
+
+def _insert(connection, table: str, rows: List[Dict]):
+    columns = list(rows[0])
+    statement = text(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(':' + c for c in columns)})")
+    for start in range(0, len(rows), CHUNK):
+        connection.execute(statement, rows[start:start + CHUNK])
+
+
+def seed(engine, users: int, transactions: int, rooms: int, cases: int) -> Dict[str, List[str]]:
+    """Наполняет базу; возвращает ключи для параметров запросов."""
+    now = datetime.utcnow()
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+    room_ids = [str(uuid.uuid4())[:8] + str(i) for i in range(rooms)]
+    case_ids = [str(uuid.uuid4()) for _ in range(cases)]
+    payment_ids, hashes = [], []
+    with engine.begin() as connection:
+        _insert(connection, "users", [
+            {"id": user_id, "telegram_id": str(i), "stars_balance": 1000, "total_games": 0, "wins": 0}
+            for i, user_id in enumerate(user_ids)
+        ])
+        rows = []
+        for i in range(transactions):
+            payment = ton_hash = None
+            if i % 10 == 0:
+                payment = f"pay-{i}"
+                payment_ids.append(payment)
+            elif i % 10 == 1:
+                ton_hash = f"ton-{i}"
+                hashes.append(ton_hash)
+            rows.append({
+                "id": str(uuid.uuid4()), "user_id": random.choice(user_ids), "type": "bet", "amount": -10,
+                "status": "success", "telegram_payment_id": payment, "ton_transaction_hash": ton_hash,
+                "created_at": now - timedelta(seconds=i),
+            })
+            if len(rows) == CHUNK:
+                _insert(connection, "transactions", rows)
+                rows = []
+        if rows:
+            _insert(connection, "transactions", rows)
+
+        # Открыта 1% комнат, остальные завершены
+        _insert(connection, "game_rooms", [
+            {"id": room_id, "game_type": "dice", "status": "waiting" if i % 100 == 0 else "finished",
+             "bet_amount": 10, "creator_id": random.choice(user_ids),
+             "created_at": now, "expires_at": now + timedelta(minutes=10 if i % 200 == 0 else -10)}
+            for i, room_id in enumerate(room_ids)
+        ])
+        _insert(connection, "game_participations", [
+            {"id": str(uuid.uuid4()), "room_id": room_id, "user_id": random.choice(user_ids),
+             "joined_at": now - timedelta(seconds=i)}
+            for i, room_id in enumerate(room_id for room_id in room_ids for _ in range(4))
+        ])
+        item_id = str(uuid.uuid4())
+        _insert(connection, "nft_items", [
+            {"id": item_id, "name": "item", "image_url": "", "rarity": "common", "nft_type": "avatar", "stars_value": 1}
+        ])
+        _insert(connection, "user_nfts", [
+            {"id": str(uuid.uuid4()), "user_id": user_id, "nft_item_id": item_id, "acquired_from": "case_battle",
+             "is_equipped": k == 0}
+            for user_id in user_ids for k in range(2)
+        ])
+        _insert(connection, "cases", [{"id": case_id, "name": "case", "image_url": "", "price_stars": 10}
+                                      for case_id in case_ids])
+        _insert(connection, "case_items", [
+            {"id": str(uuid.uuid4()), "case_id": case_id, "nft_item_id": item_id, "drop_chance": 0.1,
+             "min_value": 1, "max_value": 10}
+            for case_id in case_ids for _ in range(10)
+        ])
+    return {"user": user_ids, "room": room_ids, "case": case_ids, "payment": payment_ids, "hash": hashes}
+
+
+# (название, SQL, ключ параметра) — те же фильтры, что в обработчиках API
+QUERIES: List[Tuple[str, str, str]] = [
+    ("open rooms", "SELECT * FROM game_rooms WHERE status = 'waiting' AND expires_at > :now", ""),
+    ("room participants", "SELECT * FROM game_participations WHERE room_id = :key", "room"),
+    ("user recent games", "SELECT * FROM game_participations WHERE user_id = :key "
+                          "ORDER BY joined_at DESC LIMIT 10", "user"),
+    ("user transactions", "SELECT * FROM transactions WHERE user_id = :key ORDER BY created_at DESC LIMIT 20", "user"),
+    ("stars payment", "SELECT * FROM transactions WHERE telegram_payment_id = :key", "payment"),
+    ("ton payment", "SELECT * FROM transactions WHERE ton_transaction_hash = :key", "hash"),
+    ("user nfts", "SELECT * FROM user_nfts WHERE user_id = :key", "user"),
+    ("equipped nfts", "SELECT * FROM user_nfts WHERE user_id = :key AND is_equipped = 1", "user"),
+    ("case items", "SELECT * FROM case_items WHERE case_id = :key", "case"),
+]
+
+
+def measure(engine, keys: Dict[str, List[str]], repeat: int) -> Dict[str, float]:
+    """Медианное время каждого запроса, мс."""
+    results = {}
+    with engine.connect() as connection:
+        for name, sql, key in QUERIES:
+            statement = text(sql)
+            timings = []
+            for _ in range(repeat):
+                params = {"now": datetime.utcnow()} if not key else {"key": random.choice(keys[key])}
+                started = time.perf_counter()
+                connection.execute(statement, params).fetchall()
+                timings.append(time.perf_counter() - started)
+            results[name] = statistics.median(timings) * 1000
+    return results
+
+
+def run(users: int, transactions: int, rooms: int, cases: int, repeat: int,
+        report: Callable[[str], None] = print) -> Tuple[Dict[str, float], Dict[str, float]]:
+    with tempfile.TemporaryDirectory() as directory:
+        url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        config = migration_config(url)
+        command.upgrade(config, "0001")
+        engine = create_engine(url)
+
+        started = time.perf_counter()
+        keys = seed(engine, users, transactions, rooms, cases)
+        report(f"seeded users={users} transactions={transactions} rooms={rooms} "
+               f"in {time.perf_counter() - started:.1f} s")
+
+        before = measure(engine, keys, repeat)
+        started = time.perf_counter()
+        command.upgrade(config, "head")
+        report(f"migration 0002 in {time.perf_counter() - started:.1f} s")
+        with engine.connect() as connection:
+            connection.execute(text("ANALYZE"))
+        after = measure(engine, keys, repeat)
+        engine.dispose()
+
+    report(f"{'query':<20} {'before, ms':>11} {'after, ms':>10} {'speedup':>8}")
+    for name in before:
+        report(f"{name:<20} {before[name]:>11.3f} {after[name]:>10.3f} {before[name] / after[name]:>7.0f}x")
+    return before, after
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--transactions", type=int, default=1000000)
+    parser.add_argument("--rooms", type=int, default=100000)
+    parser.add_argument("--cases", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50, help="повторов каждого запроса")
+    args = parser.parse_args()
+    run(args.users, args.transactions, args.rooms, args.cases, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Число SQL-запросов на один запрос к API игр с базой (game_api, /api/dice, /api/rps).
+
+Для комнаты из --players игроков проходит весь путь: создание, вход, старт,
+завершение, список комнат, статистика игрока, раунды Database-игр и статусы
+комнат. Считаются обращения к курсору DBAPI (executemany — одно обращение),
+то есть реальные round trip к базе. Без N+1 число чтений не растёт с числом
+игроков и комнат: сравните --players 2 и --players 4.
+
+Запуск:
+    python -m server.benchmarks.bench_queries --players 4
+"""
+import argparse
+import asyncio
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from server import game_api
+from server.database_sqlite import Base, GameParticipation, GameRoom, User
+from server.games import database_dice, database_rps
+
+
+class QueryCounter:
+    """Счётчик обращений к базе; statements — тексты запросов для отладки."""
+
+    def __init__(self):
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def reads(self) -> int:
+        """SELECT-запросы: именно они размножаются при N+1"""
+        return sum(statement.lstrip().upper().startswith("SELECT") for statement in self.statements)
+
+
+@contextmanager
+def count_queries(engine):
+    """
+    Считает SQL-запросы движка внутри блока.
+    Args:
+        engine: Engine или AsyncEngine
+    """
+    engine = getattr(engine, "sync_engine", engine)
+    counter = QueryCounter()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter.statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+async def create_database():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    return engine, async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def seed_room(sessions, room_id: str, game_type: str, players: int, bet: int = 10) -> List[str]:
+    """Комната в статусе in_progress с игроками; возвращает их telegram_id."""
+    telegram_ids = [f"{room_id}-tg{i}" for i in range(players)]
+    async with sessions() as db:
+        await db.execute(insert(User), [
+            {"id": f"{room_id}-u{i}", "telegram_id": telegram_id, "username": f"user{i}", "stars_balance": 1000}
+            for i, telegram_id in enumerate(telegram_ids)
+        ])
+        db.add(GameRoom(
+            id=room_id, game_type=game_type, status="in_progress", max_players=players,
+            current_players=players, bet_amount=bet, creator_id=f"{room_id}-u0", prize_pool=bet * players,
+            expires_at=datetime.utcnow() + timedelta(minutes=10)
+        ))
+        await db.execute(insert(GameParticipation), [
+            {"room_id": room_id, "user_id": f"{room_id}-u{i}"} for i in range(players)
+        ])
+        await db.commit()
+    return telegram_ids
+
+
+async def measure(players: int, rooms: int) -> Dict[str, QueryCounter]:
+    engine, sessions = await create_database()
+    counts: Dict[str, QueryCounter] = {}
+
+    async def call(name: str, handler, *args):
+        async with sessions() as db:
+            with count_queries(engine) as counter:
+                result = await handler(*args, db=db)
+        counts[name] = counter
+        return result
+
+    async with sessions() as db:
+        await db.execute(insert(User), [
+            {"id": f"u{i}", "telegram_id": f"tg{i}", "username": f"user{i}", "stars_balance": 1000}
+            for i in range(players)
+        ])
+        await db.commit()
+
+    room_id = (await call("create-room", game_api.create_game_room, "dice", 10, players, "tg0"))["room_id"]
+    for i in range(1, players):
+        await call("join-room", game_api.join_game_room, room_id, f"tg{i}")
+    await call("start-game", game_api.start_game, room_id, "tg0")
+    await call("finish-game", game_api.finish_game, room_id, "tg1", {f"u{i}": {"total": i} for i in range(players)})
+    await call("user-stats", game_api.get_user_stats, "tg1")
+
+    for r in range(rooms):
+        await call("create-room", game_api.create_game_room, "dice", 10, players, f"tg{r % players}")
+    await call(f"rooms ({rooms} open)", game_api.get_available_rooms)
+
+    await seed_room(sessions, "dice1", "dice", players)
+    await call("dice play", database_dice.play_dice_game, "dice1")
+    await call("dice status", database_dice.get_dice_room_status, "dice1")
+
+    choices = ["rock", "scissors"] * players
+    telegram_ids = await seed_room(sessions, "rps1", "rps", players)
+    await call("rps play", database_rps.play_rps_game, "rps1",
+               {telegram_id: choices[i] for i, telegram_id in enumerate(telegram_ids)})
+    await call("rps status", database_rps.get_rps_room_status, "rps1")
+
+    await engine.dispose()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--rooms", type=int, default=20, help="открытых комнат в списке")
+    args = parser.parse_args()
+    counts = asyncio.run(measure(args.players, args.rooms))
+    print(f"players={args.players}")
+    for name, counter in counts.items():
+        print(f"{name:<18} {counter.count:>4} queries ({counter.reads} reads)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Бенчмарк памяти и сериализации моделей комнат.
+
+Создаёт --rooms простаивающих комнат (по --players игрока, как после создания
+и присоединения) в двух представлениях: pydantic-модели Room/Player и слотовые
+RuntimeRoom/RuntimePlayer игрового цикла. Память меряется через tracemalloc,
+скорость сериализации — как в рассылке: словарь комнаты + JSON-кодирование.
+Последней строкой выводится память RoomManager на комнату (с актором, таймером
+ожидания и снимком для дельт).
+
+Запуск:
+    python -m server.benchmarks.bench_room_memory --rooms 100000
+"""
+import argparse
+import asyncio
+import gc
+import logging
+import time
+import tracemalloc
+from datetime import datetime
+
+from server.models import GameType, Player, Room
+from server.realtime.broadcast import BroadcastEngine
+from server.room_manager import RoomManager
+from server.runtime_models import RuntimePlayer, RuntimeRoom
+
+
+def build(model_room, model_player, rooms: int, players: int):
+    now = datetime.now()
+    return [
+        model_room(
+            id=f"r{r}",
+            game_type=GameType.DICE,
+            bet_amount=100,
+            created_at=now,
+            players=[
+                model_player(id=f"r{r}-p{i}", telegram_id=f"tg{r}-{i}", username=f"user{i}",
+                             balance=1000, bet_amount=100, is_creator=i == 0)
+                for i in range(players)
+            ],
+        )
+        for r in range(rooms)
+    ]
+
+
+def measure_memory(factory):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = factory()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return objects, used
+
+
+def measure_encode(rooms, to_dict, repeat: int = 3) -> float:
+    encoder = BroadcastEngine()
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for room in rooms:
+            encoder.encode(to_dict(room))
+        best = min(best, time.perf_counter() - started)
+    return best / len(rooms) * 1e6
+
+
+async def manager_memory(rooms: int, players: int) -> int:
+    manager = RoomManager()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for r in range(rooms):
+        room = await manager.create_room(f"r{r}-p0", f"tg{r}", "user0", GameType.DICE, 100)
+        for i in range(1, players):
+            await manager.join_room(f"r{r}-p{i}", f"tg{r}-{i}", f"user{i}", room.id)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=100000)
+    parser.add_argument("--players", type=int, default=2)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    results = {}
+    for name, model_room, model_player, to_dict in (
+        ("pydantic", Room, Player, lambda room: room.dict()),
+        ("runtime", RuntimeRoom, RuntimePlayer, lambda room: room.to_dict()),
+    ):
+        rooms, used = measure_memory(lambda: build(model_room, model_player, args.rooms, args.players))
+        encode_us = measure_encode(rooms[:20000], to_dict)
+        results[name] = (used, encode_us)
+        print(f"{name:<9} memory={used / 2**20:8.1f} MiB  per room={used / args.rooms:7.0f} B  "
+              f"dict+encode={encode_us:6.2f} us/room")
+        del rooms
+
+    (pyd_mem, pyd_enc), (rt_mem, rt_enc) = results["pydantic"], results["runtime"]
+    print(f"runtime vs pydantic: memory x{pyd_mem / rt_mem:.2f} smaller, serialization x{pyd_enc / rt_enc:.2f} faster")
+
+    used = asyncio.run(manager_memory(args.rooms, args.players))
+    print(f"RoomManager: {used / 2**20:.1f} MiB for {args.rooms} idle rooms ({used / args.rooms:.0f} B per room)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Бенчмарк расчёта завершённой игры: задержка settle + commit в зависимости от числа игроков.
+
+Для каждого размера комнаты из --players рассчитывается --games комнат двумя
+способами на SQLite-файле (движок из server.db_engine):
+- legacy — прежний расчёт через ORM: по запросу участия и пользователя на
+  каждого игрока, изменение объектов и Transaction по одному;
+- bulk — server.settlement.settle_room: фиксированный набор executemany-запросов.
+Выводит медиану и p99 задержки расчёта одной комнаты, мс.
+
+Запуск:
+    python -m server.benchmarks.bench_settlement
+    python -m server.benchmarks.bench_settlement --players 2 4 8 16 32 64 --games 200
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, sessionmaker
+
+from server.database_sqlite import Base, GameParticipation, GameRoom, Transaction, User
+from server.db_engine import create_db_engine
+from server.settlement import Payout, settle_room
+
+
+def _percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def seed(sessions, games: int, players: int, prefix: str) -> List[str]:
+    room_ids = [f"{prefix}-{g}" for g in range(games)]
+    with sessions() as db:
+        db.execute(insert(User), [
+            {"id": f"{prefix}-u{i}", "telegram_id": f"{prefix}-tg{i}", "stars_balance": 1000, "total_games": 0, "wins": 0}
+            for i in range(players)
+        ])
+        db.execute(insert(GameRoom), [
+            {"id": room_id, "game_type": "dice", "status": "in_progress", "bet_amount": 10,
+             "creator_id": f"{prefix}-u0", "prize_pool": 10 * players}
+            for room_id in room_ids
+        ])
+        db.execute(insert(GameParticipation), [
+            {"room_id": room_id, "user_id": f"{prefix}-u{i}"} for room_id in room_ids for i in range(players)
+        ])
+        db.commit()
+    return room_ids
+
+
+def legacy_settle(db: Session, room_id: str, players: int, prize: int):
+    """Прежний расчёт: запросы и объекты ORM на каждого игрока."""
+    prefix = room_id.rsplit("-", 1)[0]
+    room = db.query(GameRoom).filter(GameRoom.id == room_id).first()
+    for i in range(players):
+        user_id = f"{prefix}-u{i}"
+        participation = db.query(GameParticipation).filter(
+            GameParticipation.room_id == room_id, GameParticipation.user_id == user_id
+        ).first()
+        user = db.query(User).filter(User.id == user_id).first()
+        user.total_games += 1
+        participation.player_data = {"total": i}
+        if i == 0:
+            participation.position = 1
+            participation.prize_won = prize
+            user.wins += 1
+            user.stars_balance += prize
+            db.add(Transaction(user_id=user.id, type="game_win", amount=prize, room_id=room_id))
+        else:
+            participation.position = 2
+            participation.prize_won = 0
+    room.status = "finished"
+    room.finished_at = datetime.utcnow()
+    room.game_data = {"winner_ids": [f"{prefix}-u0"]}
+    db.commit()
+
+
+def bulk_settle(db: Session, room_id: str, players: int, prize: int):
+    prefix = room_id.rsplit("-", 1)[0]
+    payouts = [
+        Payout(f"{prefix}-u{i}", prize=prize if i == 0 else 0, won=i == 0,
+               position=1 if i == 0 else 2, player_data={"total": i})
+        for i in range(players)
+    ]
+    settle_room(db, room_id, payouts, {"winner_ids": [f"{prefix}-u0"]})
+    db.commit()
+
+
+def run(player_counts: List[int], games: int):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_db_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        sessions = sessionmaker(engine)
+        print(f"games={games} per size, SQLite WAL")
+        print(f"{'players':>7} {'legacy p50':>11} {'legacy p99':>11} {'bulk p50':>9} {'bulk p99':>9}")
+        for players in player_counts:
+            row = []
+            for mode, settle in (("legacy", legacy_settle), ("bulk", bulk_settle)):
+                latencies = []
+                for room_id in seed(sessions, games, players, f"{mode}{players}"):
+                    with sessions() as db:
+                        started = time.perf_counter()
+                        settle(db, room_id, players, 10 * players)
+                        latencies.append(time.perf_counter() - started)
+                row += [statistics.median(latencies) * 1000, _percentile(latencies, 99) * 1000]
+            print(f"{players:>7} {row[0]:>11.2f} {row[1]:>11.2f} {row[2]:>9.2f} {row[3]:>9.2f}")
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", type=int, nargs="+", default=[2, 4, 8, 16, 32, 64])
+    parser.add_argument("--games", type=int, default=200, help="комнат на каждый размер")
+    args = parser.parse_args()
+    run(args.players, args.games)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Бенчмарк пропускной способности шардированного менеджера комнат.
+
+Для каждого числа шардов из --shards запускает пул процессов-шардов и столько же
+процессов-нагрузчиков. Каждый нагрузчик через ShardedRoomManager проводит свою
+долю из --rooms комнат через полный цикл: создание, присоединение, готовность
+обоих игроков, броски кубиков. Выводит комнат в секунду и ускорение относительно
+первого значения --shards. Для честного замера нужно не меньше 2 * N свободных
+ядер (N шардов + N нагрузчиков).
+
+Запуск:
+    python -m server.benchmarks.bench_shards --shards 1,2,4 --rooms 20000
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+
+from server.models import GameType
+from server.sharding import ShardPool, ShardedRoomManager
+
+
+async def drive(socket_paths, driver: int, rooms: int, concurrency: int) -> int:
+    manager = ShardedRoomManager(socket_paths)
+    await manager.start()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def lifecycle(r: int) -> bool:
+        creator, guest = f"d{driver}-r{r}-a", f"d{driver}-r{r}-b"
+        async with semaphore:
+            room = await manager.create_room(creator, creator, creator, GameType.DICE, 100)
+            if await manager.join_room(guest, guest, guest, room.id) is None:
+                return False
+            await manager.ready_player(creator)
+            await manager.ready_player(guest)
+            await manager.handle_dice_action(creator, room.id, "roll")
+            await manager.handle_dice_action(guest, room.id, "roll")
+            return True
+
+    results = await asyncio.gather(*(lifecycle(r) for r in range(rooms)))
+    await manager.close()
+    return sum(results)
+
+
+def driver_main(socket_paths, driver: int, rooms: int, concurrency: int, barrier, results):
+    logging.disable(logging.CRITICAL)
+    barrier.wait()
+    results.put(asyncio.run(drive(socket_paths, driver, rooms, concurrency)))
+
+
+def run(shards: int, rooms: int, concurrency: int) -> float:
+    pool = ShardPool(shards, log_level=logging.WARNING)
+    pool.start()
+    try:
+        # Дожидаемся готовности шардов до старта замера
+        async def wait_ready():
+            probe = ShardedRoomManager(pool.socket_paths)
+            await probe.start()
+            await probe.close()
+        asyncio.run(wait_ready())
+
+        context = multiprocessing.get_context("spawn")
+        barrier = context.Barrier(shards + 1)
+        results = context.Queue()
+        drivers = [
+            context.Process(target=driver_main, args=(pool.socket_paths, d, rooms // shards, concurrency, barrier, results))
+            for d in range(shards)
+        ]
+        for process in drivers:
+            process.start()
+        barrier.wait()
+        started = time.perf_counter()
+        completed = sum(results.get() for _ in drivers)
+        elapsed = time.perf_counter() - started
+        for process in drivers:
+            process.join()
+        return completed / elapsed
+    finally:
+        pool.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", default="1,2,4", help="числа шардов через запятую")
+    parser.add_argument("--rooms", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=200, help="комнат в полёте на нагрузчик")
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    print(f"cpu cores: {os.cpu_count()}")
+    baseline = None
+    for shards in (int(value) for value in args.shards.split(",")):
+        throughput = run(shards, args.rooms, args.concurrency)
+        baseline = baseline or throughput
+        print(f"shards={shards:<3} rooms/s={throughput:10.0f}  speedup={throughput / baseline:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import json
+import logging
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Callable, Dict, Union
+
+from starlette.responses import JSONResponse
+
+from server.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def to_primitive(value: Any) -> Any:
+    """Типы, которые кодируются не всеми бэкендами одинаково (datetime, date, Enum)."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class JsonCodec:
+    """
+    Кодек JSON для фреймов WebSocket, IPC, хранилища и ответов REST.
+    Все бэкенды дают компактный UTF-8 JSON; datetime — в ISO 8601, Enum — значением.
+    """
+    name = "stdlib"
+
+    def dumps(self, value: Any) -> str:
+        """Кодирует значение в строку (текстовый фрейм WebSocket)."""
+        return json.dumps(value, default=to_primitive, ensure_ascii=False, separators=(",", ":"))
+
+    def dumps_bytes(self, value: Any) -> bytes:
+        """Кодирует значение в UTF-8 байты (тело HTTP, IPC)."""
+        return self.dumps(value).encode()
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        """
+        Декодирует JSON.
+        Raises:
+            ValueError: некорректный JSON
+        """
+        return json.loads(data)
+
+
+class OrjsonCodec(JsonCodec):
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+        self._options = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, value: Any) -> str:
+        return self._orjson.dumps(value, default=to_primitive, option=self._options).decode()
+
+    def dumps_bytes(self, value: Any) -> bytes:
+        return self._orjson.dumps(value, default=to_primitive, option=self._options)
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return self._orjson.loads(data)
+
+
+class MsgspecCodec(JsonCodec):
+    name = "msgspec"
+
+    def __init__(self):
+        import msgspec
+        self._encoder = msgspec.json.Encoder(enc_hook=to_primitive)
+        self._decoder = msgspec.json.Decoder()
+        self._decode_error = msgspec.DecodeError
+
+    def dumps(self, value: Any) -> str:
+        return self._encoder.encode(value).decode()
+
+    def dumps_bytes(self, value: Any) -> bytes:
+        return self._encoder.encode(value)
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        try:
+            return self._decoder.decode(data)
+        except self._decode_error as e:
+            raise ValueError(str(e)) from e
+
+
+# Бэкенды в порядке предпочтения для JSON_CODEC=auto
+CODECS: Dict[str, Callable[[], JsonCodec]] = {
+    "orjson": OrjsonCodec,
+    "msgspec": MsgspecCodec,
+    "stdlib": JsonCodec,
+}
+
+
+def get_codec(name: str = "auto") -> JsonCodec:
+    """
+    Создаёт кодек по имени.
+    Args:
+        name (str): orjson, msgspec, stdlib или auto — первый установленный по порядку CODECS
+    Raises:
+        ValueError: неизвестное имя
+        ImportError: выбранная библиотека не установлена
+    """
+    if name != "auto":
+        if name not in CODECS:
+            raise ValueError(f"Unknown JSON codec: {name}")
+        return CODECS[name]()
+    for factory in CODECS.values():
+        try:
+            return factory()
+        except ImportError:
+            continue
+    return JsonCodec()
+
+
+codec = get_codec(settings.JSON_CODEC)
+logger.info(f"JSON codec: {codec.name}")
+
+dumps = codec.dumps
+dumps_bytes = codec.dumps_bytes
+loads = codec.loads
+
+
+class CodecResponse(JSONResponse):
+    """Ответ FastAPI, кодируемый выбранным кодеком (default_response_class приложения)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content)
@@ -4,9 +4,20 @@ from pydantic import Field
 class Settings(BaseSettings):
     # База данных
     DATABASE_URL: str = Field("sqlite:///./test_minigames.db", env="DATABASE_URL")
+    ASYNC_DATABASE_URL: str = Field("", env="ASYNC_DATABASE_URL")  # по умолчанию DATABASE_URL с aiosqlite/asyncpg
+    DB_ECHO: bool = Field(False, env="DB_ECHO")  # логировать каждый SQL-запрос (только для разработки)
+    DB_POOL_SIZE: int = Field(10, env="DB_POOL_SIZE")  # постоянных соединений в пуле
+    DB_MAX_OVERFLOW: int = Field(20, env="DB_MAX_OVERFLOW")  # дополнительных соединений при всплеске
+    DB_POOL_TIMEOUT: float = Field(30.0, env="DB_POOL_TIMEOUT")  # ожидание свободного соединения, сек
+    DB_POOL_RECYCLE: int = Field(1800, env="DB_POOL_RECYCLE")  # пересоздание соединения PostgreSQL, сек
+    SQLITE_JOURNAL_MODE: str = Field("WAL", env="SQLITE_JOURNAL_MODE")  # WAL — чтение не ждёт запись
+    SQLITE_SYNCHRONOUS: str = Field("NORMAL", env="SQLITE_SYNCHRONOUS")  # NORMAL — fsync при checkpoint WAL
+    SQLITE_MMAP_SIZE: int = Field(256 * 1024 * 1024, env="SQLITE_MMAP_SIZE")  # байт файла базы в mmap
+    SQLITE_BUSY_TIMEOUT: int = Field(5000, env="SQLITE_BUSY_TIMEOUT")  # ожидание блокировки записи, мс
 
     # Redis
     REDIS_URL: str = Field("redis://localhost:6379/0", env="REDIS_URL")
+    ROOM_STORE: str = Field("memory", env="ROOM_STORE")  # memory или redis — общее состояние комнат для нескольких узлов
     
     # Telegram Bot
     TELEGRAM_BOT_TOKEN: str = Field("", env="TELEGRAM_BOT_TOKEN")
@@ -18,6 +29,34 @@ class Settings(BaseSettings):
     # WebApp
     SECRET_KEY: str = Field("your-secret-key-here", env="SECRET_KEY")
 
+    # WebSocket
+    JSON_CODEC: str = Field("auto", env="JSON_CODEC")  # auto, orjson, msgspec, stdlib — кодек фреймов и ответов REST
+    WS_SEND_TIMEOUT: float = Field(2.0, env="WS_SEND_TIMEOUT")  # таймаут отправки одного события, сек
+    WS_SEND_QUEUE_SIZE: int = Field(64, env="WS_SEND_QUEUE_SIZE")  # размер очереди исходящих сообщений
+    WS_OVERFLOW_POLICY: str = Field("coalesce", env="WS_OVERFLOW_POLICY")  # drop_oldest, coalesce, disconnect
+    WS_HEARTBEAT_INTERVAL: float = Field(20.0, env="WS_HEARTBEAT_INTERVAL")  # период серверного ping, сек; 0 — выключен
+    WS_HEARTBEAT_TIMEOUT: float = Field(60.0, env="WS_HEARTBEAT_TIMEOUT")  # молчание клиента до отключения, сек
+    WS_HEARTBEAT_BATCH: int = Field(500, env="WS_HEARTBEAT_BATCH")  # подключений за один шаг обхода
+    WS_REPLAY_EVENTS: int = Field(128, env="WS_REPLAY_EVENTS")  # событий комнаты для возобновления после переподключения
+
+    # Честность игр
+    SEED_POOL_SIZE: int = Field(1024, env="SEED_POOL_SIZE")  # заранее сгенерированных серверных seed (commit-reveal)
+
+    # Балансы игроков в комнатах RoomManager
+    LEDGER: str = Field("db", env="LEDGER")  # db — User.stars_balance с резервами ставок; off — демо-баланс в памяти
+    LEDGER_BATCH: int = Field(200, env="LEDGER_BATCH")  # расчётов комнат в одной транзакции
+    LEDGER_FLUSH_INTERVAL: float = Field(0.5, env="LEDGER_FLUSH_INTERVAL")  # максимальная задержка записи расчёта, сек
+    DEMO_BALANCE: int = Field(1000, env="DEMO_BALANCE")  # стартовый баланс игрока при LEDGER=off
+
+    # История игр (итоги комнат RoomManager)
+    GAME_HISTORY: str = Field("db", env="GAME_HISTORY")  # db (game_rooms/game_participations), file (JSON Lines) или off
+    GAME_HISTORY_DIR: str = Field("./game_history", env="GAME_HISTORY_DIR")  # каталог сегментов для GAME_HISTORY=file
+    GAME_HISTORY_BATCH: int = Field(200, env="GAME_HISTORY_BATCH")  # записей в одной транзакции
+    GAME_HISTORY_FLUSH_INTERVAL: float = Field(1.0, env="GAME_HISTORY_FLUSH_INTERVAL")  # максимальная задержка записи, сек
+
+    # Шардирование комнат
+    ROOM_SHARDS: int = Field(0, env="ROOM_SHARDS")  # число процессов-шардов; 0 или 1 — все комнаты в процессе API
+
     # API
     NEWS_API_KEY: str = Field("", env="NEWS_API_KEY")
 
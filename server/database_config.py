@@ -1,18 +1,12 @@
 """
 Настройка подключения к базе данных
 """
-from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from .config import settings
+from .db_engine import create_db_engine
 
-# Создаем движок базы данных
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,  # Проверка соединения перед использованием
-    pool_recycle=300,    # Переподключение каждые 5 минут
-    echo=True           # Логирование SQL запросов (для разработки)
-)
+# Создаем движок базы данных (пул и логирование SQL — в настройках DB_*)
+engine = create_db_engine()
 
 # Создаем фабрику сессий
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -4,23 +4,26 @@
 """
 
 import os
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, JSON, ForeignKey, Numeric
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, JSON, ForeignKey, Numeric, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from datetime import datetime
 import uuid
 
 # Конфигурация БД
-from server.config import settings
+from server.db_engine import async_database_url, create_async_db_engine, create_db_engine
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,
-    echo=True  # Для разработки
-)
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Асинхронный движок для обработчиков FastAPI: запросы не блокируют цикл событий
+# (и вместе с ним WebSocket-игры). Драйвер: aiosqlite для SQLite, asyncpg для PostgreSQL
+async_engine = create_async_db_engine()
+# expire_on_commit=False: после commit атрибуты читаются без ленивой загрузки (в async она недоступна)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
 # Dependency для получения сессии базы данных
 def get_db():
     db = SessionLocal()
@@ -29,6 +32,11 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """Асинхронная сессия БД для обработчиков FastAPI"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # Модель пользователя
 class User(Base):
     __tablename__ = "users"
@@ -56,6 +64,10 @@ class User(Base):
 # Модель игровой комнаты
 class GameRoom(Base):
     __tablename__ = "game_rooms"
+    __table_args__ = (
+        # Список открытых комнат: status = 'waiting' AND expires_at > now
+        Index("ix_game_rooms_status_expires_at", "status", "expires_at"),
+    )
     
     id = Column(String, primary_key=True)
     game_type = Column(String, nullable=False)  # dice, rps, cards21, lotto, case_battle, roulette
@@ -68,7 +80,8 @@ class GameRoom(Base):
     bet_amount = Column(Integer, nullable=False)
     
     # Создатель и призовой фонд
-    creator_id = Column(String, ForeignKey("users.id"), nullable=False)
+    # NULL — комната из истории RoomManager, создатель которой не зарегистрирован
+    creator_id = Column(String, ForeignKey("users.id"), nullable=True)
     prize_pool = Column(Integer, default=0)
     
     # Метаданные
@@ -86,6 +99,12 @@ class GameRoom(Base):
 # Модель участия в игре
 class GameParticipation(Base):
     __tablename__ = "game_participations"
+    __table_args__ = (
+        # Участники комнаты и проверка "уже в комнате"
+        Index("ix_game_participations_room_id_user_id", "room_id", "user_id"),
+        # Последние игры пользователя
+        Index("ix_game_participations_user_id_joined_at", "user_id", "joined_at"),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     room_id = Column(String, ForeignKey("game_rooms.id"), nullable=False)
@@ -110,6 +129,10 @@ class GameParticipation(Base):
 # Модель транзакций
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        # История пользователя: WHERE user_id ORDER BY created_at DESC
+        Index("ix_transactions_user_id_created_at", "user_id", "created_at"),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
@@ -121,8 +144,8 @@ class Transaction(Base):
     
     # Платежные данные
     payment_method = Column(String, nullable=True)  # telegram_stars, ton_connect, internal
-    telegram_payment_id = Column(String, nullable=True)
-    ton_transaction_hash = Column(String, nullable=True)
+    telegram_payment_id = Column(String, nullable=True, index=True)  # Поиск платежа из вебхука
+    ton_transaction_hash = Column(String, nullable=True, index=True)
     status = Column(String, default="pending")  # pending, success, failed
     
     # Связанная игра (если применимо)
@@ -166,6 +189,10 @@ class NFTItem(Base):
 # Модель NFT в инвентаре пользователя
 class UserNFT(Base):
     __tablename__ = "user_nfts"
+    __table_args__ = (
+        # Инвентарь пользователя и надетые предметы
+        Index("ix_user_nfts_user_id_is_equipped", "user_id", "is_equipped"),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
@@ -209,7 +236,7 @@ class CaseItem(Base):
     __tablename__ = "case_items"
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    case_id = Column(String, ForeignKey("cases.id"), nullable=False)
+    case_id = Column(String, ForeignKey("cases.id"), nullable=False, index=True)
     nft_item_id = Column(String, ForeignKey("nft_items.id"), nullable=False)
     
     # Параметры выпадения
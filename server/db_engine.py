@@ -0,0 +1,110 @@
+"""
+Фабрика движков SQLAlchemy: одна точка настройки пула, логирования SQL и
+параметров SQLite для всех модулей базы (database_sqlite, database, database_config).
+"""
+from typing import Any, Dict, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from server.config import settings
+
+
+def async_database_url(url: str) -> str:
+    """URL базы с асинхронным драйвером (явно указанный драйвер сохраняется)."""
+    scheme, sep, rest = url.partition("://")
+    if "+" in scheme:
+        return url
+    driver = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg", "postgres": "postgresql+asyncpg"}
+    return f"{driver.get(scheme, scheme)}{sep}{rest}"
+
+
+def is_sqlite_memory(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and (
+        parsed.database in (None, "", ":memory:") or parsed.query.get("mode") == "memory"
+    )
+
+
+def engine_options(url: str) -> Dict[str, Any]:
+    """
+    Параметры create_engine для бэкенда.
+    - PostgreSQL: пул DB_POOL_SIZE + DB_MAX_OVERFLOW, пересоздание соединений
+      через DB_POOL_RECYCLE (обрыв простаивающих соединений сервером и балансировщиком),
+      pool_pre_ping.
+    - SQLite-файл: тот же пул без recycle и pre_ping — соединение локальное и не рвётся.
+    - SQLite в памяти: пул по умолчанию (у каждого пула своя база в памяти).
+    SQL пишется в лог только при DB_ECHO=true.
+    """
+    options: Dict[str, Any] = {"echo": settings.DB_ECHO}
+    if make_url(url).get_backend_name() == "sqlite":
+        if not is_sqlite_memory(url):
+            options.update(pool_size=settings.DB_POOL_SIZE, max_overflow=settings.DB_MAX_OVERFLOW,
+                           pool_timeout=settings.DB_POOL_TIMEOUT)
+        return options
+    options.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+    return options
+
+
+def sqlite_pragmas() -> Dict[str, Any]:
+    """
+    PRAGMA для каждого нового соединения SQLite-файла:
+    - journal_mode=WAL — читатели не ждут писателя, запись не блокирует API;
+    - synchronous=NORMAL — fsync только при checkpoint, в WAL это безопасно при сбое процесса;
+    - mmap_size — чтение страниц через отображение в память;
+    - busy_timeout — ожидание блокировки вместо немедленного "database is locked".
+    """
+    return {
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT,
+    }
+
+
+def _install_sqlite_pragmas(engine: Engine):
+    pragmas = sqlite_pragmas()
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def create_db_engine(url: Optional[str] = None, **overrides) -> Engine:
+    """
+    Синхронный движок по настройкам.
+    Args:
+        url (Optional[str]): URL базы (по умолчанию DATABASE_URL)
+        **overrides: параметры create_engine поверх engine_options
+    """
+    url = url or settings.DATABASE_URL
+    engine = create_engine(url, **{**engine_options(url), **overrides})
+    if engine.dialect.name == "sqlite" and not is_sqlite_memory(url):
+        _install_sqlite_pragmas(engine)
+    return engine
+
+
+def create_async_db_engine(url: Optional[str] = None, **overrides) -> AsyncEngine:
+    """
+    Асинхронный движок (aiosqlite / asyncpg) с теми же настройками пула и SQLite.
+    Args:
+        url (Optional[str]): URL базы (по умолчанию ASYNC_DATABASE_URL или DATABASE_URL с асинхронным драйвером)
+        **overrides: параметры create_async_engine поверх engine_options
+    """
+    url = url or settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL)
+    engine = create_async_engine(url, **{**engine_options(url), **overrides})
+    if engine.dialect.name == "sqlite" and not is_sqlite_memory(url):
+        _install_sqlite_pragmas(engine.sync_engine)
+    return engine
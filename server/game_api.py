@@ -2,28 +2,40 @@
 API endpoints для игр с интеграцией базы данных
 """
 from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import contains_eager, joinedload
 from typing import Optional
 import json
 import uuid
 from datetime import datetime, timedelta
 
-from .database_sqlite import get_db, User, GameRoom, GameParticipation, Transaction
+from .database_sqlite import get_async_db, User, GameRoom, GameParticipation
+from .balances import debit_many
+from .settlement import AlreadySettled, Payout, settle_room
 from .config import settings
 
 router = APIRouter(prefix="/api/games", tags=["games"])
 
+def participation_status(participation: GameParticipation) -> str:
+    """Итог участия по position: 1 — победа, другое место — поражение, без места — ничья или игра идёт"""
+    if participation.position == 1:
+        return "won"
+    if participation.position is not None:
+        return "lost"
+    return "draw" if participation.finished_at else "playing"
+
 @router.post("/create-room")
 async def create_game_room(
     game_type: str,
     bet_amount: int,
     max_players: int,
     telegram_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Создать игровую комнату"""
     # Найти пользователя
-    user = db.query(User).filter(User.telegram_id == telegram_id).first()
+    user = await db.scalar(select(User).where(User.telegram_id == telegram_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -55,7 +67,7 @@ async def create_game_room(
     )
     
     db.add(participation)
-    db.commit()
+    await db.commit()
     
     return {
         "room_id": room_id,
@@ -69,16 +81,16 @@ async def create_game_room(
 async def join_game_room(
     room_id: str,
     telegram_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Присоединиться к игровой комнате"""
     # Найти пользователя
-    user = db.query(User).filter(User.telegram_id == telegram_id).first()
+    user = await db.scalar(select(User).where(User.telegram_id == telegram_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Найти комнату
-    room = db.query(GameRoom).filter(GameRoom.id == room_id).first()
+    room = await db.get(GameRoom, room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     
@@ -93,10 +105,10 @@ async def join_game_room(
         raise HTTPException(status_code=400, detail="Insufficient balance")
     
     # Проверить, не участвует ли уже
-    existing = db.query(GameParticipation).filter(
+    existing = await db.scalar(select(GameParticipation).where(
         GameParticipation.room_id == room_id,
         GameParticipation.user_id == user.id
-    ).first()
+    ))
     
     if existing:
         raise HTTPException(status_code=400, detail="Already in this room")
@@ -113,7 +125,7 @@ async def join_game_room(
     room.current_players += 1
     room.prize_pool += room.bet_amount
     
-    db.commit()
+    await db.commit()
     
     return {
         "message": "Joined room successfully",
@@ -126,16 +138,16 @@ async def join_game_room(
 async def start_game(
     room_id: str,
     telegram_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Начать игру (только создатель может)"""
     # Найти пользователя
-    user = db.query(User).filter(User.telegram_id == telegram_id).first()
+    user = await db.scalar(select(User).where(User.telegram_id == telegram_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Найти комнату
-    room = db.query(GameRoom).filter(GameRoom.id == room_id).first()
+    room = await db.get(GameRoom, room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     
@@ -145,37 +157,32 @@ async def start_game(
     if room.status != "waiting":
         raise HTTPException(status_code=400, detail="Game already started or finished")
     
-    # Получить всех участников
-    participants = db.query(GameParticipation).filter(
-        GameParticipation.room_id == room_id
-    ).all()
-    
-    # Списать ставки у всех участников
-    for participation in participants:
-        participant_user = db.query(User).filter(User.id == participation.user_id).first()
-        if participant_user.stars_balance < room.bet_amount:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Player {participant_user.username} has insufficient balance"
-            )
-        
-        # Списать ставку
-        participant_user.stars_balance -= room.bet_amount
-        
-        # Создать транзакцию
-        transaction = Transaction(
-            user_id=participant_user.id,
-            type="game_bet",
-            amount=-room.bet_amount,
-            room_id=room_id,
-            description=f"Bet for {room.game_type} game"
+    # Все участники вместе с пользователями одним запросом
+    participants = (await db.scalars(select(GameParticipation).options(
+        joinedload(GameParticipation.user)
+    ).where(GameParticipation.room_id == room_id))).all()
+    
+    # Списать ставки одним условным UPDATE: при нехватке средств у любого игрока
+    # откатываются все списания
+    balances = await debit_many(
+        db, [p.user_id for p in participants], room.bet_amount,
+        type="game_bet",
+        status="success",
+        room_id=room_id,
+        description=f"Bet for {room.game_type} game"
+    )
+    short = [p.user.username for p in participants if p.user_id not in balances]
+    if short:
+        await db.rollback()
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Player {short[0]} has insufficient balance"
         )
-        db.add(transaction)
     
     # Обновить статус комнаты
     room.status = "in_progress"
     
-    db.commit()
+    await db.commit()
     
     return {
         "message": "Game started successfully",
@@ -189,11 +196,11 @@ async def finish_game(
     room_id: str,
     winner_telegram_id: Optional[str],
     game_results: dict,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Завершить игру и распределить призы"""
     # Найти комнату
-    room = db.query(GameRoom).filter(GameRoom.id == room_id).first()
+    room = await db.get(GameRoom, room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     
@@ -203,51 +210,39 @@ async def finish_game(
     # Найти победителя (если есть)
     winner = None
     if winner_telegram_id:
-        winner = db.query(User).filter(User.telegram_id == winner_telegram_id).first()
+        winner = await db.scalar(select(User).where(User.telegram_id == winner_telegram_id))
         if not winner:
             raise HTTPException(status_code=404, detail="Winner not found")
     
-    # Получить всех участников
-    participants = db.query(GameParticipation).filter(
+    participant_ids = (await db.scalars(select(GameParticipation.user_id).where(
         GameParticipation.room_id == room_id
-    ).all()
-    
-    # Обновить статистику участников
-    for participation in participants:
-        participant_user = db.query(User).filter(User.id == participation.user_id).first()
-        participant_user.total_games += 1
-        
-        # Сохранить результат игры
-        participation.game_result = game_results.get(str(participation.user_id), {})
-        
-        # Если это победитель
-        if winner and participation.user_id == winner.id:
-            participation.status = "won"
-            participation.prize_won = room.prize_pool
-            participant_user.wins += 1
-            participant_user.stars_balance += room.prize_pool
-            
-            # Создать транзакцию выигрыша
-            transaction = Transaction(
-                user_id=winner.id,
-                type="game_win",
-                amount=room.prize_pool,
-                game_room_id=room_id,
-                description=f"Won {room.game_type} game"
-            )
-            db.add(transaction)
-        else:
-            participation.status = "lost"
-            participation.prize_won = 0
-    
-    # Обновить комнату
-    room.status = "finished"
-    room.finished_at = datetime.utcnow()
-    room.game_state = game_results
-    if winner:
-        room.winner_ids = [str(winner.id)]
+    ))).all()
+    
+    # Итоги участников считаются в памяти и применяются одной пачкой запросов
+    payouts = []
+    for user_id in participant_ids:
+        won = winner is not None and user_id == winner.id
+        payouts.append(Payout(
+            user_id=user_id,
+            prize=room.prize_pool if won else 0,
+            won=won,
+            position=1 if won else (2 if winner else None),
+            player_data=game_results.get(str(user_id), {}),
+            description=f"Won {room.game_type} game"
+        ))
+    
+    game_data = {
+        "results": game_results,
+        "winner_ids": [str(winner.id)] if winner else []
+    }
+    try:
+        await db.run_sync(settle_room, room_id, payouts, game_data)
+    except AlreadySettled:
+        # Игру уже завершил параллельный запрос
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Game is not in progress")
     
-    db.commit()
+    await db.commit()
     
     return {
         "message": "Game finished successfully",
@@ -257,16 +252,19 @@ async def finish_game(
     }
 
 @router.get("/rooms")
-async def get_available_rooms(db: Session = Depends(get_db)):
+async def get_available_rooms(db: AsyncSession = Depends(get_async_db)):
     """Получить доступные игровые комнаты"""
-    rooms = db.query(GameRoom).filter(
+    # Создатели комнат подгружаются в том же запросе
+    rooms = (await db.scalars(select(GameRoom).options(
+        joinedload(GameRoom.creator)
+    ).where(
         GameRoom.status == "waiting",
         GameRoom.expires_at > datetime.utcnow()
-    ).all()
+    ))).all()
     
     result = []
     for room in rooms:
-        creator = db.query(User).filter(User.id == room.creator_id).first()
+        creator = room.creator
         result.append({
             "id": room.id,
             "game_type": room.game_type,
@@ -280,24 +278,26 @@ async def get_available_rooms(db: Session = Depends(get_db)):
     return {"rooms": result}
 
 @router.get("/user-stats/{telegram_id}")
-async def get_user_stats(telegram_id: str, db: Session = Depends(get_db)):
+async def get_user_stats(telegram_id: str, db: AsyncSession = Depends(get_async_db)):
     """Получить статистику пользователя"""
-    user = db.query(User).filter(User.telegram_id == telegram_id).first()
+    user = await db.scalar(select(User).where(User.telegram_id == telegram_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Последние игры
-    recent_games = db.query(GameParticipation).join(GameRoom).filter(
+    # Последние игры: комната берётся из того же JOIN
+    recent_games = (await db.scalars(select(GameParticipation).join(GameRoom).options(
+        contains_eager(GameParticipation.room)
+    ).where(
         GameParticipation.user_id == user.id
-    ).order_by(GameParticipation.joined_at.desc()).limit(10).all()
+    ).order_by(GameParticipation.joined_at.desc()).limit(10))).all()
     
     games_history = []
     for participation in recent_games:
-        room = db.query(GameRoom).filter(GameRoom.id == participation.room_id).first()
+        room = participation.room
         games_history.append({
             "game_type": room.game_type,
             "bet_amount": room.bet_amount,
-            "status": participation.status,
+            "status": participation_status(participation),
             "prize_won": participation.prize_won or 0,
             "played_at": participation.joined_at.isoformat()
         })
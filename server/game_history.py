@@ -0,0 +1,133 @@
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from server import codec
+from server.batch_writer import BatchSink, BatchWriter
+from server.config import settings
+
+# Запись истории — словарь с итогом комнаты:
+# history_id (uuid4 записи), room_id, game_type, status, bet_amount, pot, created_at, finished_at, winners,
+# seed/seed_hash/nonce/round_number (для кубиков) и players — список
+# {id, telegram_id, username, is_creator, prize, refund, score, data}
+HistoryRecord = Dict[str, Any]
+
+
+class FileHistorySink(BatchSink):
+    """
+    Append-only сегменты JSON Lines: одна запись — одна строка, пачка — одна
+    запись в файл и fsync. Сегмент закрывается по достижении segment_bytes;
+    в имени PID процесса, поэтому шарды пишут каждый в свои файлы.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self._file = None
+        self._segment = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _open_segment(self):
+        self._segment += 1
+        name = f"history-{int(time.time())}-{os.getpid()}-{self._segment:04d}.jsonl"
+        self._file = open(os.path.join(self.directory, name), "ab")
+
+    def write(self, records: List[HistoryRecord]):
+        if self._file is None or self._file.tell() >= self.segment_bytes:
+            self.close()
+            self._open_segment()
+        self._file.write(b"".join(codec.dumps_bytes(record) + b"\n" for record in records))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class DatabaseHistorySink(BatchSink):
+    """
+    Пачка комнат одной транзакцией: executemany-вставки в game_rooms и
+    game_participations. Пользователи находятся одним запросом по telegram_id;
+    участие пишется только для зарегистрированных пользователей, полный итог
+    (включая незарегистрированных игроков) — в game_rooms.game_data.
+    Создатель без учётной записи пишется как creator_id = NULL: ссылка на
+    несуществующего пользователя нарушила бы внешний ключ и провалила всю пачку.
+    Ключ строки — history_id записи, а не короткий ID комнаты (8 hex-символов
+    совпадают уже на десятках тысяч комнат, в том числе с комнатами REST API).
+    Записи, уже сохранённые при прошлой попытке, пропускаются по history_id —
+    повтор пачки безопасен, а другая комната с тем же коротким ID не теряется.
+    """
+
+    def __init__(self, session_factory: Optional[Callable] = None):
+        self._session_factory = session_factory
+
+    def write(self, records: List[HistoryRecord]):
+        from sqlalchemy import insert, select
+        from server.database_sqlite import GameParticipation, GameRoom, SessionLocal, User
+
+        session_factory = self._session_factory or SessionLocal
+        with session_factory() as db:
+            existing = set(db.scalars(select(GameRoom.id).where(GameRoom.id.in_([r["history_id"] for r in records]))))
+            records = [record for record in records if record["history_id"] not in existing]
+            if not records:
+                return
+            telegram_ids = {p["telegram_id"] for record in records for p in record["players"]}
+            users = dict(db.execute(select(User.telegram_id, User.id).where(User.telegram_id.in_(telegram_ids))).all())
+
+            rooms, participations = [], []
+            for record in records:
+                finished_at = _datetime(record["finished_at"])
+                creator = next((p for p in record["players"] if p["is_creator"]), record["players"][0])
+                rooms.append({
+                    "id": record["history_id"],
+                    "game_type": record["game_type"],
+                    "status": record["status"],
+                    "max_players": record.get("max_players", 4),
+                    "current_players": len(record["players"]),
+                    "bet_amount": record["bet_amount"],
+                    "creator_id": users.get(creator["telegram_id"]),
+                    "prize_pool": record["pot"],
+                    "created_at": _datetime(record["created_at"]),
+                    "finished_at": finished_at,
+                    "game_data": record,
+                })
+                winners = set(record["winners"])
+                for player in record["players"]:
+                    user_id = users.get(player["telegram_id"])
+                    if user_id is None:
+                        continue
+                    participations.append({
+                        "room_id": record["history_id"],
+                        "user_id": user_id,
+                        "position": 1 if player["id"] in winners else (2 if winners else None),
+                        "score": player.get("score"),
+                        "prize_won": player["prize"],
+                        "player_data": player,
+                        "finished_at": finished_at,
+                    })
+            db.execute(insert(GameRoom), rooms)
+            if participations:
+                db.execute(insert(GameParticipation), participations)
+            db.commit()
+
+
+def _datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def create_history_writer() -> Optional[BatchWriter]:
+    """Писатель истории по настройкам: GAME_HISTORY=db (по умолчанию), file (GAME_HISTORY_DIR) или off."""
+    if settings.GAME_HISTORY == "off":
+        return None
+    if settings.GAME_HISTORY == "file":
+        sink = FileHistorySink(settings.GAME_HISTORY_DIR)
+    else:
+        sink = DatabaseHistorySink()
+    return BatchWriter(
+        sink,
+        batch_size=settings.GAME_HISTORY_BATCH,
+        flush_interval=settings.GAME_HISTORY_FLUSH_INTERVAL
+    )
@@ -7,10 +7,10 @@ import time
 import random
 from typing import Dict, List, Optional
 from datetime import datetime
-import requests
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 
-from ..database_sqlite import get_db, User, GameRoom, GameParticipation, Transaction
+from ..database_sqlite import get_async_db, User, GameRoom, GameParticipation
+from ..settlement import Payout, settle_room
 
 class DatabaseDiceGame:
     """
@@ -24,15 +24,22 @@ class DatabaseDiceGame:
         if not self.room:
             raise ValueError(f"Room {room_id} not found")
     
+    def _load_participants(self) -> Dict[str, GameParticipation]:
+        """Участники комнаты вместе с пользователями одним запросом: user_id -> участие"""
+        participants = self.db.query(GameParticipation).options(
+            joinedload(GameParticipation.user)
+        ).filter(
+            GameParticipation.room_id == self.room_id
+        ).all()
+        return {str(p.user_id): p for p in participants}
+    
     def play_round(self) -> dict:
         """Сыграть раунд игры в кости"""
         if self.room.status != "in_progress":
             raise ValueError("Game is not in progress")
         
         # Получить всех участников
-        participants = self.db.query(GameParticipation).filter(
-            GameParticipation.room_id == self.room_id
-        ).all()
+        participants = self._load_participants()
         
         if not participants:
             raise ValueError("No participants found")
@@ -41,15 +48,15 @@ class DatabaseDiceGame:
         seed = self._generate_seed()
         results = {}
         
-        for i, participation in enumerate(participants):
-            user = self.db.query(User).filter(User.id == participation.user_id).first()
+        for i, (user_id, participation) in enumerate(participants.items()):
+            user = participation.user
             
             # Генерировать кубики на основе seed + user_id
-            dice1, dice2 = self._generate_fair_dice(seed, str(participation.user_id), i)
+            dice1, dice2 = self._generate_fair_dice(seed, user_id, i)
             total = dice1 + dice2
             
-            results[str(participation.user_id)] = {
-                "user_id": str(participation.user_id),
+            results[user_id] = {
+                "user_id": user_id,
                 "username": user.username,
                 "telegram_id": user.telegram_id,
                 "dice1": dice1,
@@ -64,11 +71,9 @@ class DatabaseDiceGame:
             if result["total"] == max_score
         ]
         
-        # Завершить игру через API
+        # Завершить игру
         if len(winners) == 1:
-            winner_user_id = winners[0]
-            winner_user = self.db.query(User).filter(User.id == winner_user_id).first()
-            self._finish_game(winner_user.telegram_id, results)
+            self._finish_game(winners[0], results)
         else:
             # Ничья - разделить призовой фонд
             self._finish_game_draw(winners, results)
@@ -98,104 +103,59 @@ class DatabaseDiceGame:
         
         return dice1, dice2
     
-    def _finish_game(self, winner_telegram_id: str, results: dict):
+    def _finish_game(self, winner_user_id: str, results: dict):
         """Завершить игру с одним победителем"""
-        # Обновить участников
+        payouts = []
         for user_id, result in results.items():
-            participation = self.db.query(GameParticipation).filter(
-                GameParticipation.room_id == self.room_id,
-                GameParticipation.user_id == user_id
-            ).first()
-            
-            user = self.db.query(User).filter(User.id == user_id).first()
-            user.total_games += 1
-            
-            participation.game_result = result
-            
-            # Если победитель
-            winner_user = self.db.query(User).filter(
-                User.telegram_id == winner_telegram_id
-            ).first()
-            
-            if user.id == winner_user.id:
-                participation.prize_won = self.room.prize_pool
-                user.wins += 1
-                user.stars_balance += self.room.prize_pool
-                
-                # Транзакция выигрыша
-                transaction = Transaction(
-                    user_id=user.id,
-                    type="game_win",
-                    amount=self.room.prize_pool,
-                    room_id=self.room_id,
-                    description=f"Won dice game - rolled {result['total']}"
-                )
-                self.db.add(transaction)
-            else:
-                participation.status = "lost"
-                participation.prize_won = 0
-        
-        # Обновить комнату
-        self.room.status = "finished"
-        self.room.finished_at = datetime.utcnow()
-        self.room.game_state = {"final_results": results}
-        self.room.winner_ids = [str(winner_user.id)]
+            won = user_id == winner_user_id
+            payouts.append(Payout(
+                user_id=user_id,
+                prize=self.room.prize_pool if won else 0,
+                won=won,
+                position=1 if won else 2,
+                score=result["total"],
+                player_data=result,
+                description=f"Won dice game - rolled {result['total']}"
+            ))
         
+        # Все выплаты, статистика и транзакции — одной транзакцией базы
+        settle_room(self.db, self.room_id, payouts, {"final_results": results, "winner_ids": [winner_user_id]})
         self.db.commit()
     
     def _finish_game_draw(self, winner_ids: List[str], results: dict):
         """Завершить игру с ничьей"""
         prize_per_winner = self.room.prize_pool // len(winner_ids)
         
+        payouts = []
         for user_id, result in results.items():
-            participation = self.db.query(GameParticipation).filter(
-                GameParticipation.room_id == self.room_id,
-                GameParticipation.user_id == user_id
-            ).first()
-            
-            user = self.db.query(User).filter(User.id == user_id).first()
-            user.total_games += 1
-            
-            participation.game_result = result
-            
-            if user_id in winner_ids:
-                participation.status = "draw_won"
-                participation.prize_won = prize_per_winner
-                user.wins += 1
-                user.stars_balance += prize_per_winner
-                
-                # Транзакция выигрыша
-                transaction = Transaction(
-                    user_id=user.id,
-                    type="game_win",
-                    amount=prize_per_winner,
-                    room_id=self.room_id,
-                    description=f"Draw in dice game - rolled {result['total']}"
-                )
-                self.db.add(transaction)
-            else:
-                participation.status = "lost"
-                participation.prize_won = 0
-        
-        # Обновить комнату
-        self.room.status = "finished"
-        self.room.finished_at = datetime.utcnow()
-        self.room.game_state = {"final_results": results, "draw": True}
-        self.room.winner_ids = winner_ids
+            won = user_id in winner_ids
+            payouts.append(Payout(
+                user_id=user_id,
+                prize=prize_per_winner if won else 0,
+                won=won,
+                position=1 if won else 2,
+                score=result["total"],
+                player_data=result,
+                description=f"Draw in dice game - rolled {result['total']}"
+            ))
         
+        settle_room(self.db, self.room_id, payouts, {"final_results": results, "draw": True, "winner_ids": winner_ids})
         self.db.commit()
 
 # API endpoint для игры в кости
 from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 dice_router = APIRouter(prefix="/api/dice", tags=["dice"])
 
 @dice_router.post("/play/{room_id}")
-async def play_dice_game(room_id: str, db: Session = Depends(get_db)):
+async def play_dice_game(room_id: str, db: AsyncSession = Depends(get_async_db)):
     """Сыграть в кости"""
     try:
-        game = DatabaseDiceGame(room_id, db)
-        results = game.play_round()
+        # Движок игры синхронный: run_sync выполняет его на соединении асинхронной сессии,
+        # не блокируя цикл событий
+        results = await db.run_sync(lambda session: DatabaseDiceGame(room_id, session).play_round())
         return {
             "success": True,
             "game_type": "dice",
@@ -206,23 +166,23 @@ async def play_dice_game(room_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail=str(e))
 
 @dice_router.get("/room/{room_id}/status")
-async def get_dice_room_status(room_id: str, db: Session = Depends(get_db)):
+async def get_dice_room_status(room_id: str, db: AsyncSession = Depends(get_async_db)):
     """Получить статус игровой комнаты"""
-    room = db.query(GameRoom).filter(
+    room = await db.scalar(select(GameRoom).where(
         GameRoom.id == room_id,
         GameRoom.game_type == "dice"
-    ).first()
+    ))
     
     if not room:
         raise HTTPException(status_code=404, detail="Dice room not found")
     
-    participants = db.query(GameParticipation).filter(
-        GameParticipation.room_id == room_id
-    ).all()
+    participants = (await db.scalars(select(GameParticipation).options(
+        joinedload(GameParticipation.user)
+    ).where(GameParticipation.room_id == room_id))).all()
     
     participants_data = []
     for p in participants:
-        user = db.query(User).filter(User.id == p.user_id).first()
+        user = p.user
         participants_data.append({
             "user_id": str(p.user_id),
             "username": user.username,
@@ -238,7 +198,7 @@ async def get_dice_room_status(room_id: str, db: Session = Depends(get_db)):
         "current_players": room.current_players,
         "max_players": room.max_players,
         "participants": participants_data,
-        "game_state": room.game_state,
-        "started_at": room.started_at.isoformat() if room.started_at else None,
+        "game_state": room.game_data,
+        "created_at": room.created_at.isoformat() if room.created_at else None,
         "finished_at": room.finished_at.isoformat() if room.finished_at else None
     }
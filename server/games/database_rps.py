@@ -5,9 +5,11 @@ import hashlib
 import time
 from typing import Dict, List, Optional
 from datetime import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 
-from ..database_sqlite import get_db, User, GameRoom, GameParticipation, Transaction
+from ..database_sqlite import get_async_db, User, GameRoom, GameParticipation
+from ..settlement import Payout, settle_room
+from ..game_api import participation_status
 
 class DatabaseRPSGame:
     """
@@ -28,6 +30,15 @@ class DatabaseRPSGame:
             "scissors": "paper"
         }
     
+    def _load_participants(self) -> Dict[str, GameParticipation]:
+        """Участники комнаты вместе с пользователями одним запросом: user_id -> участие"""
+        participants = self.db.query(GameParticipation).options(
+            joinedload(GameParticipation.user)
+        ).filter(
+            GameParticipation.room_id == self.room_id
+        ).all()
+        return {str(p.user_id): p for p in participants}
+    
     def play_round(self, player_choices: Dict[str, str]) -> dict:
         """
         Сыграть раунд RPS
@@ -37,20 +48,14 @@ class DatabaseRPSGame:
         if self.room.status != "in_progress":
             raise ValueError("Game is not in progress")
         
-        # Получить всех участников
-        participants = self.db.query(GameParticipation).filter(
-            GameParticipation.room_id == self.room_id,
-            GameParticipation.bet_paid == True
-        ).all()
+        # Получить всех участников (ставки списаны при старте игры)
+        participants = self._load_participants()
         
         if not participants:
             raise ValueError("No participants found")
         
         # Проверить что все сделали выбор
-        participant_telegram_ids = set()
-        for p in participants:
-            user = self.db.query(User).filter(User.id == p.user_id).first()
-            participant_telegram_ids.add(user.telegram_id)
+        participant_telegram_ids = {p.user.telegram_id for p in participants.values()}
         
         if not all(tid in player_choices for tid in participant_telegram_ids):
             missing = participant_telegram_ids - set(player_choices.keys())
@@ -58,15 +63,15 @@ class DatabaseRPSGame:
         
         # Обработать результаты
         results = {}
-        for participation in participants:
-            user = self.db.query(User).filter(User.id == participation.user_id).first()
+        for user_id, participation in participants.items():
+            user = participation.user
             choice = player_choices[user.telegram_id]
             
             if choice not in self.choices:
                 raise ValueError(f"Invalid choice: {choice}")
             
-            results[str(participation.user_id)] = {
-                "user_id": str(participation.user_id),
+            results[user_id] = {
+                "user_id": user_id,
                 "username": user.username,
                 "telegram_id": user.telegram_id,
                 "choice": choice
@@ -77,17 +82,8 @@ class DatabaseRPSGame:
         
         # Завершить игру
         if winners:
-            if len(winners) == 1:
-                winner_user_id = winners[0]
-                winner_user = self.db.query(User).filter(User.id == winner_user_id).first()
-                self._finish_game([winner_user.telegram_id], results)
-            else:
-                # Ничья между несколькими игроками
-                winner_telegram_ids = []
-                for winner_id in winners:
-                    winner_user = self.db.query(User).filter(User.id == winner_id).first()
-                    winner_telegram_ids.append(winner_user.telegram_id)
-                self._finish_game(winner_telegram_ids, results)
+            # Один победитель или ничья между несколькими игроками
+            self._finish_game(winners, results)
         else:
             # Полная ничья - все играют заново или возврат ставок
             self._finish_game_full_draw(results)
@@ -130,91 +126,46 @@ class DatabaseRPSGame:
         
         return []
     
-    def _finish_game(self, winner_telegram_ids: List[str], results: dict):
+    def _finish_game(self, winner_user_ids: List[str], results: dict):
         """Завершить игру с победителями"""
-        prize_per_winner = self.room.prize_pool // len(winner_telegram_ids) if winner_telegram_ids else 0
-        
-        winner_user_ids = set()
-        for telegram_id in winner_telegram_ids:
-            user = self.db.query(User).filter(User.telegram_id == telegram_id).first()
-            winner_user_ids.add(str(user.id))
+        prize_per_winner = self.room.prize_pool // len(winner_user_ids) if winner_user_ids else 0
         
+        payouts = []
         for user_id, result in results.items():
-            participation = self.db.query(GameParticipation).filter(
-                GameParticipation.room_id == self.room_id,
-                GameParticipation.user_id == user_id
-            ).first()
-            
-            user = self.db.query(User).filter(User.id == user_id).first()
-            user.total_games += 1
-            
-            participation.game_result = result
-            
-            if user_id in winner_user_ids:
-                participation.status = "won" if len(winner_user_ids) == 1 else "draw_won"
-                participation.prize_won = prize_per_winner
-                user.wins += 1
-                user.stars_balance += prize_per_winner
-                
-                # Транзакция выигрыша
-                transaction = Transaction(
-                    user_id=user.id,
-                    type="game_win",
-                    amount=prize_per_winner,
-                    game_room_id=self.room_id,
-                    description=f"Won RPS game with {result['choice']}"
-                )
-                self.db.add(transaction)
-            else:
-                participation.status = "lost"
-                participation.prize_won = 0
-        
-        # Обновить комнату
-        self.room.status = "finished"
-        self.room.finished_at = datetime.utcnow()
-        self.room.game_state = {"final_results": results}
-        self.room.winner_ids = list(winner_user_ids)
-        
+            won = user_id in winner_user_ids
+            payouts.append(Payout(
+                user_id=user_id,
+                prize=prize_per_winner if won else 0,
+                won=won,
+                position=1 if won else 2,
+                player_data=result,
+                description=f"Won RPS game with {result['choice']}"
+            ))
+        
+        # Все выплаты, статистика и транзакции — одной транзакцией базы
+        settle_room(self.db, self.room_id, payouts, {"final_results": results, "winner_ids": list(winner_user_ids)})
         self.db.commit()
     
     def _finish_game_full_draw(self, results: dict):
         """Завершить игру с полной ничьей - возврат ставок"""
-        for user_id, result in results.items():
-            participation = self.db.query(GameParticipation).filter(
-                GameParticipation.room_id == self.room_id,
-                GameParticipation.user_id == user_id
-            ).first()
-            
-            user = self.db.query(User).filter(User.id == user_id).first()
-            user.total_games += 1
-            
-            participation.game_result = result
-            participation.status = "draw"
-            participation.prize_won = self.room.bet_amount  # Возврат ставки
-            
-            # Возврат ставки
-            user.stars_balance += self.room.bet_amount
-            
-            # Транзакция возврата
-            transaction = Transaction(
-                user_id=user.id,
-                type="game_refund",
-                amount=self.room.bet_amount,
-                game_room_id=self.room_id,
+        payouts = [
+            Payout(
+                user_id=user_id,
+                prize=self.room.bet_amount,  # Возврат ставки
+                player_data=result,
+                kind="game_refund",
                 description="RPS game full draw - bet refunded"
             )
-            self.db.add(transaction)
-        
-        # Обновить комнату
-        self.room.status = "finished"
-        self.room.finished_at = datetime.utcnow()
-        self.room.game_state = {"final_results": results, "full_draw": True}
-        self.room.winner_ids = []
+            for user_id, result in results.items()
+        ]
         
+        settle_room(self.db, self.room_id, payouts, {"final_results": results, "full_draw": True, "winner_ids": []})
         self.db.commit()
 
 # API endpoint для RPS
 from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 rps_router = APIRouter(prefix="/api/rps", tags=["rps"])
 
@@ -222,15 +173,16 @@ rps_router = APIRouter(prefix="/api/rps", tags=["rps"])
 async def play_rps_game(
     room_id: str, 
     player_choices: Dict[str, str],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Сыграть в RPS
     Body: {"player1_telegram_id": "rock", "player2_telegram_id": "paper"}
     """
     try:
-        game = DatabaseRPSGame(room_id, db)
-        results = game.play_round(player_choices)
+        # Движок игры синхронный: run_sync выполняет его на соединении асинхронной сессии,
+        # не блокируя цикл событий
+        results = await db.run_sync(lambda session: DatabaseRPSGame(room_id, session).play_round(player_choices))
         return {
             "success": True,
             "game_type": "rps",
@@ -241,30 +193,29 @@ async def play_rps_game(
         raise HTTPException(status_code=400, detail=str(e))
 
 @rps_router.get("/room/{room_id}/status") 
-async def get_rps_room_status(room_id: str, db: Session = Depends(get_db)):
+async def get_rps_room_status(room_id: str, db: AsyncSession = Depends(get_async_db)):
     """Получить статус RPS комнаты"""
-    room = db.query(GameRoom).filter(
+    room = await db.scalar(select(GameRoom).where(
         GameRoom.id == room_id,
         GameRoom.game_type == "rps"
-    ).first()
+    ))
     
     if not room:
         raise HTTPException(status_code=404, detail="RPS room not found")
     
-    participants = db.query(GameParticipation).filter(
-        GameParticipation.room_id == room_id
-    ).all()
+    participants = (await db.scalars(select(GameParticipation).options(
+        joinedload(GameParticipation.user)
+    ).where(GameParticipation.room_id == room_id))).all()
     
     participants_data = []
     for p in participants:
-        user = db.query(User).filter(User.id == p.user_id).first()
+        user = p.user
         participants_data.append({
             "user_id": str(p.user_id),
             "username": user.username,
             "telegram_id": user.telegram_id,
-            "status": p.status,
-            "bet_paid": p.bet_paid,
-            "game_result": p.game_result
+            "status": participation_status(p),
+            "game_result": p.player_data
         })
     
     return {
@@ -275,7 +226,7 @@ async def get_rps_room_status(room_id: str, db: Session = Depends(get_db)):
         "current_players": room.current_players,
         "max_players": room.max_players,
         "participants": participants_data,
-        "game_state": room.game_state,
-        "started_at": room.started_at.isoformat() if room.started_at else None,
+        "game_state": room.game_data,
+        "created_at": room.created_at.isoformat() if room.created_at else None,
         "finished_at": room.finished_at.isoformat() if room.finished_at else None
     }
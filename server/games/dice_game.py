@@ -1,32 +1,37 @@
-import hashlib
 import uuid
-import time
 from typing import Dict, List, Tuple, Optional
 from datetime import datetime
 from server.models import Player, DiceResult
+from server.games.fair_dice import commitment, roll_dice, roll_round, verify_roll
+from server.games.seed_pool import new_seed
 
 class DiceGame:
     """
     Честная реализация игры в кубики (Dice) для 2-4 игроков.
     - Каждый игрок бросает два кубика, победитель — наибольшая сумма.
-    - При полной ничьей — переброс с новым seed/nonce.
-    - Публикация seed/nonce для проверки честности.
+    - При полной ничьей — переброс: тот же seed и nonce, следующий номер раунда.
+    - Commit-reveal: sha256(seed) и nonce известны игрокам до первого броска,
+      seed публикуется в результатах игры для проверки честности.
     - Призовой фонд делится между победителями.
     """
     
-    def __init__(self, room_id: str, players: List[Player], bet_amount: int = 100):
+    def __init__(self, room_id: str, players: List[Player], bet_amount: int = 100,
+                 seed: Optional[str] = None, seed_hash: Optional[str] = None):
         """
         Инициализация игры Dice.
         Args:
             room_id (str): ID комнаты
             players (List[Player]): список игроков
             bet_amount (int): ставка на игрока
+            seed (Optional[str]): серверный seed из SeedPool (по умолчанию генерируется здесь)
+            seed_hash (Optional[str]): готовое sha256(seed) из того же пула
         """
         self.room_id = room_id
         self.players = {p.id: p for p in players}
         self.bet_amount = bet_amount
         self.prize_pool = bet_amount * len(players)
-        self.game_seed = self._generate_seed()
+        self.game_seed = seed or self._generate_seed()
+        self.seed_hash = seed_hash if seed and seed_hash else commitment(self.game_seed)
         self.nonce = self._generate_nonce()
         self.player_actions: Dict[str, bool] = {p.id: False for p in players}
         self.results: Dict[str, DiceResult] = {}
@@ -35,13 +40,13 @@ class DiceGame:
         self.winners: List[str] = []
         self.round_number = 1
         self.created_at = datetime.now()
+        # Кубики всех игроков раунда, считаются одной пачкой при первом броске:
+        # ((seed, nonce, номер раунда), {player_id: (dice1, dice2)})
+        self._round_dice: Optional[Tuple[Tuple[str, str, int], Dict[str, Tuple[int, int]]]] = None
         
     def _generate_seed(self) -> str:
-        """Генерирует криптографически стойкий seed для игры"""
-        timestamp = str(int(time.time() * 1000000))  # микросекунды для уникальности
-        room_hash = hashlib.sha256(self.room_id.encode()).hexdigest()[:8]
-        random_component = uuid.uuid4().hex[:8]
-        return f"{timestamp}-{room_hash}-{random_component}"
+        """Генерирует криптографически стойкий seed для игры (без пула)"""
+        return new_seed()
     
     def _generate_nonce(self) -> str:
         """Генерирует nonce для дополнительной случайности"""
@@ -51,18 +56,20 @@ class DiceGame:
         """
         Генерирует детерминированные значения кубиков для игрока согласно ТЗ
         Использует единый seed для всех игроков для обеспечения честности
+        (алгоритм и несмещённый отбор байтов — в server.games.fair_dice)
         """
-        # Создаем уникальную строку для хеширования
-        hash_input = f"{self.game_seed}-{self.nonce}-{player_id}-round{round_num}".encode('utf-8')
-        
-        # Получаем SHA-256 хеш
-        digest = hashlib.sha256(hash_input).hexdigest()
-        
-        # Преобразуем первые байты в значения кубиков (1-6)
-        die1 = int(digest[:2], 16) % 6 + 1
-        die2 = int(digest[2:4], 16) % 6 + 1
-        
-        return die1, die2
+        return roll_dice(self.game_seed, self.nonce, player_id, round_num)
+    
+    def roll_round(self) -> Dict[str, Tuple[int, int]]:
+        """
+        Кубики всех игроков текущего раунда одной пачкой (совпадают с _generate_dice_for_player).
+        Returns:
+            Dict[str, Tuple[int, int]]: player_id -> (dice1, dice2)
+        """
+        key = (self.game_seed, self.nonce, self.round_number)
+        if self._round_dice is None or self._round_dice[0] != key:
+            self._round_dice = (key, roll_round(self.game_seed, self.nonce, list(self.players), self.round_number))
+        return self._round_dice[1]
     
     def player_roll_action(self, player_id: str) -> Dict:
         """
@@ -78,8 +85,8 @@ class DiceGame:
         if self.player_actions.get(player_id, False):
             return {"success": False, "error": "Player already rolled"}
         
-        # Генерируем кубики для игрока
-        dice1, dice2 = self._generate_dice_for_player(player_id, self.round_number)
+        # Кубики раунда считаются для всех игроков сразу при первом броске
+        dice1, dice2 = self.roll_round()[player_id]
         total = dice1 + dice2
         
         # Сохраняем результат
@@ -154,19 +161,19 @@ class DiceGame:
             "prize_per_winner": prize_per_winner,
             "total_prize": self.prize_pool,
             "results": {pid: result.__dict__ for pid, result in self.results.items()},
-            "seed": self.game_seed,  # Публикуем seed для проверки честности
-            "nonce": self.nonce      # Публикуем nonce для проверки честности
+            "seed": self.game_seed,  # Раскрываем seed для проверки честности
+            "seed_hash": self.seed_hash,
+            "nonce": self.nonce
         }
     
     def prepare_reroll(self) -> None:
         """
-        Подготавливает переброс при полной ничьей (новый nonce, очистка результатов).
+        Подготавливает переброс при полной ничьей (следующий раунд, очистка результатов).
+        Seed и nonce не меняются: они уже объявлены игрокам, раунды различаются номером.
         """
         self.round_number += 1
         self.player_actions = {pid: False for pid in self.players.keys()}
         self.results.clear()
-        # Генерируем новый nonce для переброса
-        self.nonce = self._generate_nonce()
     
     def get_game_state(self) -> Dict:
         """
@@ -196,8 +203,7 @@ class DiceGame:
         Returns:
             bool: True если результат честный
         """
-        actual_dice1, actual_dice2 = self._generate_dice_for_player(player_id, self.round_number)
-        return actual_dice1 == expected_dice1 and actual_dice2 == expected_dice2
+        return verify_roll(self.game_seed, self.nonce, player_id, self.round_number, expected_dice1, expected_dice2)
         """
         Обрабатывает действие игрока "бросить кубики"
         Возвращает True если все игроки сделали ход
@@ -258,8 +264,7 @@ class DiceGame:
     
     def _prepare_reroll(self):
         """Подготавливает переброс в случае ничьей между всеми игроками"""
-        self.round_number += 1
-        self.game_seed = self._generate_seed()  # Новый seed для честности
+        self.round_number += 1  # Seed не меняется: игроки уже знают его обязательство
         self.player_actions = {p_id: False for p_id in self.players.keys()}
         self.results = {}
     
@@ -267,7 +272,8 @@ class DiceGame:
         """Возвращает текущее состояние игры"""
         return {
             "room_id": self.room_id,
-            "game_seed_hash": hashlib.sha256(self.game_seed.encode()).hexdigest()[:16],  # Для верификации
+            "game_seed_hash": self.seed_hash,  # Обязательство по seed (seed раскрывается в результатах)
+            "nonce": self.nonce,
             "round_number": self.round_number,
             "player_actions": self.player_actions,
             "results": {pid: {
@@ -0,0 +1,161 @@
+"""
+Доказуемо честные броски кубиков (provably fair).
+
+Алгоритм (его повторяет любой, кто проверяет опубликованные seed и nonce):
+1. message = f"{seed}-{nonce}-{player_id}-round{round_num}" в UTF-8.
+2. Поток байтов: SHA-256(message), затем SHA-256(message || i) для i = 1, 2, ...
+   (i — 4 байта big-endian); дополнительные блоки нужны, только если не хватило первого.
+3. Байт b < 252 даёт кубик b % 6 + 1, байты 252..255 пропускаются — так все
+   шесть граней равновероятны (252 = 42 * 6), в отличие от b % 6 по всем байтам.
+4. Первые два принятых байта — dice1 и dice2.
+До первого броска игрокам публикуется commitment(seed) = sha256(seed), после
+игры — сам seed; совпадение хеша доказывает, что seed не подменён по ходу игры.
+
+roll_dice / verify_roll — эталон: побайтовый и очевидный. roll_round и roll_rounds
+дают те же значения пачкой: общий префикс сообщения хешируется один раз, грани
+берутся из байтов дайджеста таблицей, без hex-строк и цикла Python по байтам.
+"""
+import hashlib
+from typing import Dict, List, Sequence, Tuple
+
+# Байты, которые отображаются на грань без смещения: 0..ACCEPT_BELOW-1
+ACCEPT_BELOW = 252
+
+# b -> грань 1..6 для принимаемых байтов, 0 для отбрасываемых
+_FACES = bytes(b % 6 + 1 if b < ACCEPT_BELOW else 0 for b in range(256))
+
+
+def commitment(seed: str) -> str:
+    """Обязательство по серверному seed: sha256(seed) в hex."""
+    return hashlib.sha256(seed.encode("utf-8")).hexdigest()
+
+
+def _extra_block(message: bytes, index: int) -> bytes:
+    return hashlib.sha256(message + index.to_bytes(4, "big")).digest()
+
+
+def roll_dice(seed: str, nonce: str, player_id: str, round_num: int = 1) -> Tuple[int, int]:
+    """
+    Эталонный бросок двух кубиков игрока.
+    Args:
+        seed (str): seed игры
+        nonce (str): nonce раунда
+        player_id (str): ID игрока
+        round_num (int): номер раунда
+    Returns:
+        Tuple[int, int]: значения кубиков 1..6
+    """
+    message = f"{seed}-{nonce}-{player_id}-round{round_num}".encode("utf-8")
+    dice: List[int] = []
+    block, index = hashlib.sha256(message).digest(), 0
+    while True:
+        for byte in block:
+            if byte < ACCEPT_BELOW:
+                dice.append(byte % 6 + 1)
+                if len(dice) == 2:
+                    return dice[0], dice[1]
+        index += 1
+        block = _extra_block(message, index)
+
+
+def verify_roll(seed: str, nonce: str, player_id: str, round_num: int, dice1: int, dice2: int) -> bool:
+    """Проверяет опубликованный бросок по seed и nonce."""
+    return roll_dice(seed, nonce, player_id, round_num) == (dice1, dice2)
+
+
+def _faces_after(prefix_hash, prefix: bytes, tail: bytes) -> Tuple[int, int]:
+    """Кубики для message = prefix + tail; prefix_hash — SHA-256, уже получивший prefix."""
+    h = prefix_hash.copy()
+    h.update(tail)
+    digest = h.digest()
+    # Оба первых байта принимаются с вероятностью (252/256)^2 ~ 97%
+    dice1, dice2 = _FACES[digest[0]], _FACES[digest[1]]
+    if dice1 and dice2:
+        return dice1, dice2
+    faces = digest.translate(_FACES).replace(b"\x00", b"")
+    index = 0
+    while len(faces) < 2:
+        # Отброшено не меньше 31 байта из 32 — практически недостижимо, но поток определён
+        index += 1
+        faces += _extra_block(prefix + tail, index).translate(_FACES).replace(b"\x00", b"")
+    return faces[0], faces[1]
+
+
+def roll_round(seed: str, nonce: str, player_ids: Sequence[str], round_num: int = 1) -> Dict[str, Tuple[int, int]]:
+    """
+    Кубики всех игроков одного раунда (значения совпадают с roll_dice).
+    Args:
+        seed (str): seed игры
+        nonce (str): nonce раунда
+        player_ids (Sequence[str]): ID игроков
+        round_num (int): номер раунда
+    Returns:
+        Dict[str, Tuple[int, int]]: player_id -> (dice1, dice2)
+    """
+    prefix = f"{seed}-{nonce}-".encode("utf-8")
+    prefix_hash = hashlib.sha256(prefix)
+    suffix = f"-round{round_num}".encode("utf-8")
+    return {
+        player_id: _faces_after(prefix_hash, prefix, player_id.encode("utf-8") + suffix)
+        for player_id in player_ids
+    }
+
+
+def roll_rounds(seed: str, nonce: str, player_ids: Sequence[str], rounds: int,
+                first_round: int = 1) -> List[List[Tuple[int, int]]]:
+    """
+    Кубики многих раундов подряд для симуляций и аудита.
+    Args:
+        seed (str): seed игры
+        nonce (str): nonce (общий для всех раундов)
+        player_ids (Sequence[str]): ID игроков
+        rounds (int): число раундов
+        first_round (int): номер первого раунда
+    Returns:
+        List[List[Tuple[int, int]]]: по раунду — кубики игроков в порядке player_ids
+    """
+    prefix = f"{seed}-{nonce}-".encode("utf-8")
+    prefix_hash = hashlib.sha256(prefix)
+    heads = [player_id.encode("utf-8") + b"-round" for player_id in player_ids]
+    result = []
+    for round_num in range(first_round, first_round + rounds):
+        number = str(round_num).encode("ascii")
+        result.append([_faces_after(prefix_hash, prefix, head + number) for head in heads])
+    return result
+
+
+def verify_batch(rounds: Sequence[Dict]) -> List[Dict]:
+    """
+    Проверяет много опубликованных бросков за один вызов.
+    Броски с одинаковыми seed и nonce используют общий префикс хеша; обязательство
+    по каждому seed проверяется один раз.
+    Args:
+        rounds (Sequence[Dict]): броски: seed, nonce, player_id, round, dice1, dice2
+            и необязательный seed_hash — опубликованное до игры sha256(seed)
+    Returns:
+        List[Dict]: по броску — valid, commitment_ok (None без seed_hash) и ожидаемые dice
+    """
+    prefixes: Dict[Tuple[str, str], Tuple[bytes, object]] = {}
+    commitments: Dict[str, str] = {}
+    results = []
+    for item in rounds:
+        key = (item["seed"], item["nonce"])
+        if key not in prefixes:
+            prefix = f"{item['seed']}-{item['nonce']}-".encode("utf-8")
+            prefixes[key] = (prefix, hashlib.sha256(prefix))
+        prefix, prefix_hash = prefixes[key]
+        dice = _faces_after(prefix_hash, prefix, f"{item['player_id']}-round{item['round']}".encode("utf-8"))
+
+        commitment_ok = None
+        if item.get("seed_hash") is not None:
+            if item["seed"] not in commitments:
+                commitments[item["seed"]] = commitment(item["seed"])
+            commitment_ok = commitments[item["seed"]] == item["seed_hash"].lower()
+
+        matches = dice == (item["dice1"], item["dice2"])
+        results.append({
+            "valid": matches and commitment_ok is not False,
+            "commitment_ok": commitment_ok,
+            "dice": list(dice),
+        })
+    return results
@@ -0,0 +1,83 @@
+import asyncio
+import secrets
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from server.games.fair_dice import commitment
+
+
+def new_seed() -> str:
+    """Серверный seed: 32 случайных байта из secrets в hex."""
+    return secrets.token_hex(32)
+
+
+class SeedPool:
+    """
+    Пул заранее сгенерированных серверных seed для схемы commit-reveal.
+    - take() мгновенно отдаёт пару (seed, sha256(seed)) из очереди: на старте игры
+      нет криптографической работы.
+    - Когда в пуле остаётся меньше low_water пар, фоновая задача дополняет его до
+      size пачками по batch, уступая цикл событий между пачками.
+    - Если пул пуст (всплеск стартов), пара генерируется на месте; такие случаи
+      считаются в misses — повод увеличить размер пула.
+    """
+
+    def __init__(self, size: int = 1024, low_water: Optional[int] = None, batch: int = 64):
+        """
+        Args:
+            size (int): целевой размер пула
+            low_water (Optional[int]): порог запуска пополнения (по умолчанию половина size)
+            batch (int): пар за один шаг пополнения
+        """
+        self.size = size
+        self.low_water = size // 2 if low_water is None else low_water
+        self.batch = batch
+        self._seeds: Deque[Tuple[str, str]] = deque()
+        self._refill_task: Optional[asyncio.Task] = None
+        self.taken = 0
+        self.misses = 0
+
+    @staticmethod
+    def _make() -> Tuple[str, str]:
+        seed = new_seed()
+        return seed, commitment(seed)
+
+    def take(self) -> Tuple[str, str]:
+        """
+        Выдаёт seed для новой игры.
+        Returns:
+            Tuple[str, str]: (seed, commitment) — seed держится в секрете до конца игры
+        """
+        self.taken += 1
+        if self._seeds:
+            pair = self._seeds.popleft()
+        else:
+            self.misses += 1
+            pair = self._make()
+        if len(self._seeds) < self.low_water:
+            self._schedule_refill()
+        return pair
+
+    def fill(self):
+        """Синхронно заполняет пул до size (при запуске процесса)."""
+        while len(self._seeds) < self.size:
+            self._seeds.append(self._make())
+
+    def _schedule_refill(self):
+        if self._refill_task is not None and not self._refill_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # Вне цикла событий пул пополнится при следующем take() или fill()
+        self._refill_task = loop.create_task(self._refill())
+
+    async def _refill(self):
+        while len(self._seeds) < self.size:
+            for _ in range(min(self.batch, self.size - len(self._seeds))):
+                self._seeds.append(self._make())
+            await asyncio.sleep(0)
+
+    def stats(self) -> Dict[str, int]:
+        """Счётчики пула для /health и отладки."""
+        return {"available": len(self._seeds), "taken": self.taken, "misses": self.misses}
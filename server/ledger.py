@@ -0,0 +1,287 @@
+"""
+Балансы игроков RoomManager поверх таблицы users.
+
+Ставка при готовности списывается в базе сразу (условный UPDATE), а не только
+резервируется в памяти. Резерв в памяти защищал бы лишь от трат внутри этого
+процесса, а вывод через REST, кейсы и комнаты других узлов и шардов видят
+только базу. Поэтому на горячем пути остаётся один короткий запрос на ставку,
+а всё остальное — чтение баланса при входе, выигрыши и возвраты — идёт через
+кэш и пакетную запись (BatchWriter).
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from server.batch_writer import BatchSink, BatchWriter
+from server.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Начисления комнаты для записи в базу (ставки списаны ещё при резерве):
+# {"room_id": str, "entries": [{"telegram_id", "amount", "kind"}]}, kind — win или refund
+Settlement = Dict
+
+
+@dataclass(slots=True)
+class Account:
+    """Баланс игрока в кэше ledger."""
+    balance: int          # баланс в базе с учётом резервов и ещё не записанных начислений
+    held: int = 0         # ставки, списанные в базе под комнаты, ещё не рассчитанные
+    in_flight: int = 0    # начислений в очереди записи
+    rooms: int = 0        # комнат, в которых игрок сейчас состоит
+
+    @property
+    def available(self) -> int:
+        return self.balance
+
+    @property
+    def idle(self) -> bool:
+        """Кэш можно перечитать из базы или выбросить."""
+        return self.held == 0 and self.in_flight == 0 and self.rooms == 0
+
+
+class LedgerStore(BatchSink):
+    """
+    Балансы в таблице users (User.stars_balance) по telegram_id.
+    - reserve() списывает ставку сразу, условным UPDATE ... WHERE stars_balance >= :bet
+      RETURNING (server.balances.conditional_debit), со строкой transactions (bet).
+      Звёзды, поставленные в комнате, уже не потратить через REST или в другой комнате.
+    - write() применяет пачку начислений (выигрыши и возвраты ставок) одной
+      транзакцией: по одному UPDATE stars_balance = stars_balance + amount на игрока
+      (executemany) и строки transactions (win / refund). Начисления не уводят баланс
+      в минус, поэтому условие для них не нужно.
+    """
+
+    def __init__(self, session_factory: Optional[Callable] = None):
+        self._session_factory = session_factory
+
+    def _session(self):
+        from server.database_sqlite import SessionLocal
+        return (self._session_factory or SessionLocal)()
+
+    def load_balance(self, telegram_id: str) -> int:
+        """Баланс пользователя в базе; незарегистрированный игрок — 0."""
+        from sqlalchemy import select
+        from server.database_sqlite import User
+
+        with self._session() as db:
+            return db.scalar(select(User.stars_balance).where(User.telegram_id == telegram_id)) or 0
+
+    def reserve(self, telegram_id: str, amount: int, room_id: str) -> Optional[int]:
+        """
+        Списывает ставку, если на балансе достаточно средств.
+        Returns:
+            Optional[int]: новый баланс; None — пользователя нет или средств недостаточно
+        """
+        from sqlalchemy import insert
+        from server.balances import conditional_debit, users
+        from server.database_sqlite import Transaction
+
+        with self._session() as db:
+            row = db.execute(conditional_debit(amount, users.c.telegram_id == telegram_id)).first()
+            if row is None:
+                db.rollback()
+                return None
+            db.execute(insert(Transaction).values(self._transaction(
+                row.id, "bet", -amount, room_id, f"Ставка в комнате {room_id}"
+            )))
+            db.commit()
+            return row.stars_balance
+
+    def write(self, records: List[Settlement]):
+        from sqlalchemy import bindparam, insert, select, update
+        from server.database_sqlite import Transaction, User
+
+        credits: Dict[str, int] = {}
+        for record in records:
+            for entry in record["entries"]:
+                credits[entry["telegram_id"]] = credits.get(entry["telegram_id"], 0) + entry["amount"]
+
+        with self._session() as db:
+            users = dict(db.execute(select(User.telegram_id, User.id).where(User.telegram_id.in_(credits))).all())
+            changes = [{"tg": telegram_id, "amount": amount} for telegram_id, amount in credits.items()
+                       if amount and telegram_id in users]
+            if changes:
+                db.connection().execute(
+                    update(User.__table__)
+                    .where(User.__table__.c.telegram_id == bindparam("tg"))
+                    .values(stars_balance=User.__table__.c.stars_balance + bindparam("amount")),
+                    changes
+                )
+            rows = []
+            for record in records:
+                for entry in record["entries"]:
+                    user_id = users.get(entry["telegram_id"])
+                    if user_id is None or not entry["amount"]:
+                        continue
+                    description = (f"Выигрыш в комнате {record['room_id']}" if entry["kind"] == "win"
+                                   else f"Возврат ставки в комнате {record['room_id']}")
+                    rows.append(self._transaction(user_id, entry["kind"], entry["amount"], record["room_id"], description))
+            if rows:
+                db.execute(insert(Transaction), rows)
+            db.commit()
+
+    @staticmethod
+    def _transaction(user_id: str, kind: str, amount: int, room_id: str, description: str) -> Dict:
+        return {
+            "user_id": user_id,
+            "type": kind,
+            "amount": amount,
+            "description": description,
+            "payment_method": "internal",
+            "status": "success",
+            "room_id": room_id,
+        }
+
+
+class BalanceLedger:
+    """
+    Балансы игроков RoomManager: ставки списываются в базе при готовности,
+    выигрыши и возвраты записываются в базу пачками.
+    - open_account() при входе в комнату читает баланс из базы (в потоке) —
+      только если кэш игрока простаивает, иначе баланс уже известен точнее базы.
+    - hold() при готовности списывает ставку в базе условным UPDATE (в потоке):
+      база — единственный источник правды о средствах, поэтому параллельные траты
+      через REST (вывод, кейсы) и комнаты в других процессах не приводят к двойной трате.
+    - release() возвращает ставки комнаты (отмена, ничья) начислением в очереди записи.
+    - settle() начисляет выигрыши: сразу в кэше и в очереди BatchWriter; записанные
+      пачки уменьшают in_flight.
+    - leave() при удалении комнаты; простаивающий кэш выбрасывается.
+    """
+
+    def __init__(self, store: Optional[LedgerStore] = None, batch_size: int = 200, flush_interval: float = 0.5):
+        """
+        Args:
+            store (Optional[LedgerStore]): балансы в базе
+            batch_size (int): расчётов в одной транзакции
+            flush_interval (float): максимальная задержка записи расчёта, сек
+        """
+        self.store = store or LedgerStore()
+        self.accounts: Dict[str, Account] = {}
+        # room_id -> {telegram_id: списанная ставка}
+        self.holds: Dict[str, Dict[str, int]] = {}
+        # Начисления нельзя терять: без предела очереди и числа повторов
+        self.writer = BatchWriter(
+            self.store, batch_size=batch_size, flush_interval=flush_interval,
+            max_pending=None, max_attempts=None, on_written=self._on_written, name="Ledger"
+        )
+
+    async def open_account(self, telegram_id: str) -> int:
+        """
+        Регистрирует игрока в комнате и возвращает доступный баланс.
+        Args:
+            telegram_id (str): Telegram ID игрока
+        Returns:
+            int: баланс за вычетом списанных ставок
+        """
+        account = self.accounts.get(telegram_id)
+        if account is None or account.idle:
+            balance = await asyncio.to_thread(self.store.load_balance, telegram_id)
+            account = self.accounts.get(telegram_id)  # Пока шёл запрос, кэш мог измениться
+            if account is None or account.idle:
+                account = self.accounts[telegram_id] = Account(balance)
+        account.rooms += 1
+        return account.available
+
+    def available(self, telegram_id: str) -> int:
+        account = self.accounts.get(telegram_id)
+        return account.available if account is not None else 0
+
+    async def hold(self, room_id: str, telegram_id: str, amount: int) -> bool:
+        """
+        Списывает ставку игрока в комнате в базе.
+        Returns:
+            bool: False — недостаточно средств в базе (или игрок не открыт через open_account)
+        """
+        if telegram_id not in self.accounts:
+            return False
+        balance = await asyncio.to_thread(self.store.reserve, telegram_id, amount, room_id)
+        if balance is None:
+            return False
+        account = self.accounts.get(telegram_id)
+        if account is None:
+            # Пока шёл запрос, игрок покинул все комнаты: ставка уже списана в базе,
+            # держать её негде — возвращаем начислением
+            self.accounts[telegram_id] = Account(balance)
+            self._credit(telegram_id, amount)
+            self.writer.submit({"room_id": room_id, "entries": [
+                {"telegram_id": telegram_id, "amount": amount, "kind": "refund"}
+            ]})
+            return False
+        # Баланс в базе уже учитывает траты вне комнат; кэш добавляет ещё не записанные начисления
+        account.balance -= amount
+        account.held += amount
+        room_holds = self.holds.setdefault(room_id, {})
+        room_holds[telegram_id] = room_holds.get(telegram_id, 0) + amount
+        return True
+
+    def release(self, room_id: str):
+        """Возвращает все ставки комнаты."""
+        entries = []
+        for telegram_id, amount in self.holds.pop(room_id, {}).items():
+            self._credit(telegram_id, amount)
+            self.accounts[telegram_id].held -= amount
+            entries.append({"telegram_id": telegram_id, "amount": amount, "kind": "refund"})
+        if entries:
+            self.writer.submit({"room_id": room_id, "entries": entries})
+
+    def settle(self, room_id: str, prizes: Dict[str, int]):
+        """
+        Рассчитывает комнату: ставки уже списаны при резерве, начисляются выигрыши.
+        Args:
+            room_id (str): ID комнаты
+            prizes (Dict[str, int]): telegram_id -> выигрыш (игроки без выигрыша теряют ставку)
+        """
+        entries = []
+        for telegram_id, bet in self.holds.pop(room_id, {}).items():
+            self.accounts[telegram_id].held -= bet
+            prize = prizes.get(telegram_id, 0)
+            if prize:
+                self._credit(telegram_id, prize)
+                entries.append({"telegram_id": telegram_id, "amount": prize, "kind": "win"})
+        if entries:
+            self.writer.submit({"room_id": room_id, "entries": entries})
+
+    def _credit(self, telegram_id: str, amount: int):
+        account = self.accounts[telegram_id]
+        account.balance += amount
+        account.in_flight += 1
+
+    def leave(self, telegram_id: str):
+        """Игрок покинул комнату (комната удалена)."""
+        account = self.accounts.get(telegram_id)
+        if account is None:
+            return
+        account.rooms -= 1
+        self._evict_if_idle(telegram_id, account)
+
+    def _on_written(self, records: List[Settlement]):
+        for record in records:
+            for entry in record["entries"]:
+                account = self.accounts[entry["telegram_id"]]
+                account.in_flight -= 1
+                self._evict_if_idle(entry["telegram_id"], account)
+
+    def _evict_if_idle(self, telegram_id: str, account: Account):
+        if account.idle:
+            del self.accounts[telegram_id]
+
+    async def close(self):
+        """Дописывает очередь начислений."""
+        await self.writer.close()
+
+    def stats(self) -> Dict:
+        """Счётчики для /health."""
+        return {
+            "accounts": len(self.accounts),
+            "held": sum(account.held for account in self.accounts.values()),
+            "writer": self.writer.stats(),
+        }
+
+
+def create_ledger() -> Optional[BalanceLedger]:
+    """Ledger по настройкам: LEDGER=db (по умолчанию) или off — демо-балансы в памяти комнаты."""
+    if settings.LEDGER == "off":
+        return None
+    return BalanceLedger(batch_size=settings.LEDGER_BATCH, flush_interval=settings.LEDGER_FLUSH_INTERVAL)
@@ -4,19 +4,29 @@ load_dotenv()
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depends, Request
 from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-import json
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import asyncio
 import logging
 import os
-from typing import Dict, List
+import uuid
+from typing import Dict, List, Optional
 from server.models import (
-    CreateRoomRequest, RoomJoinRequest, PlayerActionRequest, 
-    GameType, Room, Player, RoomUpdate
+    CreateRoomRequest, RoomJoinRequest, PlayerActionRequest, AutoMatchRequest,
+    GameType, Room, Player, RoomUpdate, VerifyRoundsRequest
 )
 from server.room_manager import RoomManager
+from server.room_store import create_room_store
+from server.game_history import create_history_writer
+from server.ledger import create_ledger
+from server.codec import CodecResponse
+from server.games.fair_dice import verify_batch
+from server.realtime.msgpack_protocol import SUBPROTOCOL as MSGPACK_SUBPROTOCOL, decode_action
+from server import codec
+from server.sharding import ShardPool, ShardedRoomManager
 from server.telegram_news_service import telegram_news_service
-from server.database_sqlite import get_db, User, GameRoom, Transaction, SessionLocal
+from server.database_sqlite import get_async_db, User, GameRoom, Transaction
+from server.balances import complete_pending, credit, debit, transactions
 from server.config import settings
 from server.game_api import router as game_router
 from server.games.database_dice import dice_router
@@ -30,7 +40,7 @@ from server.api.nft import router as nft_api_router
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Telegram Mini Games API", version="1.0.0")
+app = FastAPI(title="Telegram Mini Games API", version="1.0.0", default_response_class=CodecResponse)
 
 # Логируем CORS настройки для отладки
 logger.info(f"Configuring CORS with origins: {settings.ALLOWED_ORIGINS}")
@@ -87,8 +97,12 @@ async def cors_middleware(request: Request, call_next):
     
     return response
 
-# Глобальный менеджер комнат
-room_manager = RoomManager()
+# Глобальный менеджер комнат; при ROOM_SHARDS > 1 комнаты распределяются по процессам-шардам
+if settings.ROOM_SHARDS > 1:
+    _shard_pool = ShardPool(settings.ROOM_SHARDS)
+    room_manager = ShardedRoomManager(_shard_pool.socket_paths, _shard_pool)
+else:
+    room_manager = RoomManager(store=create_room_store(), history=create_history_writer(), ledger=create_ledger())
 
 # Подключение роутеров (без дублирования)
 app.include_router(payments_router)  # Платежная система
@@ -98,6 +112,11 @@ app.include_router(game_router)      # Игровые API
 app.include_router(dice_router)      # Кубики
 app.include_router(rps_router)       # Камень-ножницы-бумага
 
+@app.on_event("shutdown")
+async def shutdown():
+    """Дописывает очередь истории игр и закрывает менеджер комнат"""
+    await room_manager.close()
+
 @app.get("/")
 async def root():
     return {"message": "Telegram Mini Games API", "status": "running", "database": "connected"}
@@ -131,9 +150,9 @@ async def telegram_webhook(request: Request):
 
 # API для работы с пользователями
 @app.get("/api/users/{telegram_id}")
-async def get_user(telegram_id: str, db: Session = Depends(get_db)):
+async def get_user(telegram_id: str, db: AsyncSession = Depends(get_async_db)):
     """Получить информацию о пользователе по Telegram ID"""
-    user = db.query(User).filter(User.telegram_id == telegram_id).first()
+    user = await db.scalar(select(User).where(User.telegram_id == telegram_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return {
@@ -147,10 +166,10 @@ async def get_user(telegram_id: str, db: Session = Depends(get_db)):
     }
 
 @app.post("/api/users")
-async def create_user(user_data: dict, db: Session = Depends(get_db)):
+async def create_user(user_data: dict, db: AsyncSession = Depends(get_async_db)):
     """Создать нового пользователя"""
     # Проверяем, не существует ли уже пользователь
-    existing_user = db.query(User).filter(User.telegram_id == user_data["telegram_id"]).first()
+    existing_user = await db.scalar(select(User).where(User.telegram_id == user_data["telegram_id"]))
     if existing_user:
         return {"message": "User already exists", "user_id": str(existing_user.id)}
     
@@ -163,8 +182,7 @@ async def create_user(user_data: dict, db: Session = Depends(get_db)):
         stars_balance=100  # Стартовый баланс
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
     
     return {
         "message": "User created successfully",
@@ -173,32 +191,34 @@ async def create_user(user_data: dict, db: Session = Depends(get_db)):
     }
 
 @app.post("/api/users/{telegram_id}/add-stars")
-async def add_stars(telegram_id: str, amount: int, db: Session = Depends(get_db)):
+async def add_stars(telegram_id: str, amount: int, db: AsyncSession = Depends(get_async_db)):
     """Добавить звезды пользователю (для тестирования)"""
-    user = db.query(User).filter(User.telegram_id == telegram_id).first()
+    user = await db.scalar(select(User).where(User.telegram_id == telegram_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    user.stars_balance += amount
-    
-    # Создать транзакцию
-    transaction = Transaction(
-        user_id=user.id,
+    # Начисление и транзакция одним атомарным изменением
+    balance = await credit(
+        db, user.id, amount,
         type="stars_purchase",
-        amount=amount,
         description=f"Added {amount} stars for testing"
     )
-    db.add(transaction)
-    db.commit()
+    await db.commit()
     
     return {
         "message": f"Added {amount} stars",
-        "new_balance": user.stars_balance
+        "new_balance": balance
     }
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "rooms_count": len(room_manager.rooms)}
+    stats = await room_manager.stats()
+    return {
+        "status": "healthy",
+        "rooms_count": stats["rooms_count"],
+        "pending_timers": stats["pending_timers"],
+        "connections": stats["connections"]
+    }
 
 # REST API endpoints
 
@@ -222,9 +242,12 @@ async def create_room(request: CreateRoomRequest):
         
         return {
             "success": True,
-            "room": room.dict(),
+            "room": room.to_dict(),
             "invite_link": room.get_invite_link()
         }
+    except ValueError as e:
+        # Игрок уже состоит в другой комнате
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error creating room: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -251,12 +274,40 @@ async def join_room(request: RoomJoinRequest):
         
         return {
             "success": True,
-            "room": room.dict()
+            "room": room.to_dict()
         }
     except Exception as e:
         logger.error(f"Error joining room: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/rooms/auto-match")
+async def auto_match(request: AutoMatchRequest):
+    """
+    Быстрая игра: помещает игрока в подходящую открытую комнату или создаёт новую.
+    Args:
+        request (AutoMatchRequest): параметры матчмейкинга
+    Returns:
+        dict: данные комнаты и признак создания новой комнаты
+    """
+    try:
+        room, created = await room_manager.auto_match(
+            player_id=request.player_id,
+            telegram_id=request.telegram_id,
+            username=request.username,
+            game_type=request.game_type,
+            bet_amount=request.bet_amount
+        )
+        
+        return {
+            "success": True,
+            "created": created,
+            "room": room.to_dict(),
+            "invite_link": room.get_invite_link()
+        }
+    except Exception as e:
+        logger.error(f"Error in auto-match: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/rooms/available/{game_type}")
 async def get_available_rooms(game_type: GameType, max_bet: int = None):
     """
@@ -268,25 +319,44 @@ async def get_available_rooms(game_type: GameType, max_bet: int = None):
         dict: список комнат
     """
     try:
-        rooms = room_manager.get_available_rooms(game_type, max_bet)
+        rooms = await room_manager.available_rooms(game_type, max_bet)
         return {
             "success": True,
-            "rooms": [room.dict() for room in rooms]
+            "rooms": [room.to_dict() for room in rooms]
         }
     except Exception as e:
         logger.error(f"Error getting available rooms: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/rooms/{room_id}")
-async def get_room_info(room_id: str):
-    """Получить информацию о комнате"""
-    if room_id not in room_manager.rooms:
+async def get_room_info(room_id: str, since_version: int = None):
+    """
+    Получить информацию о комнате.
+    Args:
+        room_id (str): ID комнаты
+        since_version (int, optional): версия комнаты, известная клиенту;
+            если она актуальна, снимок не передаётся
+    """
+    info = await room_manager.room_info(room_id, since_version)
+    if info is None:
         raise HTTPException(status_code=404, detail="Комната не найдена")
     
-    room = room_manager.rooms[room_id]
+    return {"success": True, **info}
+
+@app.post("/api/fairness/verify")
+async def verify_rounds(request: VerifyRoundsRequest):
+    """
+    Пакетная проверка честности прошедших бросков: любой может прислать до 10000
+    опубликованных бросков (seed, seed_hash, nonce, игрок, раунд, кубики).
+    Returns:
+        dict: число честных бросков и результат по каждому в порядке запроса
+    """
+    results = verify_batch([item.dict() for item in request.rounds])
     return {
         "success": True,
-        "room": room.dict()
+        "total": len(results),
+        "valid": sum(1 for result in results if result["valid"]),
+        "results": results
     }
 
 @app.post("/api/rooms/{room_id}/ready")
@@ -299,7 +369,7 @@ async def ready_player(room_id: str, player_id: str):
         
         return {
             "success": True,
-            "room": room.dict()
+            "room": room.to_dict()
         }
     except Exception as e:
         logger.error(f"Error setting player ready: {e}")
@@ -307,40 +377,53 @@ async def ready_player(room_id: str, player_id: str):
 
 # WebSocket endpoint для реального времени
 @app.websocket("/ws/{player_id}")
-async def websocket_endpoint(websocket: WebSocket, player_id: str):
+async def websocket_endpoint(websocket: WebSocket, player_id: str, resume_from: Optional[int] = None):
     """
     WebSocket endpoint для реального времени (игровые события, обновления).
     Args:
         websocket (WebSocket): соединение
         player_id (str): ID игрока
+        resume_from (Optional[int]): seq последнего события комнаты, полученного до разрыва
+            (/ws/{player_id}?resume_from=42) — клиент получит только пропущенные события
     """
-    await websocket.accept()
-    await room_manager.connect_player(player_id, websocket)
+    # Клиент может предложить бинарный подпротокол msgpack; остальные получают JSON
+    protocol = MSGPACK_SUBPROTOCOL if MSGPACK_SUBPROTOCOL in websocket.scope.get("subprotocols", []) else "json"
+    await websocket.accept(subprotocol=MSGPACK_SUBPROTOCOL if protocol == MSGPACK_SUBPROTOCOL else None)
+    # Все исходящие сообщения идут через очередь подключения и её единственного писателя
+    connection = await room_manager.connect_player(player_id, websocket, protocol, resume_from)
     
     try:
         logger.info(f"Player {player_id} connected via WebSocket")
         
         while True:
-            # Получаем сообщения от клиента
-            data = await websocket.receive_text()
-            message = json.loads(data)
+            # Получаем сообщения от клиента: текстовые JSON или бинарные msgpack
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            # Любой фрейм клиента — признак живого соединения для heartbeat
+            connection.touch()
+            if frame.get("bytes") is not None:
+                message = decode_action(frame["bytes"])
+            else:
+                message = codec.loads(frame["text"])
             
             action_type = message.get("action")
             
             if action_type == "ping":
-                await websocket.send_text(json.dumps({"type": "pong"}))
+                await room_manager._send_private_message(player_id, {"type": "pong"})
+            
+            elif action_type == "pong":
+                # Ответ на серверный heartbeat; активность уже отмечена
+                pass
             
             elif action_type == "dice_action":
                 # Действие в игре кубики
-                room_id = room_manager.player_to_room.get(player_id)
+                room_id = await room_manager.player_room(player_id)
                 if room_id:
                     dice_action = message.get("dice_action", "roll")  # "roll"
                     await room_manager.handle_dice_action(player_id, room_id, dice_action)
                 else:
-                    await websocket.send_text(json.dumps({
-                        "type": "error", 
-                        "data": {"message": "Player not in any room"}
-                    }))
+                    await room_manager._send_to_player(player_id, "error", {"message": "Player not in any room"})
             
             elif action_type == "rps_choice":
                 # Выбор в камень-ножницы-бумага
@@ -351,40 +434,43 @@ async def websocket_endpoint(websocket: WebSocket, player_id: str):
                 # Игрок готов (оплачивает ставку)
                 await room_manager.ready_player(player_id)
             
+            elif action_type == "resync":
+                # Клиент обнаружил разрыв версий комнаты и просит снимок
+                await room_manager.resync_player(player_id, message.get("since_version"))
+            
+            elif action_type == "resume":
+                # Клиент обнаружил пропуск в seq событий и просит досылку
+                await room_manager.resume_player(player_id, int(message.get("resume_from", 0)))
+            
             else:
                 logger.warning(f"Unknown action from player {player_id}: {action_type}")
     
     except WebSocketDisconnect:
         logger.info(f"Player {player_id} disconnected")
-        await room_manager.disconnect_player(player_id)
+        await room_manager.disconnect_player(player_id, connection)
     except Exception as e:
         logger.error(f"WebSocket error for player {player_id}: {e}")
-        await room_manager.disconnect_player(player_id)
+        await room_manager.disconnect_player(player_id, connection)
 
 # Дополнительные endpoints для статистики и отладки
 
 @app.get("/api/debug/rooms")
 async def debug_rooms():
     """Отладочный endpoint для просмотра всех комнат"""
-    return {
-        "rooms": {room_id: room.dict() for room_id, room in room_manager.rooms.items()},
-        "matchmaker_queue": {
-            game_type.value: queue for game_type, queue in room_manager.matchmaker_queue.items()
-        },
-        "active_connections": len(room_manager.player_connections)
-    }
+    return await room_manager.debug_snapshot()
 
 @app.get("/api/player/{player_id}/status")
 async def get_player_status(player_id: str):
     """Получить статус игрока"""
-    room_id = room_manager.player_to_room.get(player_id)
+    room_id = await room_manager.player_room(player_id)
     is_connected = player_id in room_manager.player_connections
+    room = await room_manager.get_room(room_id) if room_id else None
     
     return {
         "player_id": player_id,
         "current_room": room_id,
         "is_connected": is_connected,
-        "room_info": room_manager.rooms.get(room_id, {}).dict() if room_id else None
+        "room_info": room.to_dict() if room else None
     }
 
 # Telegram Integration Endpoints
@@ -430,7 +516,7 @@ async def add_balance(telegram_id: str, request: dict):
 @app.get("/api/rooms/{room_id}/invite")
 async def get_room_invite_info(room_id: str):
     """Получить информацию о комнате для приглашения"""
-    room = room_manager.rooms.get(room_id)
+    room = await room_manager.get_room(room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     
@@ -559,25 +645,18 @@ async def get_news_categories():
         "data": categories
     }
 
-# Dependency для получения сессии
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @app.get("/api/user/balance")
-def get_user_balance(user_id: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+async def get_user_balance(user_id: str, db: AsyncSession = Depends(get_async_db)):
+    user = await db.get(User, user_id)
     if not user:
         return {"success": False, "error": "User not found"}
     return {"success": True, "balance": user.stars_balance}
 
 @app.get("/api/user/transactions")
-def get_user_transactions(user_id: str, db: Session = Depends(get_db)):
-    txs = db.query(Transaction).filter(Transaction.user_id == user_id).order_by(Transaction.created_at.desc()).limit(20).all()
+async def get_user_transactions(user_id: str, db: AsyncSession = Depends(get_async_db)):
+    txs = (await db.scalars(
+        select(Transaction).where(Transaction.user_id == user_id).order_by(Transaction.created_at.desc()).limit(20)
+    )).all()
     return {"success": True, "transactions": [
         {
             "id": str(tx.id),
@@ -590,64 +669,58 @@ def get_user_transactions(user_id: str, db: Session = Depends(get_db)):
     ]}
 
 @app.post("/api/user/deposit/ton")
-def deposit_ton(user_id: str, amount: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+async def deposit_ton(user_id: str, amount: int, db: AsyncSession = Depends(get_async_db)):
+    user = await db.get(User, user_id)
     if not user:
         return {"success": False, "error": "User not found"}
     tx = Transaction(user_id=user_id, type="deposit_ton", amount=amount, status="pending")
     db.add(tx)
-    db.commit()
-    db.refresh(tx)
+    await db.commit()
     # Здесь должна быть логика генерации TON-адреса и ожидания платежа
     return {"success": True, "transaction_id": str(tx.id)}
 
 @app.post("/api/user/deposit/telegram")
-def deposit_telegram(user_id: str, amount: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+async def deposit_telegram(user_id: str, amount: int, db: AsyncSession = Depends(get_async_db)):
+    user = await db.get(User, user_id)
     if not user:
         return {"success": False, "error": "User not found"}
     tx = Transaction(user_id=user_id, type="deposit_telegram", amount=amount, status="pending")
     db.add(tx)
-    db.commit()
-    db.refresh(tx)
+    await db.commit()
     # Здесь должна быть логика генерации Telegram Invoice через бота
     return {"success": True, "transaction_id": str(tx.id)}
 
 @app.post("/api/user/withdraw/ton")
-def withdraw_ton(user_id: str, amount: int, ton_address: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+async def withdraw_ton(user_id: str, amount: int, ton_address: str, db: AsyncSession = Depends(get_async_db)):
+    user = await db.get(User, user_id)
     if not user:
         return {"success": False, "error": "User not found"}
-    if user.stars_balance < amount:
+    # Условное списание: параллельные выводы не уводят баланс в минус
+    tx_id = str(uuid.uuid4())
+    balance = await debit(db, user_id, amount, id=tx_id, type="withdraw_ton", status="pending", description=f"Withdraw to {ton_address}")
+    if balance is None:
         return {"success": False, "error": "Insufficient balance"}
-    tx = Transaction(user_id=user_id, type="withdraw_ton", amount=-amount, status="pending", description=f"Withdraw to {ton_address}")
-    db.add(tx)
-    user.stars_balance -= amount
-    db.commit()
-    db.refresh(tx)
+    await db.commit()
     # Здесь должна быть логика отправки TON через TonAPI
-    return {"success": True, "transaction_id": str(tx.id)}
+    return {"success": True, "transaction_id": tx_id}
 
 @app.post("/api/webhook/ton")
-def ton_webhook(user_id: str, amount: int, tx_hash: str, db: Session = Depends(get_db)):
-    tx = db.query(Transaction).filter(Transaction.user_id == user_id, Transaction.ton_transaction_hash == tx_hash, Transaction.status == "pending").first()
+async def ton_webhook(user_id: str, amount: int, tx_hash: str, db: AsyncSession = Depends(get_async_db)):
+    # pending -> success условным UPDATE: повторный вебхук не начислит второй раз
+    tx = await complete_pending(db, transactions.c.user_id == user_id, transactions.c.ton_transaction_hash == tx_hash)
     if not tx:
         return {"success": False, "error": "Transaction not found"}
-    tx.status = "success"
-    user = db.query(User).filter(User.id == user_id).first()
-    user.stars_balance += amount
-    db.commit()
+    await credit(db, user_id, amount)
+    await db.commit()
     return {"success": True}
 
 @app.post("/api/webhook/telegram_payment")
-def telegram_payment_webhook(user_id: str, amount: int, payment_id: str, db: Session = Depends(get_db)):
-    tx = db.query(Transaction).filter(Transaction.user_id == user_id, Transaction.telegram_payment_id == payment_id, Transaction.status == "pending").first()
+async def telegram_payment_webhook(user_id: str, amount: int, payment_id: str, db: AsyncSession = Depends(get_async_db)):
+    tx = await complete_pending(db, transactions.c.user_id == user_id, transactions.c.telegram_payment_id == payment_id)
     if not tx:
         return {"success": False, "error": "Transaction not found"}
-    tx.status = "success"
-    user = db.query(User).filter(User.id == user_id).first()
-    user.stars_balance += amount
-    db.commit()
+    await credit(db, user_id, amount)
+    await db.commit()
     return {"success": True}
 
 if __name__ == "__main__":
@@ -0,0 +1,88 @@
+from bisect import bisect_right, insort
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from server.models import GameType
+from server.runtime_models import RuntimeRoom
+
+
+class MatchmakingIndex:
+    """
+    Индекс открытых комнат для матчмейкинга.
+    - Комнаты разложены по корзинам (game_type, bet_amount); внутри корзины
+      сохраняется порядок создания, поэтому старейшая комната идёт первой.
+    - Добавление и удаление комнаты — O(1) (плюс O(log B) при появлении новой ставки).
+    - Выборка комнат со ставкой ≤ max_bet — O(k + log B), где k — размер ответа,
+      B — число различных ставок.
+    В индексе хранятся только комнаты, к которым можно присоединиться.
+    """
+
+    def __init__(self):
+        # game_type -> bet_amount -> {room_id: None} (упорядоченное множество)
+        self._buckets: Dict[GameType, Dict[int, Dict[str, None]]] = {}
+        # game_type -> отсортированный список ставок, для которых есть корзины
+        self._bets: Dict[GameType, List[int]] = {}
+        # room_id -> (game_type, bet_amount)
+        self._location: Dict[str, Tuple[GameType, int]] = {}
+
+    def __contains__(self, room_id: str) -> bool:
+        return room_id in self._location
+
+    def __len__(self) -> int:
+        return len(self._location)
+
+    def add(self, room: RuntimeRoom):
+        """Добавляет комнату в индекс."""
+        if room.id in self._location:
+            return
+        buckets = self._buckets.setdefault(room.game_type, {})
+        bucket = buckets.get(room.bet_amount)
+        if bucket is None:
+            bucket = buckets[room.bet_amount] = {}
+            insort(self._bets.setdefault(room.game_type, []), room.bet_amount)
+        bucket[room.id] = None
+        self._location[room.id] = (room.game_type, room.bet_amount)
+
+    def remove(self, room_id: str) -> bool:
+        """
+        Убирает комнату из индекса.
+        Returns:
+            bool: True если комната была в индексе
+        """
+        location = self._location.pop(room_id, None)
+        if location is None:
+            return False
+        game_type, bet_amount = location
+        bucket = self._buckets[game_type][bet_amount]
+        del bucket[room_id]
+        if not bucket:
+            del self._buckets[game_type][bet_amount]
+            bets = self._bets[game_type]
+            del bets[bisect_right(bets, bet_amount) - 1]
+        return True
+
+    def first(self, game_type: GameType, bet_amount: int) -> Optional[str]:
+        """Старейшая открытая комната с точно такой ставкой."""
+        bucket = self._buckets.get(game_type, {}).get(bet_amount)
+        if not bucket:
+            return None
+        return next(iter(bucket))
+
+    def rooms(self, game_type: GameType, max_bet: Optional[int] = None) -> Iterator[str]:
+        """
+        ID открытых комнат данного типа со ставкой ≤ max_bet (по возрастанию ставки).
+        Args:
+            game_type (GameType): тип игры
+            max_bet (Optional[int]): максимальная ставка
+        """
+        bets = self._bets.get(game_type, [])
+        end = len(bets) if max_bet is None else bisect_right(bets, max_bet)
+        buckets = self._buckets.get(game_type, {})
+        for bet_amount in bets[:end]:
+            yield from buckets[bet_amount]
+
+    def snapshot(self) -> Dict[str, List[str]]:
+        """Содержимое индекса по типам игр (для отладки)."""
+        return {
+            game_type.value: list(self.rooms(game_type))
+            for game_type in GameType
+        }
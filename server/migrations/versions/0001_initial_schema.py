@@ -0,0 +1,174 @@
+"""initial schema
+
+Схема database_sqlite до появления миграций (как её создавал Base.metadata.create_all).
+Существующую базу достаточно пометить: alembic stamp 0001.
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-17 02:45:53.531855
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cases',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('description', sa.String(), nullable=True),
+    sa.Column('image_url', sa.String(), nullable=False),
+    sa.Column('price_stars', sa.Integer(), nullable=False),
+    sa.Column('price_ton', sa.Numeric(precision=10, scale=9), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('nft_items',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('description', sa.String(), nullable=True),
+    sa.Column('image_url', sa.String(), nullable=False),
+    sa.Column('rarity', sa.String(), nullable=False),
+    sa.Column('nft_type', sa.String(), nullable=False),
+    sa.Column('stars_value', sa.Integer(), nullable=False),
+    sa.Column('ton_value', sa.Numeric(precision=10, scale=9), nullable=True),
+    sa.Column('is_tradeable', sa.Boolean(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('extra_metadata', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('users',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('telegram_id', sa.String(), nullable=False),
+    sa.Column('username', sa.String(), nullable=True),
+    sa.Column('first_name', sa.String(), nullable=True),
+    sa.Column('last_name', sa.String(), nullable=True),
+    sa.Column('stars_balance', sa.Integer(), nullable=True),
+    sa.Column('total_games', sa.Integer(), nullable=True),
+    sa.Column('wins', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_users_telegram_id'), ['telegram_id'], unique=True)
+
+    op.create_table('case_items',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('case_id', sa.String(), nullable=False),
+    sa.Column('nft_item_id', sa.String(), nullable=False),
+    sa.Column('drop_chance', sa.Numeric(precision=5, scale=4), nullable=False),
+    sa.Column('min_value', sa.Integer(), nullable=False),
+    sa.Column('max_value', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['case_id'], ['cases.id'], ),
+    sa.ForeignKeyConstraint(['nft_item_id'], ['nft_items.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('game_rooms',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('game_type', sa.String(), nullable=False),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('min_players', sa.Integer(), nullable=True),
+    sa.Column('max_players', sa.Integer(), nullable=True),
+    sa.Column('current_players', sa.Integer(), nullable=True),
+    sa.Column('bet_amount', sa.Integer(), nullable=False),
+    sa.Column('creator_id', sa.String(), nullable=False),
+    sa.Column('prize_pool', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('game_data', sa.JSON(), nullable=True),
+    sa.ForeignKeyConstraint(['creator_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('roulette_draws',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('description', sa.String(), nullable=True),
+    sa.Column('prize_nft_id', sa.String(), nullable=False),
+    sa.Column('target_amount', sa.Integer(), nullable=False),
+    sa.Column('min_bet', sa.Integer(), nullable=False),
+    sa.Column('max_bet', sa.Integer(), nullable=False),
+    sa.Column('current_amount', sa.Integer(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('winner_id', sa.String(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['prize_nft_id'], ['nft_items.id'], ),
+    sa.ForeignKeyConstraint(['winner_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('transactions',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('type', sa.String(), nullable=False),
+    sa.Column('amount', sa.Integer(), nullable=False),
+    sa.Column('description', sa.String(), nullable=True),
+    sa.Column('payment_method', sa.String(), nullable=True),
+    sa.Column('telegram_payment_id', sa.String(), nullable=True),
+    sa.Column('ton_transaction_hash', sa.String(), nullable=True),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('room_id', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('user_nfts',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('nft_item_id', sa.String(), nullable=False),
+    sa.Column('acquired_at', sa.DateTime(), nullable=True),
+    sa.Column('acquired_from', sa.String(), nullable=False),
+    sa.Column('is_equipped', sa.Boolean(), nullable=True),
+    sa.ForeignKeyConstraint(['nft_item_id'], ['nft_items.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('game_participations',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('room_id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=True),
+    sa.Column('score', sa.Integer(), nullable=True),
+    sa.Column('prize_won', sa.Integer(), nullable=True),
+    sa.Column('player_data', sa.JSON(), nullable=True),
+    sa.Column('joined_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['room_id'], ['game_rooms.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('roulette_participations',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('draw_id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('amount_bet', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['draw_id'], ['roulette_draws.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('roulette_participations')
+    op.drop_table('game_participations')
+    op.drop_table('user_nfts')
+    op.drop_table('transactions')
+    op.drop_table('roulette_draws')
+    op.drop_table('game_rooms')
+    op.drop_table('case_items')
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_users_telegram_id'))
+
+    op.drop_table('users')
+    op.drop_table('nft_items')
+    op.drop_table('cases')
@@ -0,0 +1,54 @@
+"""hot query indexes
+
+Индексы под частые запросы API: открытые комнаты, участники комнаты, история
+игр и транзакций пользователя, поиск платежа из вебхука, инвентарь NFT, предметы кейса.
+В PostgreSQL индексы строятся CONCURRENTLY — без блокировки записи в таблицы.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 02:46:10.824875
+"""
+from alembic import op
+
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# (имя, таблица, колонки)
+INDEXES = [
+    ("ix_game_rooms_status_expires_at", "game_rooms", ["status", "expires_at"]),
+    ("ix_game_participations_room_id_user_id", "game_participations", ["room_id", "user_id"]),
+    ("ix_game_participations_user_id_joined_at", "game_participations", ["user_id", "joined_at"]),
+    ("ix_transactions_user_id_created_at", "transactions", ["user_id", "created_at"]),
+    ("ix_transactions_telegram_payment_id", "transactions", ["telegram_payment_id"]),
+    ("ix_transactions_ton_transaction_hash", "transactions", ["ton_transaction_hash"]),
+    ("ix_user_nfts_user_id_is_equipped", "user_nfts", ["user_id", "is_equipped"]),
+    ("ix_case_items_case_id", "case_items", ["case_id"]),
+]
+
+
+def _concurrently() -> bool:
+    return op.get_context().dialect.name == "postgresql"
+
+
+def upgrade():
+    if _concurrently():
+        # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+    else:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade():
+    if _concurrently():
+        with op.get_context().autocommit_block():
+            for name, table, _ in reversed(INDEXES):
+                op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+    else:
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True)
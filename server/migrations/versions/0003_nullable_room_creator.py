@@ -0,0 +1,29 @@
+"""nullable room creator
+
+game_rooms.creator_id допускает NULL: история игр RoomManager пишет комнаты,
+созданные игроками без учётной записи в users. Ссылка на несуществующего
+пользователя нарушала внешний ключ и проваливала всю пачку истории.
+Откат возможен только после удаления (или переназначения) таких комнат.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 14:05:31.402117
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('game_rooms') as batch_op:
+        batch_op.alter_column('creator_id', existing_type=sa.String(), nullable=True)
+
+
+def downgrade():
+    with op.batch_alter_table('game_rooms') as batch_op:
+        batch_op.alter_column('creator_id', existing_type=sa.String(), nullable=False)
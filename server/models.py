@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from enum import Enum
 from datetime import datetime
@@ -72,6 +72,7 @@ class Room(BaseModel):
         game_seed (Optional[str]): seed для честности
         game_state (Dict): состояние игры
         winner_ids (List[str]): победители
+        version (int): версия состояния, растёт при каждом разосланном изменении
     """
     id: str
     game_type: GameType
@@ -88,6 +89,7 @@ class Room(BaseModel):
     game_seed: Optional[str] = None
     game_state: Dict[str, Any] = {}
     winner_ids: List[str] = []
+    version: int = 0
     
     def can_join(self) -> bool:
         return (
@@ -153,6 +155,22 @@ class CreateRoomRequest(BaseModel):
     game_type: GameType
     bet_amount: int
 
+class AutoMatchRequest(BaseModel):
+    """
+    Запрос на автоматический подбор комнаты.
+    Attributes:
+        player_id (str): ID игрока
+        telegram_id (str): Telegram ID
+        username (str): имя пользователя
+        game_type (GameType): тип игры
+        bet_amount (int): ставка
+    """
+    player_id: str
+    telegram_id: str
+    username: str
+    game_type: GameType
+    bet_amount: int
+
 class PlayerActionRequest(BaseModel):
     """
     Запрос на действие игрока в игре.
@@ -167,6 +185,34 @@ class PlayerActionRequest(BaseModel):
     action: str
     data: Optional[Dict[str, Any]] = None
 
+class FairnessRound(BaseModel):
+    """
+    Опубликованный бросок игры в кубики для проверки честности.
+    Attributes:
+        seed (str): раскрытый серверный seed (game_results)
+        seed_hash (Optional[str]): обязательство sha256(seed) из game_start
+        nonce (str): nonce игры
+        player_id (str): ID игрока
+        round (int): номер раунда
+        dice1 (int): первый кубик
+        dice2 (int): второй кубик
+    """
+    seed: str
+    seed_hash: Optional[str] = None
+    nonce: str
+    player_id: str
+    round: int = 1
+    dice1: int
+    dice2: int
+
+class VerifyRoundsRequest(BaseModel):
+    """
+    Пакетная проверка бросков.
+    Attributes:
+        rounds (List[FairnessRound]): броски (до 10000 за запрос)
+    """
+    rounds: List[FairnessRound] = Field(..., max_length=10000)
+
 class RoomUpdate(BaseModel):
     """
     Обновление состояния комнаты для клиента.
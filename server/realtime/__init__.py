@@ -0,0 +1,10 @@
+"""
+Инфраструктура реального времени: рассылка событий по WebSocket
+"""
+
+from server.realtime.broadcast import BroadcastEngine
+from server.realtime.connection import ClientConnection, OverflowPolicy
+from server.realtime.heartbeat import HeartbeatMonitor
+from server.realtime.replay import ReplayLog
+
+__all__ = ['BroadcastEngine', 'ClientConnection', 'HeartbeatMonitor', 'OverflowPolicy', 'ReplayLog']
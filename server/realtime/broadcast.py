@@ -0,0 +1,62 @@
+import logging
+from typing import Dict, Iterable, List, Optional, Union
+
+from server import codec
+from server.realtime.connection import ClientConnection
+from server.realtime.msgpack_protocol import encode_event
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastEngine:
+    """
+    Рассылка событий комнаты всем подключённым игрокам.
+    - Событие кодируется один раз в общий фрейм, который получают все соединения.
+    - Фрейм ставится в очереди соединений без ожидания сети; отправку выполняет
+      задача-писатель каждого соединения с собственным таймаутом (см. ClientConnection).
+    - Медленные и разорванные соединения не блокируют комнату и отключаются сами.
+    """
+
+    @staticmethod
+    def encode(message: Dict) -> str:
+        """
+        Кодирует событие в текстовый фрейм.
+        Args:
+            message (Dict): событие
+        Returns:
+            str: готовый к отправке фрейм
+        """
+        return codec.dumps(message)
+
+    def encode_for(self, connection: ClientConnection, message: Dict) -> Union[str, bytes]:
+        """Кодирует сообщение в формате подпротокола соединения (JSON или msgpack)."""
+        return encode_event(message) if connection.binary else self.encode(message)
+
+    @staticmethod
+    def transcode(frame: str) -> bytes:
+        """Перекодирует готовый JSON-фрейм в бинарный фрейм msgpack."""
+        return encode_event(codec.loads(frame))
+
+    def fan_out(self, frame: str, connections: Iterable[ClientConnection], coalesce_key: Optional[str] = None) -> List[str]:
+        """
+        Ставит один фрейм в очереди всех переданных соединений.
+        Args:
+            frame (str): закодированное JSON-событие; клиенты msgpack получают его бинарную версию
+            connections (Iterable[ClientConnection]): соединения получателей
+            coalesce_key (Optional[str]): ключ снимка состояния для политики COALESCE
+        Returns:
+            List[str]: ID игроков, которым не удалось поставить событие в очередь
+        """
+        failed = []
+        binary_frame = None
+        for connection in connections:
+            if connection.binary:
+                # Бинарный фрейм строится один раз на рассылку и только при наличии таких клиентов
+                if binary_frame is None:
+                    binary_frame = self.transcode(frame)
+                queued = connection.enqueue(binary_frame, coalesce_key)
+            else:
+                queued = connection.enqueue(frame, coalesce_key)
+            if not queued:
+                failed.append(connection.player_id)
+        return failed
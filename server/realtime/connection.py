@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from enum import Enum
+from typing import Awaitable, Callable, Deque, Optional, Tuple, Union
+
+from fastapi import WebSocket
+
+logger = logging.getLogger(__name__)
+
+
+class OverflowPolicy(str, Enum):
+    """
+    Поведение очереди исходящих сообщений при переполнении.
+    DROP_OLDEST — выбросить самое старое сообщение,
+    COALESCE — заменить устаревший снимок состояния комнаты новым,
+    DISCONNECT — отключить клиента (он переподключится и получит актуальное состояние).
+    """
+    DROP_OLDEST = "drop_oldest"
+    COALESCE = "coalesce"
+    DISCONNECT = "disconnect"
+
+
+class ClientConnection:
+    """
+    WebSocket-подключение игрока с ограниченной очередью исходящих сообщений.
+    - Все отправки в сокет выполняет единственная задача-писатель, поэтому фреймы
+      не перемешиваются и генерирующий событие код никогда не ждёт сеть.
+    - Размер очереди ограничен; при переполнении применяется OverflowPolicy.
+    - При ошибке или таймауте отправки соединение закрывается и вызывается on_close.
+    - Фрейм str отправляется текстом, bytes — бинарно (подпротокол msgpack).
+    """
+
+    def __init__(
+        self,
+        player_id: str,
+        websocket: WebSocket,
+        max_queue: int = 64,
+        policy: OverflowPolicy = OverflowPolicy.COALESCE,
+        send_timeout: float = 2.0,
+        on_close: Optional[Callable[["ClientConnection"], Awaitable[None]]] = None,
+        protocol: str = "json",
+    ):
+        """
+        Args:
+            player_id (str): ID игрока
+            websocket (WebSocket): WebSocket-соединение
+            max_queue (int): максимальное число сообщений в очереди
+            policy (OverflowPolicy): политика переполнения
+            send_timeout (float): таймаут одной отправки в секундах
+            on_close (Callable): корутина, вызываемая после потери соединения
+            protocol (str): формат фреймов клиента: "json" или "msgpack"
+        """
+        self.player_id = player_id
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.on_close = on_close
+        self.protocol = protocol
+        # Очередь фреймов: (frame, coalesce_key)
+        self._queue: Deque[Tuple[Union[str, bytes], Optional[str]]] = deque()
+        self._wakeup = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self._overflowed = False
+        self.closed = False
+        self.dropped = 0
+        # Время последнего входящего фрейма клиента (time.monotonic), см. HeartbeatMonitor
+        self.last_seen = time.monotonic()
+
+    @property
+    def binary(self) -> bool:
+        """Клиент получает бинарные фреймы MessagePack."""
+        return self.protocol == "msgpack"
+
+    def touch(self):
+        """Отмечает активность клиента (любой входящий фрейм)."""
+        self.last_seen = time.monotonic()
+
+    def start(self):
+        """Запускает задачу-писателя."""
+        if self._writer is None:
+            self._writer = asyncio.ensure_future(self._write_loop())
+
+    @property
+    def pending(self) -> int:
+        """Число сообщений, ожидающих отправки."""
+        return len(self._queue)
+
+    def enqueue(self, frame: Union[str, bytes], coalesce_key: Optional[str] = None) -> bool:
+        """
+        Ставит фрейм в очередь без ожидания.
+        Args:
+            frame (Union[str, bytes]): закодированное сообщение
+            coalesce_key (Optional[str]): ключ снимка состояния; более новый фрейм
+                с тем же ключом может заменить старый при переполнении
+        Returns:
+            bool: False если соединение закрыто или отключается из-за переполнения
+        """
+        if self.closed or self._overflowed:
+            return False
+
+        if len(self._queue) >= self.max_queue and not self._make_room(coalesce_key):
+            self._overflowed = True
+            self._wakeup.set()
+            logger.warning(f"Outbound queue overflow for player {self.player_id}, disconnecting")
+            return False
+
+        self._queue.append((frame, coalesce_key))
+        self._wakeup.set()
+        return True
+
+    def _make_room(self, coalesce_key: Optional[str]) -> bool:
+        """Освобождает место в полной очереди согласно политике. Возвращает False, если это невозможно."""
+        if self.policy == OverflowPolicy.DROP_OLDEST:
+            self._queue.popleft()
+            self.dropped += 1
+            return True
+
+        if self.policy == OverflowPolicy.COALESCE and coalesce_key is not None:
+            # Новый снимок делает устаревшим предыдущий снимок с тем же ключом
+            for index, (_, key) in enumerate(self._queue):
+                if key == coalesce_key:
+                    del self._queue[index]
+                    self.dropped += 1
+                    return True
+
+        return False
+
+    async def _write_loop(self):
+        """Единственный писатель в сокет: отправляет фреймы по очереди."""
+        try:
+            while True:
+                while not self._queue and not self._overflowed:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                if self._overflowed:
+                    break
+                frame, _ = self._queue.popleft()
+                async with asyncio.timeout(self.send_timeout):
+                    if isinstance(frame, bytes):
+                        await self.websocket.send_bytes(frame)
+                    else:
+                        await self.websocket.send_text(frame)
+        except asyncio.CancelledError:
+            return
+        except asyncio.TimeoutError:
+            logger.warning(f"WebSocket send timed out for player {self.player_id}, evicting slow connection")
+        except Exception:
+            # Соединение разорвано
+            pass
+
+        await self._shutdown(code=1013)
+        if self.on_close is not None:
+            await self.on_close(self)
+
+    async def _shutdown(self, code: int):
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.clear()
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code), self.send_timeout)
+        except Exception:
+            pass
+
+    async def close(self, code: int = 1000):
+        """Останавливает писателя и закрывает сокет (без вызова on_close)."""
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        await self._shutdown(code)
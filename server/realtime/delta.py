@@ -0,0 +1,149 @@
+import copy
+from typing import Any, Dict, List, Optional
+
+from server.runtime_models import RuntimeRoom
+
+
+def _escape(key: Any) -> str:
+    """Экранирование сегмента пути по RFC 6901 (JSON Pointer)."""
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(segment: str) -> str:
+    return segment.replace("~1", "/").replace("~0", "~")
+
+
+def diff(old: Any, new: Any, path: str = "") -> List[Dict]:
+    """
+    Строит список операций в стиле JSON Patch (add/remove/replace), превращающих old в new.
+    Args:
+        old (Any): предыдущее состояние
+        new (Any): новое состояние
+        path (str): JSON Pointer текущего узла
+    Returns:
+        List[Dict]: операции патча
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key, value in new.items():
+            child = f"{path}/{_escape(key)}"
+            if key not in old:
+                ops.append({"op": "add", "path": child, "value": value})
+            else:
+                ops.extend(diff(old[key], value, child))
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        return ops
+
+    if isinstance(old, list) and isinstance(new, list):
+        ops = []
+        common = min(len(old), len(new))
+        for index in range(common):
+            ops.extend(diff(old[index], new[index], f"{path}/{index}"))
+        for index in range(common, len(new)):
+            ops.append({"op": "add", "path": f"{path}/{index}", "value": new[index]})
+        # Удаляем с конца, чтобы индексы оставшихся элементов не сдвигались
+        for index in range(len(old) - 1, common - 1, -1):
+            ops.append({"op": "remove", "path": f"{path}/{index}"})
+        return ops
+
+    if old != new:
+        return [{"op": "replace", "path": path, "value": new}]
+    return []
+
+
+def apply_patch(document: Any, ops: List[Dict]) -> Any:
+    """
+    Применяет операции патча к копии документа (эталон для клиентов и тестов).
+    Args:
+        document (Any): исходный документ
+        ops (List[Dict]): операции, полученные от diff()
+    Returns:
+        Any: новый документ
+    """
+    document = copy.deepcopy(document)
+    for op in ops:
+        if op["path"] == "":
+            document = copy.deepcopy(op["value"])
+            continue
+
+        segments = [_unescape(s) for s in op["path"].split("/")[1:]]
+        parent = document
+        for segment in segments[:-1]:
+            parent = parent[int(segment)] if isinstance(parent, list) else parent[segment]
+        last = segments[-1]
+
+        if isinstance(parent, list):
+            index = len(parent) if last == "-" else int(last)
+            if op["op"] == "add":
+                parent.insert(index, copy.deepcopy(op["value"]))
+            elif op["op"] == "remove":
+                del parent[index]
+            else:
+                parent[index] = copy.deepcopy(op["value"])
+        else:
+            if op["op"] == "remove":
+                del parent[last]
+            else:
+                parent[last] = copy.deepcopy(op["value"])
+    return document
+
+
+class RoomStateTracker:
+    """
+    Версионирование состояния комнат для дельта-рассылки.
+    Хранит последний разосланный снимок каждой комнаты; при изменении увеличивает
+    room.version и возвращает патч от предыдущей версии к текущей.
+    """
+
+    def __init__(self):
+        # room_id -> последний разосланный снимок
+        self._snapshots: Dict[str, Dict] = {}
+
+    @staticmethod
+    def snapshot(room: RuntimeRoom) -> Dict:
+        """Полный снимок комнаты (без поля версии, оно передаётся отдельно)."""
+        return room.to_dict(include_version=False)
+
+    def advance(self, room: RuntimeRoom) -> List[Dict]:
+        """
+        Фиксирует текущее состояние комнаты.
+        Args:
+            room (RuntimeRoom): комната
+        Returns:
+            List[Dict]: патч от предыдущей версии; пустой, если состояние не изменилось
+        """
+        current = self.snapshot(room)
+        previous = self._snapshots.get(room.id)
+        self._snapshots[room.id] = current
+
+        if previous is None:
+            patch = [{"op": "replace", "path": "", "value": current}]
+        else:
+            patch = diff(previous, current)
+
+        if patch:
+            room.version += 1
+        return patch
+
+    def full_state(self, room: RuntimeRoom, since_version: Optional[int] = None) -> Optional[Dict]:
+        """
+        Полный снимок для (пере)подключения или при разрыве версий.
+        Возвращается последний разосланный снимок, а не текущее состояние, чтобы
+        следующие патчи применялись ровно к той версии, которую получил клиент.
+        Args:
+            room (RuntimeRoom): комната
+            since_version (Optional[int]): версия, известная клиенту
+        Returns:
+            Optional[Dict]: снимок или None, если клиент уже в актуальном состоянии
+        """
+        if room.id not in self._snapshots:
+            self.advance(room)
+        if since_version is not None and since_version == room.version:
+            return None
+        return self._snapshots[room.id]
+
+    def forget(self, room_id: str):
+        """Удаляет сохранённый снимок удалённой комнаты."""
+        self._snapshots.pop(room_id, None)
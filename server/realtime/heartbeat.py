@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from server.realtime.broadcast import BroadcastEngine
+from server.realtime.connection import ClientConnection
+
+logger = logging.getLogger(__name__)
+
+
+class HeartbeatMonitor:
+    """
+    Серверный heartbeat для всех WebSocket-подключений узла.
+    - Одна задача раз в interval секунд обходит подключения пачками по batch_size,
+      уступая цикл событий между пачками.
+    - Отметка активности — поле last_seen самого подключения (обновляется на любом
+      входящем фрейме клиента), отдельной структуры на игрока нет.
+    - Подключение, молчащее дольше interval, получает {"type": "ping"} (один фрейм
+      на обход); клиент отвечает {"action": "pong"} или любым другим действием.
+    - Подключение, молчащее дольше timeout (мёртвое или полуоткрытое TCP-соединение),
+      закрывается через on_reap.
+    """
+
+    def __init__(
+        self,
+        connections: Dict[str, ClientConnection],
+        on_reap: Callable[[ClientConnection], Awaitable[None]],
+        interval: float = 20.0,
+        timeout: float = 60.0,
+        batch_size: int = 500,
+        broadcaster: Optional[BroadcastEngine] = None,
+    ):
+        """
+        Args:
+            connections (Dict[str, ClientConnection]): живой словарь подключений менеджера
+            on_reap (Callable): корутина, отключающая молчащее подключение
+            interval (float): период обхода и порог молчания для ping, сек
+            timeout (float): порог молчания для отключения, сек
+            batch_size (int): подключений за один шаг обхода
+            broadcaster (Optional[BroadcastEngine]): кодирование и постановка ping в очереди
+        """
+        self.connections = connections
+        self.on_reap = on_reap
+        self.interval = interval
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.broadcaster = broadcaster or BroadcastEngine()
+        self._task: Optional[asyncio.Task] = None
+        # Результаты последнего обхода и накопленное число отключённых
+        self.live = 0
+        self.idle = 0
+        self.reaped = 0
+
+    def start(self):
+        """Запускает фоновый обход (повторный вызов ничего не делает)."""
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        """Останавливает фоновый обход."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Heartbeat sweep failed: {e}")
+
+    async def sweep(self, now: Optional[float] = None):
+        """
+        Один обход: ping молчащим подключениям и отключение мёртвых.
+        Args:
+            now (Optional[float]): текущее время time.monotonic() (для тестов)
+        """
+        now = time.monotonic() if now is None else now
+        frame = self.broadcaster.encode({"type": "ping"})
+        connections = list(self.connections.values())
+        live = idle = 0
+        dead: List[ClientConnection] = []
+
+        for start in range(0, len(connections), self.batch_size):
+            silent = []
+            for connection in connections[start:start + self.batch_size]:
+                if connection.closed:
+                    continue
+                quiet = now - connection.last_seen
+                if quiet >= self.timeout:
+                    dead.append(connection)
+                elif quiet >= self.interval:
+                    idle += 1
+                    silent.append(connection)
+                else:
+                    live += 1
+            self.broadcaster.fan_out(frame, silent)
+            # Не занимаем цикл событий на весь обход большого узла
+            await asyncio.sleep(0)
+
+        for connection in dead:
+            logger.info(f"Reaping silent WebSocket of player {connection.player_id}")
+            self.reaped += 1
+            await self.on_reap(connection)
+
+        self.live, self.idle = live, idle
+
+    def stats(self) -> Dict[str, int]:
+        """Счётчики подключений: live и idle — по последнему обходу, reaped — всего."""
+        return {"live": self.live, "idle": self.idle, "reaped": self.reaped}
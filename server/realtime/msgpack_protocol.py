@@ -0,0 +1,106 @@
+"""
+Бинарный подпротокол WebSocket "msgpack".
+
+Клиент, предложивший подпротокол msgpack (Sec-WebSocket-Protocol: msgpack),
+получает бинарные фреймы MessagePack в компактной схеме:
+- событие комнаты с патчем:  [code, room_id, base_version, version, patch, data, seq],
+  операция патча — [op, path] или [op, path, value], op: 0 add, 1 remove, 2 replace;
+  seq — номер события в журнале комнаты (может отсутствовать);
+- любое другое сообщение:     [code, body], body — сообщение без поля "type".
+code — номер типа события из EVENT_CODES; для типа, которого нет в таблице,
+вместо номера передаётся строка с типом. Номера не переиспользуются и не меняются.
+Входящие действия клиента — бинарные фреймы с тем же словарём, что и в JSON
+({"action": "ready"}); текстовые JSON-фреймы тоже принимаются.
+"""
+from typing import Any, Dict, List, Union
+
+import msgpack
+
+from server.codec import to_primitive
+
+SUBPROTOCOL = "msgpack"
+
+EVENT_CODES: Dict[str, int] = {
+    "room_snapshot": 1,
+    "room_synced": 2,
+    "player_joined": 3,
+    "player_ready": 4,
+    "player_disconnected": 5,
+    "game_started": 6,
+    "game_start": 7,
+    "dice_roll_result": 8,
+    "tie_detected": 9,
+    "game_results": 10,
+    "game_finished": 11,
+    "rps_started": 12,
+    "rps_choice_made": 13,
+    "room_cancelled": 14,
+    "error": 15,
+    "pong": 16,
+    "ping": 17,
+}
+EVENT_TYPES: Dict[int, str] = {code: event_type for event_type, code in EVENT_CODES.items()}
+
+PATCH_OPS: Dict[str, int] = {"add": 0, "remove": 1, "replace": 2}
+PATCH_OP_NAMES: Dict[int, str] = {code: op for op, code in PATCH_OPS.items()}
+
+
+def _pack_op(op: Dict[str, Any]) -> List[Any]:
+    if op["op"] == "remove":
+        return [PATCH_OPS["remove"], op["path"]]
+    return [PATCH_OPS[op["op"]], op["path"], op["value"]]
+
+
+def encode_event(message: Dict[str, Any]) -> bytes:
+    """
+    Кодирует исходящее сообщение в бинарный фрейм.
+    Args:
+        message (Dict): сообщение в той же форме, что и для JSON-клиентов
+    Returns:
+        bytes: фрейм MessagePack
+    """
+    event_type = message.get("type")
+    code = EVENT_CODES.get(event_type, event_type)
+    if "patch" in message:
+        frame = [code, message["room_id"], message["base_version"], message["version"],
+                 [_pack_op(op) for op in message["patch"]], message.get("data")]
+        if "seq" in message:
+            frame.append(message["seq"])
+    else:
+        frame = [code, {key: value for key, value in message.items() if key != "type"}]
+    return msgpack.packb(frame, default=to_primitive, use_bin_type=True)
+
+
+def decode_event(frame: bytes) -> Dict[str, Any]:
+    """Обратное преобразование encode_event (для клиентов на Python и тестов)."""
+    items = msgpack.unpackb(frame, raw=False)
+    event_type = EVENT_TYPES.get(items[0], items[0])
+    if len(items) == 2:
+        return {"type": event_type, **items[1]}
+    code, room_id, base_version, version, ops, data = items[:6]
+    patch = []
+    for op in ops:
+        entry = {"op": PATCH_OP_NAMES[op[0]], "path": op[1]}
+        if len(op) > 2:
+            entry["value"] = op[2]
+        patch.append(entry)
+    event = {"type": event_type, "room_id": room_id, "data": data,
+             "base_version": base_version, "version": version, "patch": patch}
+    if len(items) > 6:
+        event["seq"] = items[6]
+    return event
+
+
+def decode_action(frame: Union[bytes, bytearray]) -> Dict[str, Any]:
+    """
+    Декодирует входящее действие клиента.
+    Raises:
+        ValueError: фрейм не является словарём MessagePack
+    """
+    try:
+        action = msgpack.unpackb(frame, raw=False)
+    except Exception as e:
+        raise ValueError(f"Invalid msgpack frame: {e}") from e
+    if not isinstance(action, dict):
+        raise ValueError("Action frame must be a map")
+    return action
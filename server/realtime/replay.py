@@ -0,0 +1,71 @@
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+
+class ReplayLog:
+    """
+    Ограниченный журнал недавних событий комнат для возобновления после переподключения.
+    - Каждое событие комнаты получает порядковый номер seq (1, 2, 3, ... в пределах комнаты).
+    - Для комнаты хранится не более capacity последних закодированных фреймов.
+    - Клиент, знающий последний полученный seq, получает только пропущенные события;
+      если часть из них уже вытеснена из журнала, нужен полный снимок.
+    """
+
+    def __init__(self, capacity: int = 128):
+        """
+        Args:
+            capacity (int): число хранимых событий на комнату
+        """
+        self.capacity = capacity
+        # room_id -> последний выданный seq
+        self._last_seq: Dict[str, int] = {}
+        # room_id -> (seq, frame) последних событий
+        self._events: Dict[str, Deque[Tuple[int, str]]] = {}
+
+    def next_seq(self, room_id: str) -> int:
+        """Выдаёт номер следующего события комнаты."""
+        seq = self._last_seq.get(room_id, 0) + 1
+        self._last_seq[room_id] = seq
+        return seq
+
+    def last_seq(self, room_id: str) -> int:
+        """Номер последнего события комнаты (0, если событий не было)."""
+        return self._last_seq.get(room_id, 0)
+
+    def append(self, room_id: str, seq: int, frame: str):
+        """
+        Сохраняет закодированное событие.
+        Args:
+            room_id (str): ID комнаты
+            seq (int): номер, выданный next_seq
+            frame (str): JSON-фрейм события
+        """
+        events = self._events.get(room_id)
+        if events is None:
+            events = self._events[room_id] = deque(maxlen=self.capacity)
+        events.append((seq, frame))
+
+    def since(self, room_id: str, seq: int) -> Optional[List[str]]:
+        """
+        События комнаты после seq.
+        Args:
+            room_id (str): ID комнаты
+            seq (int): последний номер, полученный клиентом
+        Returns:
+            Optional[List[str]]: фреймы по порядку (пустой список, если клиент актуален);
+                None, если продолжить с seq нельзя: события вытеснены или seq неизвестен
+        """
+        last = self._last_seq.get(room_id, 0)
+        if seq < 0 or seq > last:
+            return None
+        if seq == last:
+            return []
+        events = self._events.get(room_id)
+        if not events or events[0][0] > seq + 1:
+            return None
+        return [frame for event_seq, frame in events if event_seq > seq]
+
+    def forget(self, room_id: str):
+        """Удаляет журнал удалённой комнаты."""
+        self._last_seq.pop(room_id, None)
+        self._events.pop(room_id, None)
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# Команды, которые меняют состояние комнаты. Все они выполняются актором комнаты
+# строго по очереди, поэтому обработчикам не нужны блокировки.
+
+@dataclass(frozen=True)
+class JoinRoom:
+    player_id: str
+    telegram_id: str
+    username: str
+
+@dataclass(frozen=True)
+class ReadyPlayer:
+    player_id: str
+
+@dataclass(frozen=True)
+class RollDice:
+    player_id: str
+    action: str = "roll"
+
+@dataclass(frozen=True)
+class MakeChoice:
+    player_id: str
+    choice: str
+
+@dataclass(frozen=True)
+class PlayerDisconnected:
+    player_id: str
+
+@dataclass(frozen=True)
+class Tick:
+    """Срабатывание таймера комнаты (room_wait, rps_choice, reroll, cleanup)."""
+    timer: str
+
+
+class RoomActor:
+    """
+    Актор игровой комнаты: одна задача последовательно выполняет команды из почтового ящика.
+    - Команды разных комнат выполняются независимо и не ждут друг друга.
+    - Команды одной комнаты (действия игроков и таймеры) никогда не пересекаются.
+    - Обработчик команды не должен ждать submit() в свою же комнату — это взаимоблокировка.
+    """
+
+    def __init__(self, room_id: str, handler: Callable[[str, Any], Awaitable[Any]]):
+        """
+        Args:
+            room_id (str): ID комнаты
+            handler (Callable): корутина handler(room_id, command), применяющая команду
+        """
+        self.room_id = room_id
+        self.handler = handler
+        self._mailbox: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.processed = 0
+
+    def submit(self, command: Any) -> "asyncio.Future":
+        """
+        Ставит команду в почтовый ящик.
+        Args:
+            command: команда (JoinRoom, ReadyPlayer, RollDice, MakeChoice, PlayerDisconnected, Tick)
+        Returns:
+            asyncio.Future: результат обработчика; для закрытого актора — None
+        """
+        future = asyncio.get_running_loop().create_future()
+        if self.closed:
+            future.set_result(None)
+            return future
+        self._mailbox.put_nowait((command, future))
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+        return future
+
+    @property
+    def pending(self) -> int:
+        """Число команд, ожидающих выполнения."""
+        return self._mailbox.qsize()
+
+    async def _run(self):
+        while not self.closed:
+            command, future = await self._mailbox.get()
+            try:
+                result = await self.handler(self.room_id, command)
+            except Exception as e:
+                if not future.cancelled():
+                    future.set_exception(e)
+            else:
+                if not future.cancelled():
+                    future.set_result(result)
+            self.processed += 1
+
+        # Комната удалена: оставшиеся команды завершаются без результата
+        while not self._mailbox.empty():
+            _, future = self._mailbox.get_nowait()
+            if not future.cancelled():
+                future.set_result(None)
+
+    def close(self):
+        """Останавливает актор после текущей команды (можно вызывать из обработчика)."""
+        self.closed = True
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+            while not self._mailbox.empty():
+                _, future = self._mailbox.get_nowait()
+                if not future.cancelled():
+                    future.set_result(None)
@@ -1,40 +1,110 @@
-import asyncio
-import json
 import uuid
-import secrets
-import hashlib
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Set
+from collections import Counter
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 from fastapi import WebSocket
-from server.models import Room, Player, GameType, RoomStatus, PlayerStatus, DiceResult
+from server.models import GameType, RoomStatus, PlayerStatus
+from server.runtime_models import RuntimePlayer, RuntimeRoom
 from server.games.dice_game import DiceGame
 from server.games.rps_game import RPSGame
+from server.games.seed_pool import SeedPool
+from server.batch_writer import BatchWriter
+from server.ledger import BalanceLedger
+from server.realtime.broadcast import BroadcastEngine
+from server.realtime.connection import ClientConnection, OverflowPolicy
+from server.realtime.delta import RoomStateTracker
+from server.realtime.replay import ReplayLog
+from server.realtime.heartbeat import HeartbeatMonitor
+from server.matchmaker import MatchmakingIndex
+from server.scheduler import TimerScheduler
+from server.room_store import RoomStore, MemoryRoomStore
+from server.room_actor import RoomActor, JoinRoom, ReadyPlayer, RollDice, MakeChoice, PlayerDisconnected, Tick
+from server.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
+# События, которые лишь меняют состояние комнаты: при переполнении очереди
+# клиента более новое событие может заменить устаревшее (клиент увидит разрыв
+# версий и запросит снимок)
+ROOM_STATE_EVENTS = {"player_joined", "player_ready", "player_disconnected", "rps_choice_made"}
+
+# Таймауты комнат, секунды
+RPS_CHOICE_SECONDS = 15
+REROLL_DELAY_SECONDS = 10
+CLEANUP_DELAY_SECONDS = 10
+
 class RoomManager:
     """
     Менеджер игровых комнат и матчмейкинга для мини-игр (Dice, RPS).
     Управляет созданием комнат, присоединением игроков, запуском игр, обработкой действий и рассылкой событий через WebSocket.
     """
-    def __init__(self):
-        # Словарь всех активных комнат: room_id -> Room
-        self.rooms: Dict[str, Room] = {}
-        # Активные WebSocket-подключения: player_id -> WebSocket
-        self.player_connections: Dict[str, WebSocket] = {}
+    def __init__(self, store: Optional[RoomStore] = None, heartbeat: bool = True,
+                 history: Optional[BatchWriter] = None, ledger: Optional[BalanceLedger] = None,
+                 on_room_closed: Optional[Callable[[str, List[str]], Awaitable[None]]] = None):
+        """
+        Args:
+            store (Optional[RoomStore]): общее хранилище комнат (по умолчанию — в памяти процесса)
+            heartbeat (bool): проверять живость подключений (выключается в шардах,
+                где подключения — каналы к роутеру, а heartbeat ведёт сам роутер)
+            history (Optional[BatchWriter]): куда записывать итоги игр (по умолчанию не записываются)
+            ledger (Optional[BalanceLedger]): балансы игроков из базы (по умолчанию — демо-баланс
+                DEMO_BALANCE в памяти комнаты, без записи в базу)
+            on_room_closed (Optional[Callable]): уведомление об удалении комнаты:
+                on_room_closed(room_id, ID игроков, покинувших её) — шард сообщает маршрутизатору
+        """
+        # Словарь всех активных комнат: room_id -> RuntimeRoom
+        self.rooms: Dict[str, RuntimeRoom] = {}
+        # Активные WebSocket-подключения: player_id -> ClientConnection
+        self.player_connections: Dict[str, ClientConnection] = {}
         # Соответствие игрока и комнаты: player_id -> room_id
         self.player_to_room: Dict[str, str] = {}
+        # Игроки активных комнат: player_id -> RuntimePlayer (поиск без обхода комнат)
+        self.player_index: Dict[str, RuntimePlayer] = {}
+        # Число игроков активных комнат по статусам. Вместе с room.ready_count
+        # обновляется только через _add_player/_set_status/_cleanup_room
+        self.status_counts: Counter = Counter()
         # Игровые движки по комнатам: room_id -> DiceGame/RPSGame
         self.game_engines: Dict[str, object] = {}
-        # Очереди матчмейкера по типу игры
-        self.matchmaker_queue: Dict[GameType, List[str]] = {
-            GameType.DICE: [],
-            GameType.CARDS: [],
-            GameType.RPS: []
-        }
+        # Индекс открытых комнат матчмейкера по (тип игры, ставка)
+        self.matchmaker = MatchmakingIndex()
+        # Единый планировщик таймеров комнат (ключ таймера — ID комнаты)
+        self.timers = TimerScheduler()
+        # Акторы комнат: room_id -> RoomActor. Все изменения состояния комнаты
+        # (действия игроков и таймеры) выполняются её актором по очереди
+        self.actors: Dict[str, RoomActor] = {}
+        # Рассылка событий: кодирование один раз и постановка в очереди соединений
+        self.broadcaster = BroadcastEngine()
+        # Версии и последние разосланные снимки комнат для дельта-обновлений
+        self.room_states = RoomStateTracker()
+        # Недавние события комнат с порядковыми номерами для возобновления после переподключения
+        self.replay = ReplayLog(settings.WS_REPLAY_EVENTS)
+        # Заранее сгенерированные серверные seed (commit-reveal): старт игры их только забирает
+        self.seed_pool = SeedPool(settings.SEED_POOL_SIZE)
+        self.seed_pool.fill()
+        # Серверный ping молчащим клиентам и отключение мёртвых подключений
+        self.heartbeat = HeartbeatMonitor(
+            self.player_connections,
+            self._on_connection_lost,
+            interval=settings.WS_HEARTBEAT_INTERVAL if heartbeat else 0,
+            timeout=settings.WS_HEARTBEAT_TIMEOUT,
+            batch_size=settings.WS_HEARTBEAT_BATCH,
+            broadcaster=self.broadcaster
+        )
+        # Общее состояние для других узлов: комнаты, привязки игроков, открытые комнаты,
+        # рассылка событий и пересылка команд комнатам других узлов. Комнатами этого
+        # узла по-прежнему владеют его акторы
+        self.store = store or MemoryRoomStore()
+        self.store.attach(self.rooms, self.player_to_room, self.matchmaker)
+        self._subscribed = False
+        # Итоги завершённых и отменённых комнат уходят в историю пачками, в фоне
+        self.history = history
+        # Ставки списываются в базе условным UPDATE при готовности, выигрыши пишутся пачками
+        self.ledger = ledger
+        self.on_room_closed = on_room_closed
         
-    async def create_room(self, creator_id: str, telegram_id: str, username: str, game_type: GameType, bet_amount: int) -> Room:
+    async def create_room(self, creator_id: str, telegram_id: str, username: str, game_type: GameType, bet_amount: int,
+                          room_id: Optional[str] = None) -> RuntimeRoom:
         """
         Создаёт новую игровую комнату (лобби) с указанным типом игры и ставкой.
         Добавляет создателя в комнату, помещает комнату в матчмейкер, запускает таймер ожидания.
@@ -44,52 +114,210 @@ class RoomManager:
             username (str): Имя пользователя
             game_type (GameType): Тип игры (DICE, RPS)
             bet_amount (int): Ставка в звёздах
+            room_id (Optional[str]): ID комнаты (маршрутизатор шардов выбирает его заранее)
         Returns:
-            Room: созданная комната
+            RuntimeRoom: созданная комната
+        Raises:
+            ValueError: игрок уже состоит в активной комнате (на любом узле)
         """
-        room_id = str(uuid.uuid4())[:8]
+        room_id = room_id or str(uuid.uuid4())[:8]
+        current_room_id = await self.player_room(creator_id)
+        if current_room_id is not None:
+            raise ValueError(f"Player {creator_id} is already in room {current_room_id}")
         
-        creator = Player(
+        creator = RuntimePlayer(
             id=creator_id,
             telegram_id=telegram_id,
             username=username,
-            balance=1000,  # TODO: получать из базы данных
+            balance=await self._open_balance(telegram_id),
             is_creator=True,
             bet_amount=bet_amount
         )
+        if creator_id in self.player_to_room:
+            self._close_balance(telegram_id)
+            raise ValueError(f"Player {creator_id} is already in room {self.player_to_room[creator_id]}")
         
-        room = Room(
+        room = RuntimeRoom(
             id=room_id,
             game_type=game_type,
-            players=[creator],
             bet_amount=bet_amount,
             created_at=datetime.now()
         )
         
+        # Другие узлы пересылают команды комнатам этого узла через хранилище
+        await self._ensure_subscribed()
         self.rooms[room_id] = room
-        self.player_to_room[creator_id] = room_id
+        self.actors[room_id] = RoomActor(room_id, self._dispatch)
+        self._add_player(room, creator)
         
         # Добавляем комнату в матчмейкер
-        self.matchmaker_queue[game_type].append(room_id)
+        self.matchmaker.add(room)
+        await self.store.save_room(room)
+        await self.store.set_player_room(creator_id, room_id)
         
         logger.info(f"Created room {room_id} for game {game_type} with bet {bet_amount}")
         
         # Запускаем таймер комнаты
-        asyncio.create_task(self._room_timer(room_id))
+        self.timers.call_later(room.timer_seconds, self._tick, room_id, "room_wait", key=room_id, kind="room_wait")
         
         return room
     
-    async def join_room(self, player_id: str, telegram_id: str, username: str, room_id: str) -> Optional[Room]:
+    async def join_room(self, player_id: str, telegram_id: str, username: str, room_id: str) -> Optional[RuntimeRoom]:
         """
         Присоединяет игрока к существующей комнате, если есть свободные места.
+        Комнату другого узла присоединение выполняет её владелец.
         Args:
             player_id (str): ID игрока
             telegram_id (str): Telegram ID
             username (str): Имя пользователя
             room_id (str): ID комнаты
         Returns:
-            Optional[Room]: объект комнаты или None, если не удалось присоединиться
+            Optional[RuntimeRoom]: объект комнаты или None, если не удалось присоединиться
+        """
+        actor = self.actors.get(room_id)
+        if actor is None:
+            return await self._forward_room(room_id, "join_room", player_id=player_id, telegram_id=telegram_id,
+                                            username=username, room_id=room_id)
+        return await actor.submit(JoinRoom(player_id, telegram_id, username))
+    
+    async def ready_player(self, player_id: str) -> Optional[RuntimeRoom]:
+        """
+        Подтверждает готовность игрока (блокирует ставку, меняет статус).
+        Если достаточно готовых игроков — запускает игру.
+        Args:
+            player_id (str): ID игрока
+        Returns:
+            Optional[RuntimeRoom]: объект комнаты или None, если ошибка
+        """
+        room_id = await self.player_room(player_id)
+        actor = self.actors.get(room_id)
+        if actor is None:
+            return await self._forward_room(room_id, "ready_player", player_id=player_id)
+        return await actor.submit(ReadyPlayer(player_id))
+    
+    async def handle_dice_action(self, player_id: str, room_id: str, action: str):
+        """
+        Обрабатывает действие игрока в игре Dice (например, бросок кубиков).
+        Args:
+            player_id (str): ID игрока
+            room_id (str): ID комнаты
+            action (str): действие ("roll")
+        """
+        actor = self.actors.get(room_id)
+        if actor is None:
+            owner = await self._remote_owner(room_id)
+            if owner is None:
+                raise ValueError(f"No dice game found for room {room_id}")
+            await self.store.call(owner, "dice_action", player_id=player_id, room_id=room_id, action=action)
+            return
+        await actor.submit(RollDice(player_id, action))
+    
+    async def handle_rps_choice(self, player_id: str, choice: str):
+        """
+        Обрабатывает выбор игрока в RPS через движок RPSGame
+        Args:
+            player_id (str): ID игрока
+            choice (str): выбор ("rock", "paper", "scissors")
+        """
+        room_id = await self.player_room(player_id)
+        actor = self.actors.get(room_id)
+        if actor is not None:
+            await actor.submit(MakeChoice(player_id, choice))
+            return
+        owner = await self._remote_owner(room_id)
+        if owner is not None:
+            await self.store.call(owner, "rps_choice", player_id=player_id, choice=choice)
+    
+    async def player_room(self, player_id: str) -> Optional[str]:
+        """ID комнаты игрока на любом узле или None"""
+        return self.player_to_room.get(player_id) or await self.store.get_player_room(player_id)
+    
+    async def _remote_owner(self, room_id: Optional[str]) -> Optional[str]:
+        """Узел-владелец комнаты, если это другой узел"""
+        if not room_id or room_id in self.rooms:
+            return None
+        owner = await self.store.room_owner(room_id)
+        return owner if owner != self.store.node_id else None
+    
+    async def _forward_room(self, room_id: Optional[str], op: str, /, **args) -> Optional[RuntimeRoom]:
+        """Выполняет команду комнаты на её узле-владельце; None — комнаты нет"""
+        owner = await self._remote_owner(room_id)
+        if owner is None:
+            return None
+        data = await self.store.call(owner, op, **args)
+        return RuntimeRoom.from_dict(data) if data is not None else None
+    
+    async def _serve_command(self, op: str, args: Dict) -> Any:
+        """
+        Команда, пересланная другим узлом комнате этого узла (через хранилище).
+        Снимки и события возвращаются как данные: отправляет их узел, к которому подключён игрок.
+        """
+        if op == "join_room":
+            room = await self.join_room(**args)
+            return room.to_dict() if room is not None else None
+        if op == "ready_player":
+            room = await self.ready_player(**args)
+            return room.to_dict() if room is not None else None
+        if op == "dice_action":
+            await self.handle_dice_action(**args)
+            return None
+        if op == "rps_choice":
+            await self.handle_rps_choice(**args)
+            return None
+        if op == "disconnect":
+            actor = self.actors.get(self.player_to_room.get(args["player_id"]))
+            if actor is not None:
+                await actor.submit(PlayerDisconnected(args["player_id"]))
+            return None
+        if op == "sync_message":
+            return self._sync_message(args["room_id"], args.get("since_version"))
+        if op == "replay":
+            room = self.rooms.get(args["room_id"])
+            if room is None:
+                return None
+            return {"version": room.version,
+                    "frames": self.replay.since(args["room_id"], args["resume_from"])}
+        raise ValueError(f"Unknown room command: {op}")
+    
+    async def _tick(self, room_id: str, timer: str):
+        """Передаёт срабатывание таймера актору комнаты"""
+        actor = self.actors.get(room_id)
+        if actor is not None:
+            await actor.submit(Tick(timer))
+    
+    async def _dispatch(self, room_id: str, command) -> Optional[RuntimeRoom]:
+        """
+        Применяет команду к комнате. Вызывается только актором комнаты,
+        поэтому команды одной комнаты никогда не выполняются одновременно.
+        Args:
+            room_id (str): ID комнаты
+            command: команда актора
+        Returns:
+            Optional[RuntimeRoom]: результат обработчика команды
         """
+        if isinstance(command, JoinRoom):
+            return await self._join_room(command.player_id, command.telegram_id, command.username, room_id)
+        if isinstance(command, ReadyPlayer):
+            return await self._ready_player(command.player_id)
+        if isinstance(command, RollDice):
+            return await self._handle_dice_action(command.player_id, room_id, command.action)
+        if isinstance(command, MakeChoice):
+            return await self._handle_rps_choice(command.player_id, command.choice)
+        if isinstance(command, PlayerDisconnected):
+            return await self._mark_disconnected(command.player_id, room_id)
+        if isinstance(command, Tick):
+            if command.timer == "room_wait":
+                return await self._room_timer(room_id)
+            if command.timer == "rps_choice":
+                return await self._rps_choice_timer(room_id)
+            if command.timer == "reroll":
+                return await self._start_dice_reroll(room_id)
+            if command.timer == "cleanup":
+                return await self._cleanup_room(room_id)
+        raise ValueError(f"Unknown room command: {command!r}")
+    
+    async def _join_room(self, player_id: str, telegram_id: str, username: str, room_id: str) -> Optional[RuntimeRoom]:
+        """Присоединение игрока к комнате (выполняется актором комнаты)"""
         if room_id not in self.rooms:
             return None
             
@@ -98,58 +326,68 @@ class RoomManager:
         if not room.can_join():
             return None
             
-        # Проверяем, что игрок не уже в комнате
-        if any(p.id == player_id for p in room.players):
+        # Игрок состоит в одной комнате за раз (на любом узле): ставки другой
+        # комнаты не должны расходоваться параллельно с этой
+        current_room_id = await self.player_room(player_id)
+        if current_room_id == room_id:
             return room
+        if current_room_id is not None:
+            return None
             
-        player = Player(
+        player = RuntimePlayer(
             id=player_id,
             telegram_id=telegram_id,
             username=username,
-            balance=1000,  # TODO: получать из базы данных
+            balance=await self._open_balance(telegram_id),
             bet_amount=room.bet_amount
         )
+        # Пока читался баланс, игрок мог войти в другую комнату этого узла
+        if player_id in self.player_to_room:
+            self._close_balance(telegram_id)
+            return None
         
-        room.players.append(player)
-        self.player_to_room[player_id] = room_id
+        self._add_player(room, player)
+        await self.store.set_player_room(player_id, room_id)
+        
+        # Заполненная комната больше не участвует в матчмейкинге
+        if not room.can_join():
+            self.matchmaker.remove(room_id)
         
         logger.info(f"Player {username} joined room {room_id}")
         
         # Уведомляем всех в комнате
         await self._broadcast_room_update(room_id, "player_joined", {
-            "player": player.dict(),
+            "player": player.to_dict(),
             "players_count": len(room.players)
         })
         
         return room
     
-    async def ready_player(self, player_id: str) -> Optional[Room]:
-        """
-        Подтверждает готовность игрока (блокирует ставку, меняет статус).
-        Если достаточно готовых игроков — запускает игру.
-        Args:
-            player_id (str): ID игрока
-        Returns:
-            Optional[Room]: объект комнаты или None, если ошибка
-        """
+    async def _ready_player(self, player_id: str) -> Optional[RuntimeRoom]:
+        """Подтверждение готовности игрока (выполняется актором комнаты)"""
         room_id = self.player_to_room.get(player_id)
         if not room_id or room_id not in self.rooms:
             return None
             
         room = self.rooms[room_id]
+        if room.status != RoomStatus.WAITING:
+            return None
         
         # Находим игрока и меняем его статус
-        for player in room.players:
-            if player.id == player_id:
-                if player.balance >= room.bet_amount:
-                    player.status = PlayerStatus.READY
-                    player.balance -= room.bet_amount  # Блокируем ставку
-                    room.pot += room.bet_amount
-                    
-                    logger.info(f"Player {player.username} is ready in room {room_id}")
-                    break
-                else:
+        player = self.player_index.get(player_id)
+        if player is not None:
+            if player.status != PlayerStatus.WAITING:
+                return room  # Ставка уже заблокирована
+            if self.ledger is not None:
+                if not await self.ledger.hold(room_id, player.telegram_id, room.bet_amount):
                     return None  # Недостаточно средств
+            elif player.balance < room.bet_amount:
+                return None  # Недостаточно средств
+            self._set_status(room, player, PlayerStatus.READY)
+            player.balance -= room.bet_amount  # Блокируем ставку
+            room.pot += room.bet_amount
+            
+            logger.info(f"Player {player.username} is ready in room {room_id}")
         
         # Проверяем, можно ли начинать игру
         if room.can_start():
@@ -157,7 +395,7 @@ class RoomManager:
         else:
             await self._broadcast_room_update(room_id, "player_ready", {
                 "player_id": player_id,
-                "ready_count": len([p for p in room.players if p.status == PlayerStatus.READY])
+                "ready_count": room.ready_count
             })
         
         return room
@@ -172,9 +410,11 @@ class RoomManager:
         room.status = RoomStatus.PLAYING
         room.started_at = datetime.now()
         
+        # Комната заполнилась раньше срока — таймер ожидания больше не нужен
+        self.timers.cancel_key(room_id, kind="room_wait")
+        
         # Убираем комнату из матчмейкера
-        if room_id in self.matchmaker_queue[room.game_type]:
-            self.matchmaker_queue[room.game_type].remove(room_id)
+        self.matchmaker.remove(room_id)
         
         # Инициализируем состояние игры в зависимости от типа
         if room.game_type == GameType.DICE:
@@ -188,7 +428,7 @@ class RoomManager:
         
         await self._broadcast_room_update(room_id, "game_started", {
             "game_type": room.game_type,
-            "players": [p.dict() for p in room.players if p.status == PlayerStatus.READY]
+            "players": [p.to_dict() for p in room.players if p.status == PlayerStatus.READY]
         })
     
     async def _init_dice_game(self, room_id: str):
@@ -197,35 +437,34 @@ class RoomManager:
         
         # Создаем игровой движок для кубиков
         ready_players = [p for p in room.players if p.status == PlayerStatus.READY]
-        dice_game = DiceGame(room_id, ready_players, room.bet_amount)
+        seed, seed_hash = self.seed_pool.take()
+        dice_game = DiceGame(room_id, ready_players, room.bet_amount, seed=seed, seed_hash=seed_hash)
         self.game_engines[room_id] = dice_game
         
-        # Устанавливаем seed в комнате для совместимости
-        room.game_seed = dice_game.game_seed
+        # До конца игры в комнате (и в её снимках) только обязательство по seed;
+        # сам seed попадает в room.game_seed вместе с результатами
+        room.game_seed = None
+        room.game_state["seed_hash"] = dice_game.seed_hash
+        room.game_state["nonce"] = dice_game.nonce
         
         # Обновляем статус игроков
         for player in ready_players:
-            player.status = PlayerStatus.PLAYING
+            self._set_status(room, player, PlayerStatus.PLAYING)
         
         # Отправляем игрокам начальное состояние согласно ТЗ
         await self._broadcast_room_update(room_id, "game_start", {
             "game_state": dice_game.get_game_state(),
             "players": [{"id": p.id, "name": p.username} for p in ready_players],
+            "seed_hash": dice_game.seed_hash,
+            "nonce": dice_game.nonce,
             "message": "Игра в кубики началась! Бросьте кубики и наберите наибольшую сумму!"
         })
     
-    async def handle_dice_action(self, player_id: str, room_id: str, action: str):
-        """
-        Обрабатывает действие игрока в игре Dice (например, бросок кубиков).
-        Args:
-            player_id (str): ID игрока
-            room_id (str): ID комнаты
-            action (str): действие ("roll")
-        """
-        if room_id not in self.game_engines:
+    async def _handle_dice_action(self, player_id: str, room_id: str, action: str):
+        """Действие игрока в игре Dice (выполняется актором комнаты)"""
+        dice_game = self.game_engines.get(room_id)
+        if not isinstance(dice_game, DiceGame):
             raise ValueError(f"No dice game found for room {room_id}")
-            
-        dice_game = self.game_engines[room_id]
         
         if action == "roll":
             try:
@@ -273,11 +512,7 @@ class RoomManager:
             dice_game.prepare_reroll()
             
             # Через 10 секунд автоматически начинаем новый раунд
-            await asyncio.sleep(10)
-            await self._broadcast_room_update(room_id, "game_start", {
-                "game_state": dice_game.get_game_state(),
-                "message": "Переброс! Бросайте кубики снова!"
-            })
+            self.timers.call_later(REROLL_DELAY_SECONDS, self._tick, room_id, "reroll", key=room_id, kind="reroll")
             
         else:
             # Есть победители
@@ -285,37 +520,79 @@ class RoomManager:
             prize_per_winner = completion_result["prize_per_winner"]
             
             # Обновляем балансы игроков (выплачиваем выигрыш)
-            for player in room.players:
-                if player.id in winners:
-                    player.balance += prize_per_winner
-                    logger.info(f"Player {player.id} won {prize_per_winner} stars")
-            
-            # Отправляем результаты всем игрокам
+            for winner_id in winners:
+                dice_game.players[winner_id].balance += prize_per_winner
+                logger.info(f"Player {winner_id} won {prize_per_winner} stars")
+            self._settle(room_id, dice_game.players, {winner_id: prize_per_winner for winner_id in winners})
+
+            # Помечаем комнату как завершенную до рассылки: последний патч и запись
+            # журнала возобновления должны содержать статус finished
+            room.status = RoomStatus.FINISHED
+            room.finished_at = datetime.now()
+
+            # Отправляем результаты всем игрокам и раскрываем seed
+            room.game_seed = completion_result["seed"]
             await self._broadcast_room_update(room_id, "game_results", {
                 "winners": winners,
                 "prize_per_winner": prize_per_winner,
                 "total_prize": completion_result["total_prize"],
                 "results": completion_result["results"],
                 "game_state": dice_game.get_game_state(),
-                "seed": completion_result["seed"],      # Публикуем seed для проверки честности
-                "nonce": completion_result["nonce"]     # Публикуем nonce для проверки честности
+                "seed": completion_result["seed"],            # sha256(seed) == seed_hash из game_start
+                "seed_hash": completion_result["seed_hash"],
+                "nonce": completion_result["nonce"],
+                "round_number": dice_game.round_number        # номер раунда, давшего победителя
             })
-            
-            # Помечаем комнату как завершенную
-            room.status = RoomStatus.FINISHED
-            room.finished_at = datetime.now()
+
+            self._record_history(
+                room, list(dice_game.players.values()), winners,
+                prizes={winner_id: prize_per_winner for winner_id in winners},
+                details=completion_result["results"],
+                seed=completion_result["seed"],
+                seed_hash=completion_result["seed_hash"],
+                nonce=completion_result["nonce"],
+                round_number=dice_game.round_number
+            )
             
             # Через 10 секунд удаляем комнату
-            await asyncio.sleep(10)
-            await self._cleanup_room(room_id)
+            self._schedule_cleanup(room_id)
+    
+    async def _start_dice_reroll(self, room_id: str):
+        """Начинает переброс после ничьей (срабатывает по таймеру)"""
+        dice_game = self.game_engines.get(room_id)
+        room = self.rooms.get(room_id)
+        if not isinstance(dice_game, DiceGame) or room is None or room.status != RoomStatus.PLAYING:
+            return  # Устаревший таймер: игра уже завершена или комната удалена
+        await self._broadcast_room_update(room_id, "game_start", {
+            "game_state": dice_game.get_game_state(),
+            "message": "Переброс! Бросайте кубики снова!"
+        })
+    
+    def _add_player(self, room: RuntimeRoom, player: RuntimePlayer):
+        """Добавляет игрока в комнату и индексы менеджера"""
+        room.players.append(player)
+        if player.status == PlayerStatus.READY:
+            room.ready_count += 1
+        self.player_to_room[player.id] = room.id
+        self.player_index[player.id] = player
+        self.status_counts[player.status] += 1
+    
+    def _set_status(self, room: RuntimeRoom, player: RuntimePlayer, status: PlayerStatus):
+        """Меняет статус игрока, поддерживая room.ready_count и status_counts"""
+        if player.status == status:
+            return
+        if player.status == PlayerStatus.READY:
+            room.ready_count -= 1
+        elif status == PlayerStatus.READY:
+            room.ready_count += 1
+        self.status_counts[player.status] -= 1
+        self.status_counts[status] += 1
+        player.status = status
     
     def _get_player_name(self, player_id: str) -> str:
         """Получает имя игрока по ID"""
-        for room in self.rooms.values():
-            for player in room.players:
-                if player.id == player_id:
-                    return player.username
-        return "Unknown"
+        player = self.player_index.get(player_id)
+        return player.username if player is not None else "Unknown"
     
     async def _init_cards_game(self, room_id: str):
         """
@@ -362,30 +639,24 @@ class RoomManager:
         rps_game = RPSGame(room_id, ready_players, room.bet_amount)
         self.game_engines[room_id] = rps_game
         for player in ready_players:
-            player.status = PlayerStatus.PLAYING
+            self._set_status(room, player, PlayerStatus.PLAYING)
         await self._broadcast_room_update(room_id, "rps_started", {
             "message": "Выберите: камень, ножницы или бумага",
-            "timer": 15
+            "timer": RPS_CHOICE_SECONDS
         })
-        asyncio.create_task(self._rps_choice_timer(room_id))
+        self.timers.call_later(RPS_CHOICE_SECONDS, self._tick, room_id, "rps_choice", key=room_id, kind="rps_choice")
 
     async def _rps_choice_timer(self, room_id: str):
         """
         Таймер выбора в RPS (15 секунд)
         """
-        await asyncio.sleep(15)
-        if room_id in self.rooms:
+        if room_id in self.rooms and isinstance(self.game_engines.get(room_id), RPSGame):
             room = self.rooms[room_id]
             if room.status == RoomStatus.PLAYING:
                 await self._finish_rps_game(room_id)
 
-    async def handle_rps_choice(self, player_id: str, choice: str):
-        """
-        Обрабатывает выбор игрока в RPS через движок RPSGame
-        Args:
-            player_id (str): ID игрока
-            choice (str): выбор ("rock", "paper", "scissors")
-        """
+    async def _handle_rps_choice(self, player_id: str, choice: str):
+        """Выбор игрока в RPS (выполняется актором комнаты)"""
         room_id = self.player_to_room.get(player_id)
         if not room_id or room_id not in self.rooms:
             return
@@ -396,13 +667,12 @@ class RoomManager:
             return
         rps_game: RPSGame = self.game_engines[room_id]
         rps_game.player_choice(player_id, choice)
-        ready_players = [p for p in room.players if p.status == PlayerStatus.READY]
         if rps_game.all_players_chosen():
             await self._finish_rps_game(room_id)
         else:
             await self._broadcast_room_update(room_id, "rps_choice_made", {
                 "choices_count": rps_game.choices_count(),
-                "total_players": len(ready_players)
+                "total_players": len(rps_game.players)
             })
 
     async def _finish_rps_game(self, room_id: str):
@@ -413,11 +683,19 @@ class RoomManager:
             return
         rps_game: RPSGame = self.game_engines[room_id]
         room = self.rooms[room_id]
-        ready_players = [p for p in room.players if p.status == PlayerStatus.READY]
+        # Участники игры — те, чьи ставки заблокированы при старте (статус к этому моменту уже PLAYING)
+        ready_players = list(rps_game.players.values())
         result = rps_game.finish_game([p.id for p in ready_players])
+        prizes, refunds = {}, {}
+        # Статус меняется до рассылки итога: последний патч и запись журнала
+        # возобновления должны содержать статус finished
+        room.status = RoomStatus.FINISHED
+        room.finished_at = datetime.now()
         if result["result"] == "tie":
             for player in ready_players:
                 player.balance += room.bet_amount
+                refunds[player.id] = room.bet_amount
+            self._refund(room_id)
             await self._broadcast_room_update(room_id, "game_finished", {
                 "result": "tie",
                 "choices": result["choices"],
@@ -426,6 +704,8 @@ class RoomManager:
         elif result["result"] == "complex_tie":
             for player in ready_players:
                 player.balance += room.bet_amount
+                refunds[player.id] = room.bet_amount
+            self._refund(room_id)
             await self._broadcast_room_update(room_id, "game_finished", {
                 "result": "complex_tie",
                 "choices": result["choices"],
@@ -435,26 +715,29 @@ class RoomManager:
             winner_prize = room.pot // len(result["winners"])
             room.winner_ids = result["winners"]
             for winner_id in result["winners"]:
-                for player in ready_players:
-                    if player.id == winner_id:
-                        player.balance += winner_prize
+                rps_game.players[winner_id].balance += winner_prize
+                prizes[winner_id] = winner_prize
+            self._settle(room_id, rps_game.players, prizes)
             await self._broadcast_room_update(room_id, "game_finished", {
                 "result": "win",
                 "choices": result["choices"],
                 "winners": room.winner_ids,
                 "prize_per_winner": winner_prize
             })
-        room.status = RoomStatus.FINISHED
-        room.finished_at = datetime.now()
+        self._record_history(
+            room, ready_players, result.get("winners", []), prizes=prizes, refunds=refunds,
+            details={pid: {"choice": choice} for pid, choice in result["choices"].items()},
+            result=result["result"]
+        )
+        self._schedule_cleanup(room_id)
     
     async def _room_timer(self, room_id: str):
         """
         Таймер ожидания заполнения комнаты (лобби). Если не набралось игроков — отменяет комнату.
+        Срабатывает через room.timer_seconds после создания комнаты.
         Args:
             room_id (str): ID комнаты
         """
-        await asyncio.sleep(60)  # 60 секунд ожидания
-        
         if room_id not in self.rooms:
             return
         
@@ -478,67 +761,278 @@ class RoomManager:
         room.status = RoomStatus.CANCELLED
         
         # Возвращаем заблокированные ставки
+        refunds = {}
         for player in room.players:
             if player.status == PlayerStatus.READY:
                 player.balance += room.bet_amount
+                refunds[player.id] = room.bet_amount
+        self._refund(room_id)
+        self._record_history(room, room.players, refunds=refunds)
         
         await self._broadcast_room_update(room_id, "room_cancelled", {
             "message": "Комната отменена из-за недостатка игроков. Ставки возвращены."
         })
         
         # Убираем комнату из матчмейкера
-        if room_id in self.matchmaker_queue[room.game_type]:
-            self.matchmaker_queue[room.game_type].remove(room_id)
+        self.matchmaker.remove(room_id)
         
         # Удаляем комнату через некоторое время
-        asyncio.create_task(self._cleanup_room(room_id, delay=10))
+        self._schedule_cleanup(room_id)
+    
+    async def _open_balance(self, telegram_id: str) -> int:
+        """Доступный баланс игрока при входе в комнату"""
+        if self.ledger is None:
+            return settings.DEMO_BALANCE
+        return await self.ledger.open_account(telegram_id)
+    
+    def _close_balance(self, telegram_id: str):
+        """Отменяет open_account игрока, так и не вошедшего в комнату"""
+        if self.ledger is not None:
+            self.ledger.leave(telegram_id)
+    
+    def _settle(self, room_id: str, players: Dict[str, RuntimePlayer], prizes: Dict[str, int]):
+        """Закрывает резервы ставок (они уже списаны в базе) и начисляет выигрыши в ledger"""
+        if self.ledger is not None:
+            self.ledger.settle(room_id, {players[pid].telegram_id: prize for pid, prize in prizes.items()})
+    
+    def _refund(self, room_id: str):
+        """Снимает резервы ставок комнаты в ledger"""
+        if self.ledger is not None:
+            self.ledger.release(room_id)
+    
+    def _record_history(self, room: RuntimeRoom, players: List[RuntimePlayer], winners: List[str] = (),
+                        prizes: Optional[Dict[str, int]] = None, refunds: Optional[Dict[str, int]] = None,
+                        details: Optional[Dict[str, Dict]] = None, **extra):
+        """
+        Ставит итог комнаты в очередь истории (запись выполняется в фоне).
+        Args:
+            room (RuntimeRoom): завершённая или отменённая комната
+            players (List[RuntimePlayer]): участники
+            winners (List[str]): ID победителей
+            prizes (Optional[Dict[str, int]]): выигрыш по игрокам
+            refunds (Optional[Dict[str, int]]): возвращённые ставки по игрокам
+            details (Optional[Dict[str, Dict]]): игровые данные по игрокам (кубики, выбор)
+            **extra: поля итога конкретной игры (seed, nonce и т.д.)
+        """
+        if self.history is None:
+            return
+        prizes, refunds, details = prizes or {}, refunds or {}, details or {}
+        self.history.submit({
+            # Короткий room.id не уникален в базе: строка истории получает свой ключ
+            "history_id": str(uuid.uuid4()),
+            "room_id": room.id,
+            "game_type": room.game_type.value,
+            "status": room.status.value,
+            "bet_amount": room.bet_amount,
+            "pot": room.pot,
+            "max_players": room.max_players,
+            "created_at": room.created_at.isoformat(),
+            "finished_at": (room.finished_at or datetime.now()).isoformat(),
+            "winners": list(winners),
+            **extra,
+            "players": [{
+                "id": player.id,
+                "telegram_id": player.telegram_id,
+                "username": player.username,
+                "is_creator": player.is_creator,
+                "prize": prizes.get(player.id, 0),
+                "refund": refunds.get(player.id, 0),
+                "score": details.get(player.id, {}).get("total"),
+                "data": details.get(player.id, {})
+            } for player in players]
+        })
+    
+    def _schedule_cleanup(self, room_id: str):
+        """Отменяет оставшиеся таймеры завершённой комнаты и планирует её удаление"""
+        self.timers.cancel_key(room_id)
+        self.timers.call_later(CLEANUP_DELAY_SECONDS, self._tick, room_id, "cleanup", key=room_id, kind="cleanup")
     
-    async def _cleanup_room(self, room_id: str, delay: int = 0):
+    async def _cleanup_room(self, room_id: str):
         """Очищает комнату после завершения"""
-        if delay > 0:
-            await asyncio.sleep(delay)
+        self.timers.cancel_key(room_id)
         
         if room_id in self.rooms:
             room = self.rooms[room_id]
             
-            # Удаляем игроков из отслеживания
+            # Удаляем игроков из отслеживания (если игрок уже перешёл в другую комнату,
+            # его записи принадлежат ей)
+            left = []
             for player in room.players:
-                if player.id in self.player_to_room:
+                self.status_counts[player.status] -= 1
+                if self.player_to_room.get(player.id) == room_id:
                     del self.player_to_room[player.id]
+                    del self.player_index[player.id]
+                    left.append(player.id)
+            if self.ledger is not None:
+                self.ledger.release(room_id)  # Резервы игры, прерванной без расчёта
+                for player in room.players:
+                    self.ledger.leave(player.telegram_id)
             
             del self.rooms[room_id]
+            self.game_engines.pop(room_id, None)
+            self.matchmaker.remove(room_id)
+            self.room_states.forget(room_id)
+            self.replay.forget(room_id)
+            await self.store.delete_room(room)
+            # Актор завершится после текущей команды (очистка выполняется им же)
+            actor = self.actors.pop(room_id, None)
+            if actor is not None:
+                actor.close()
+            if self.on_room_closed is not None:
+                await self.on_room_closed(room_id, left)
             logger.info(f"Room {room_id} cleaned up")
     
-    async def connect_player(self, player_id: str, websocket: WebSocket):
+    async def connect_player(self, player_id: str, websocket: WebSocket, protocol: str = "json",
+                             resume_from: Optional[int] = None) -> ClientConnection:
         """
-        Регистрирует WebSocket-подключение игрока.
+        Регистрирует WebSocket-подключение игрока и запускает его очередь отправки.
+        Предыдущее подключение того же игрока закрывается.
         Args:
             player_id (str): ID игрока
             websocket (WebSocket): WebSocket-соединение
+            protocol (str): согласованный подпротокол: "json" или "msgpack"
+            resume_from (Optional[int]): seq последнего события комнаты, полученного клиентом
+                до разрыва; без него клиент получает полный снимок
+        Returns:
+            ClientConnection: подключение игрока
         """
-        self.player_connections[player_id] = websocket
+        await self._ensure_subscribed()
+        self.heartbeat.start()
+        connection = ClientConnection(
+            player_id,
+            websocket,
+            max_queue=settings.WS_SEND_QUEUE_SIZE,
+            policy=OverflowPolicy(settings.WS_OVERFLOW_POLICY),
+            send_timeout=settings.WS_SEND_TIMEOUT,
+            on_close=self._on_connection_lost,
+            protocol=protocol
+        )
+        previous = self.player_connections.get(player_id)
+        self.player_connections[player_id] = connection
+        connection.start()
+        if previous is not None:
+            await previous.close()
+        
+        # После переподключения клиент получает пропущенные события или полный снимок комнаты
+        if resume_from is not None:
+            await self.resume_player(player_id, resume_from)
+        else:
+            await self.resync_player(player_id)
+        return connection
     
-    async def disconnect_player(self, player_id: str):
+    async def resume_player(self, player_id: str, resume_from: int):
+        """
+        Досылает игроку события его комнаты, пропущенные после resume_from.
+        Если они уже вытеснены из журнала (или их больше, чем вмещает очередь
+        подключения), отправляет полный снимок.
+        Args:
+            player_id (str): ID игрока
+            resume_from (int): seq последнего события, полученного клиентом
+        """
+        room_id = await self.player_room(player_id)
+        connection = self.player_connections.get(player_id)
+        if not room_id or connection is None:
+            return
+        
+        if room_id in self.rooms:
+            version, frames = self.rooms[room_id].version, self.replay.since(room_id, resume_from)
+        else:
+            # Журнал комнаты другого узла хранит её владелец
+            owner = await self._remote_owner(room_id)
+            replay = await self.store.call(owner, "replay", room_id=room_id, resume_from=resume_from) if owner else None
+            if replay is None:
+                return
+            version, frames = replay["version"], replay["frames"]
+        if frames is None or len(frames) >= connection.max_queue:
+            await self.resync_player(player_id)
+            return
+        if not frames:
+            await self._send_to_player(player_id, "room_synced", {
+                "room_id": room_id, "version": version, "seq": resume_from
+            })
+            return
+        for frame in frames:
+            connection.enqueue(self.broadcaster.transcode(frame) if connection.binary else frame)
+    
+    async def resync_player(self, player_id: str, since_version: Optional[int] = None):
+        """
+        Отправляет игроку полный снимок его комнаты, если его версия устарела.
+        Args:
+            player_id (str): ID игрока
+            since_version (Optional[int]): последняя версия комнаты, известная клиенту
+        """
+        room_id = await self.player_room(player_id)
+        if not room_id:
+            return
+        if room_id in self.rooms:
+            message = self._sync_message(room_id, since_version)
+        else:
+            owner = await self._remote_owner(room_id)
+            message = await self.store.call(owner, "sync_message", room_id=room_id,
+                                            since_version=since_version) if owner else None
+        if message is not None:
+            await self._send_private_message(player_id, message)
+    
+    def _sync_message(self, room_id: str, since_version: Optional[int] = None) -> Optional[Dict]:
+        """Снимок комнаты этого узла (или room_synced, если версия клиента актуальна)"""
+        room = self.rooms.get(room_id)
+        if room is None:
+            return None
+        snapshot = self.room_states.full_state(room, since_version)
+        if snapshot is None:
+            return {"type": "room_synced", "data": {
+                "room_id": room_id, "version": room.version, "seq": self.replay.last_seq(room_id)
+            }}
+        # seq снимка — номер последнего учтённого в нём события; с него клиент может возобновиться
+        return {
+            "type": "room_snapshot",
+            "room_id": room_id,
+            "version": room.version,
+            "seq": self.replay.last_seq(room_id),
+            "room": snapshot
+        }
+    
+    async def disconnect_player(self, player_id: str, connection: Optional[ClientConnection] = None):
         """
         Отключает игрока, обновляет статус и рассылку.
         Args:
             player_id (str): ID игрока
+            connection (Optional[ClientConnection]): закрываемое подключение; если игрок
+                уже переподключился через другое, вызов игнорируется
         """
-        if player_id in self.player_connections:
+        current = self.player_connections.get(player_id)
+        if connection is not None and current is not connection:
+            return
+        if current is not None:
             del self.player_connections[player_id]
+            await current.close()
         
-        # Обновляем статус игрока в комнате
-        room_id = self.player_to_room.get(player_id)
-        if room_id and room_id in self.rooms:
-            room = self.rooms[room_id]
-            for player in room.players:
-                if player.id == player_id:
-                    player.status = PlayerStatus.DISCONNECTED
-                    break
-            
-            await self._broadcast_room_update(room_id, "player_disconnected", {
-                "player_id": player_id
-            })
+        # Обновляем статус игрока в комнате через её актор (на узле-владельце комнаты)
+        room_id = await self.player_room(player_id)
+        actor = self.actors.get(room_id)
+        if actor is not None:
+            await actor.submit(PlayerDisconnected(player_id))
+            return
+        owner = await self._remote_owner(room_id)
+        if owner is not None:
+            await self.store.call(owner, "disconnect", player_id=player_id)
+    
+    async def _mark_disconnected(self, player_id: str, room_id: str):
+        """Помечает игрока отключённым (выполняется актором комнаты)"""
+        if room_id not in self.rooms:
+            return
+        room = self.rooms[room_id]
+        player = self.player_index.get(player_id)
+        if player is not None and self.player_to_room.get(player_id) == room_id:
+            self._set_status(room, player, PlayerStatus.DISCONNECTED)
+        
+        await self._broadcast_room_update(room_id, "player_disconnected", {
+            "player_id": player_id
+        })
+    
+    async def _on_connection_lost(self, connection: ClientConnection):
+        """Вызывается писателем соединения при ошибке, таймауте или переполнении очереди."""
+        await self.disconnect_player(connection.player_id, connection)
     
     async def _broadcast_room_update(self, room_id: str, update_type: str, data: Dict):
         """
@@ -552,28 +1046,59 @@ class RoomManager:
             return
         
         room = self.rooms[room_id]
+        # Вместо полного снимка рассылаем патч от предыдущей версии комнаты.
+        # Клиент применяет патч, если base_version совпадает с его версией,
+        # иначе запрашивает снимок (action "resync" с since_version).
+        # seq нумерует события комнаты подряд (версия меняется не у каждого события);
+        # по нему переподключившийся клиент получает пропущенные события из журнала.
+        base_version = room.version
+        patch = self.room_states.advance(room)
+        seq = self.replay.next_seq(room_id)
         message = {
             "type": update_type,
             "room_id": room_id,
             "data": data,
-            "room": room.dict()
+            "base_version": base_version,
+            "version": room.version,
+            "seq": seq,
+            "patch": patch
         }
         
-        for player in room.players:
-            if player.id in self.player_connections:
-                try:
-                    await self.player_connections[player.id].send_text(json.dumps(message))
-                except:
-                    # Соединение разорвано
-                    await self.disconnect_player(player.id)
+        # Кодируем событие один раз для всех получателей и журнала; через хранилище
+        # оно доходит до игроков, подключённых к любому узлу (включая этот)
+        frame = self.broadcaster.encode(message)
+        self.replay.append(room_id, seq, frame)
+        
+        await self.store.save_room(room)
+        
+        coalesce_key = f"room:{room_id}" if update_type in ROOM_STATE_EVENTS else None
+        await self._ensure_subscribed()
+        await self.store.publish([player.id for player in room.players], frame, coalesce_key)
+    
+    async def _ensure_subscribed(self):
+        """Подписывает узел на события комнат из хранилища и на команды его комнатам от других узлов"""
+        if not self._subscribed:
+            self._subscribed = True
+            await self.store.subscribe(self._deliver)
+            await self.store.serve(self._serve_command)
+    
+    def _deliver(self, recipients: List[str], frame: str, coalesce_key: Optional[str]):
+        """Ставит событие в очереди игроков, подключённых к этому узлу"""
+        connections = [
+            self.player_connections[player_id]
+            for player_id in recipients
+            if player_id in self.player_connections
+        ]
+        # Соединения, не принявшие событие, отключаются своими писателями
+        self.broadcaster.fan_out(frame, connections, coalesce_key)
     
     async def _send_private_message(self, player_id: str, message: Dict):
-        """Отправляет приватное сообщение игроку"""
-        if player_id in self.player_connections:
-            try:
-                await self.player_connections[player_id].send_text(json.dumps(message))
-            except:
-                await self.disconnect_player(player_id)
+        """Отправляет приватное сообщение игроку (игроку комнаты этого узла, подключённому к другому, — через хранилище)"""
+        connection = self.player_connections.get(player_id)
+        if connection is not None:
+            connection.enqueue(self.broadcaster.encode_for(connection, message))
+        elif player_id in self.player_index:
+            await self.store.publish([player_id], self.broadcaster.encode(message))
     
     async def _send_to_player(self, player_id: str, message_type: str, data: Dict):
         """Отправляет сообщение конкретному игроку"""
@@ -583,14 +1108,107 @@ class RoomManager:
         }
         await self._send_private_message(player_id, message)
     
-    def get_available_rooms(self, game_type: GameType, max_bet: int = None) -> List[Room]:
+    def get_available_rooms(self, game_type: GameType, max_bet: int = None) -> List[RuntimeRoom]:
         """Возвращает доступные комнаты для матчмейкинга"""
-        available = []
+        return [
+            self.rooms[room_id]
+            for room_id in self.matchmaker.rooms(game_type, max_bet)
+            if room_id in self.rooms
+        ]
+    
+    async def available_rooms(self, game_type: GameType, max_bet: int = None) -> List[RuntimeRoom]:
+        """Доступные комнаты всех узлов (асинхронный интерфейс, общий с ShardedRoomManager)"""
+        room_ids = await self.store.open_rooms(game_type, max_bet)
+        remote = await self.store.get_rooms([room_id for room_id in room_ids if room_id not in self.rooms])
+        by_id = {room.id: room for room in remote}
+        by_id.update((room_id, self.rooms[room_id]) for room_id in room_ids if room_id in self.rooms)
+        return [by_id[room_id] for room_id in room_ids if room_id in by_id]
+    
+    async def get_room(self, room_id: str) -> Optional[RuntimeRoom]:
+        """Комната по ID (своя или другого узла из хранилища) или None"""
+        return self.rooms.get(room_id) or await self.store.get_room(room_id)
+    
+    async def room_info(self, room_id: str, since_version: Optional[int] = None) -> Optional[Dict]:
+        """
+        Снимок комнаты для REST API.
+        Args:
+            room_id (str): ID комнаты
+            since_version (Optional[int]): версия комнаты, известная клиенту
+        Returns:
+            Optional[Dict]: {"version", "room"} или {"version", "unchanged"} если клиент актуален;
+                None если комнаты нет
+        """
+        room = self.rooms.get(room_id)
+        if room is None:
+            # Комната другого узла: последняя сохранённая версия из хранилища
+            room = await self.store.get_room(room_id)
+            if room is None:
+                return None
+            if since_version == room.version:
+                return {"version": room.version, "unchanged": True}
+            return {"version": room.version, "room": room.to_dict(include_version=False)}
+        snapshot = self.room_states.full_state(room, since_version)
+        if snapshot is None:
+            return {"version": room.version, "unchanged": True}
+        return {"version": room.version, "room": snapshot}
+    
+    async def stats(self) -> Dict:
+        """Счётчики для /health"""
+        return {
+            "rooms_count": len(self.rooms),
+            "pending_timers": self.timers.metrics()["pending"],
+            "active_connections": len(self.player_connections),
+            "connections": self.heartbeat.stats(),
+            "players": {status.value: count for status, count in self.status_counts.items() if count},
+            "seed_pool": self.seed_pool.stats(),
+            "history": self.history.stats() if self.history is not None else None,
+            "ledger": self.ledger.stats() if self.ledger is not None else None
+        }
+    
+    async def close(self):
+        """Останавливает heartbeat, дописывает историю игр и расчёты, закрывает хранилище."""
+        self.heartbeat.stop()
+        if self.history is not None:
+            await self.history.close()
+        if self.ledger is not None:
+            await self.ledger.close()
+        await self.store.close()
+    
+    async def debug_snapshot(self) -> Dict:
+        """Состояние менеджера для отладочного endpoint"""
+        return {
+            "rooms": {room_id: room.to_dict() for room_id, room in self.rooms.items()},
+            "matchmaker_queue": self.matchmaker.snapshot(),
+            "timers": self.timers.metrics(),
+            "active_connections": len(self.player_connections)
+        }
+    
+    async def auto_match(self, player_id: str, telegram_id: str, username: str, game_type: GameType, bet_amount: int) -> Tuple[RuntimeRoom, bool]:
+        """
+        Помещает игрока в старейшую открытую комнату с такой же ставкой (на любом узле)
+        или создаёт новую. Присоединение выполняет актор комнаты: если последнее место заняли раньше,
+        join вернёт None и для игрока будет создана новая комната.
+        Args:
+            player_id (str): ID игрока
+            telegram_id (str): Telegram ID
+            username (str): Имя пользователя
+            game_type (GameType): Тип игры
+            bet_amount (int): Ставка в звёздах
+        Returns:
+            Tuple[RuntimeRoom, bool]: комната и признак того, что она была создана
+        """
+        current_room_id = await self.player_room(player_id)
+        if current_room_id:
+            room = await self.get_room(current_room_id)
+            if room is not None:
+                return room, False
         
-        for room_id in self.matchmaker_queue.get(game_type, []):
-            if room_id in self.rooms:
-                room = self.rooms[room_id]
-                if room.can_join() and (max_bet is None or room.bet_amount <= max_bet):
-                    available.append(room)
+        # Открытые комнаты всех узлов; комнату другого узла присоединяет её владелец
+        room_id = await self.store.first_open(game_type, bet_amount)
+        if room_id is not None:
+            room = await self.join_room(player_id, telegram_id, username, room_id)
+            if room is not None:
+                return room, False
         
-        return available
+        room = await self.create_room(player_id, telegram_id, username, game_type, bet_amount)
+        return room, True
@@ -0,0 +1,412 @@
+import asyncio
+import itertools
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from server import codec
+from server.config import settings
+from server.matchmaker import MatchmakingIndex
+from server.models import GameType, RoomStatus
+from server.runtime_models import RuntimeRoom
+
+logger = logging.getLogger(__name__)
+
+# Получатель рассылки: handler(recipients, frame, coalesce_key)
+EventHandler = Callable[[List[str], str, Optional[str]], None]
+# Исполнитель команд комнатам узла: await handler(op, args) -> результат
+CommandHandler = Callable[[str, Dict[str, Any]], Awaitable[Any]]
+
+
+def is_open(room: RuntimeRoom) -> bool:
+    """Комната участвует в матчмейкинге: ждёт игроков и в ней есть места."""
+    return room.status == RoomStatus.WAITING and room.can_join()
+
+
+class RoomStore:
+    """
+    Общее состояние комнат: комнаты, комната каждого игрока, индекс открытых
+    комнат для матчмейкинга и рассылка событий между узлами (pub/sub).
+    Менять комнату может только узел, на котором живёт её актор (владелец);
+    читать и получать события — любой узел. Команды комнате чужого узла
+    пересылаются владельцу через call().
+    """
+
+    # ID узла: владелец комнат, которые он сохраняет
+    node_id: str = ""
+
+    def attach(self, rooms: Dict[str, RuntimeRoom], player_to_room: Dict[str, str], index: MatchmakingIndex):
+        """Подключает индексы RoomManager этого узла (используется хранилищем в памяти)."""
+
+    async def save_room(self, room: RuntimeRoom):
+        """Сохраняет комнату, её владельца (этот узел) и место в индексе открытых комнат."""
+        raise NotImplementedError
+
+    async def get_room(self, room_id: str) -> Optional[RuntimeRoom]:
+        raise NotImplementedError
+
+    async def get_rooms(self, room_ids: List[str]) -> List[RuntimeRoom]:
+        """Комнаты по списку ID (отсутствующие пропускаются)."""
+        raise NotImplementedError
+
+    async def delete_room(self, room: RuntimeRoom):
+        """Удаляет комнату, её запись в индексе и привязки её игроков."""
+        raise NotImplementedError
+
+    async def set_player_room(self, player_id: str, room_id: str):
+        raise NotImplementedError
+
+    async def get_player_room(self, player_id: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def first_open(self, game_type: GameType, bet_amount: int) -> Optional[str]:
+        """Старейшая открытая комната с такой ставкой."""
+        raise NotImplementedError
+
+    async def open_rooms(self, game_type: GameType, max_bet: Optional[int] = None) -> List[str]:
+        """ID открытых комнат со ставкой ≤ max_bet (по возрастанию ставки, затем по времени создания)."""
+        raise NotImplementedError
+
+    async def room_owner(self, room_id: str) -> Optional[str]:
+        """ID узла, владеющего комнатой; None — комнаты нет."""
+        raise NotImplementedError
+
+    async def call(self, node_id: str, op: str, /, **args) -> Any:
+        """
+        Выполняет команду на узле-владельце комнаты и возвращает её результат.
+        Raises:
+            ValueError: если команда на узле завершилась ValueError
+            RuntimeError: при любой другой ошибке узла
+            TimeoutError: если узел не ответил
+        """
+        raise NotImplementedError
+
+    async def serve(self, handler: CommandHandler):
+        """Принимает команды, пересланные этому узлу другими узлами."""
+        raise NotImplementedError
+
+    async def publish(self, recipients: List[str], frame: str, coalesce_key: Optional[str] = None):
+        """Рассылает закодированное событие игрокам на всех узлах."""
+        raise NotImplementedError
+
+    async def subscribe(self, handler: EventHandler):
+        """Подписывает узел на события; handler получает их в том числе от своего узла."""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class MemoryRoomStore(RoomStore):
+    """
+    Хранилище в памяти процесса (один узел). Рассылка вызывает подписчиков сразу.
+    Подключённое к RoomManager (attach) хранилище — представление его собственных
+    индексов (rooms, player_to_room, матчмейкер): менеджер уже поддерживает их сам,
+    поэтому запись в хранилище ничего не копирует.
+    """
+
+    def __init__(self):
+        self.node_id = "local"
+        self.rooms: Dict[str, RuntimeRoom] = {}
+        self.player_to_room: Dict[str, str] = {}
+        self.index = MatchmakingIndex()
+        self._attached = False
+        self._handlers: List[EventHandler] = []
+        self._command_handler: Optional[CommandHandler] = None
+
+    def attach(self, rooms: Dict[str, RuntimeRoom], player_to_room: Dict[str, str], index: MatchmakingIndex):
+        self.rooms, self.player_to_room, self.index = rooms, player_to_room, index
+        self._attached = True
+
+    async def save_room(self, room: RuntimeRoom):
+        if self._attached:
+            return
+        self.rooms[room.id] = room
+        if is_open(room):
+            self.index.add(room)
+        else:
+            self.index.remove(room.id)
+
+    async def get_room(self, room_id: str) -> Optional[RuntimeRoom]:
+        return self.rooms.get(room_id)
+
+    async def get_rooms(self, room_ids: List[str]) -> List[RuntimeRoom]:
+        return [self.rooms[room_id] for room_id in room_ids if room_id in self.rooms]
+
+    async def delete_room(self, room: RuntimeRoom):
+        if self._attached:
+            return
+        self.rooms.pop(room.id, None)
+        self.index.remove(room.id)
+        for player in room.players:
+            if self.player_to_room.get(player.id) == room.id:
+                del self.player_to_room[player.id]
+
+    async def set_player_room(self, player_id: str, room_id: str):
+        if not self._attached:
+            self.player_to_room[player_id] = room_id
+
+    async def get_player_room(self, player_id: str) -> Optional[str]:
+        return self.player_to_room.get(player_id)
+
+    async def first_open(self, game_type: GameType, bet_amount: int) -> Optional[str]:
+        return self.index.first(game_type, bet_amount)
+
+    async def open_rooms(self, game_type: GameType, max_bet: Optional[int] = None) -> List[str]:
+        return list(self.index.rooms(game_type, max_bet))
+
+    async def room_owner(self, room_id: str) -> Optional[str]:
+        return self.node_id if room_id in self.rooms else None
+
+    async def call(self, node_id: str, op: str, /, **args) -> Any:
+        # Единственный узел — владелец всех комнат
+        if node_id != self.node_id or self._command_handler is None:
+            raise RuntimeError(f"Unknown room node: {node_id}")
+        return await self._command_handler(op, args)
+
+    async def serve(self, handler: CommandHandler):
+        self._command_handler = handler
+
+    async def publish(self, recipients: List[str], frame: str, coalesce_key: Optional[str] = None):
+        for handler in self._handlers:
+            handler(recipients, frame, coalesce_key)
+
+    async def subscribe(self, handler: EventHandler):
+        self._handlers.append(handler)
+
+
+class RedisRoomStore(RoomStore):
+    """
+    Хранилище в Redis, общее для нескольких узлов API.
+    Ключи (prefix — пространство имён):
+    - {prefix}:room:{id} — JSON комнаты;
+    - {prefix}:room_owner — hash room_id -> node_id узла, где живёт актор комнаты;
+    - {prefix}:player_room — hash player_id -> room_id;
+    - {prefix}:open:{game_type} — sorted set открытых комнат с одинаковым score;
+      элемент "{bet:012d}:{created_us:020d}:{room_id}" упорядочен лексикографически
+      по ставке и времени создания, поэтому выборки — ZRANGEBYLEX;
+    - {prefix}:events — канал pub/sub для рассылки событий;
+    - {prefix}:node:{node_id} — канал команд узлу и ответов на его команды:
+      {"id", "op", "args", "reply"} -> {"id", "result"} или {"id", "error", "kind"}.
+    При обрыве подписки слушатель переподключается с экспоненциальной паузой;
+    события за время обрыва теряются — клиенты увидят разрыв версий и запросят снимок.
+    """
+
+    def __init__(self, client, prefix: str = "rooms", node_id: Optional[str] = None, call_timeout: float = 5.0,
+                 reconnect_delay: float = 0.5, max_reconnect_delay: float = 30.0):
+        """
+        Args:
+            client: клиент redis.asyncio.Redis (или совместимый, например fakeredis)
+            prefix (str): префикс ключей
+            node_id (Optional[str]): ID узла (по умолчанию случайный)
+            call_timeout (float): ожидание ответа узла-владельца на команду, сек
+            reconnect_delay (float): первая пауза перед переподключением подписки, сек
+            max_reconnect_delay (float): предел паузы переподключения, сек
+        """
+        self.client = client
+        self.prefix = prefix
+        self.node_id = node_id or uuid.uuid4().hex[:12]
+        self.channel = f"{prefix}:events"
+        self.node_channel = self._node_channel(self.node_id)
+        self.call_timeout = call_timeout
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self._handlers: List[EventHandler] = []
+        self._command_handler: Optional[CommandHandler] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._seq = itertools.count()
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        self._subscribed: Optional[asyncio.Event] = None
+        self._tasks = set()
+        self.reconnects = 0
+
+    def _room_key(self, room_id: str) -> str:
+        return f"{self.prefix}:room:{room_id}"
+
+    def _open_key(self, game_type: GameType) -> str:
+        return f"{self.prefix}:open:{GameType(game_type).value}"
+
+    def _node_channel(self, node_id: str) -> str:
+        return f"{self.prefix}:node:{node_id}"
+
+    @staticmethod
+    def _open_member(room: RuntimeRoom) -> str:
+        created_us = int(room.created_at.timestamp() * 1_000_000)
+        return f"{room.bet_amount:012d}:{created_us:020d}:{room.id}"
+
+    @staticmethod
+    def _decode_room(raw: Any) -> RuntimeRoom:
+        return RuntimeRoom.from_dict(codec.loads(raw))
+
+    async def save_room(self, room: RuntimeRoom):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.set(self._room_key(room.id), codec.dumps_bytes(room.to_dict()))
+        pipe.hset(f"{self.prefix}:room_owner", room.id, self.node_id)
+        if is_open(room):
+            pipe.zadd(self._open_key(room.game_type), {self._open_member(room): 0})
+        else:
+            pipe.zrem(self._open_key(room.game_type), self._open_member(room))
+        await pipe.execute()
+
+    async def get_room(self, room_id: str) -> Optional[RuntimeRoom]:
+        raw = await self.client.get(self._room_key(room_id))
+        return self._decode_room(raw) if raw is not None else None
+
+    async def get_rooms(self, room_ids: List[str]) -> List[RuntimeRoom]:
+        if not room_ids:
+            return []
+        values = await self.client.mget([self._room_key(room_id) for room_id in room_ids])
+        return [self._decode_room(raw) for raw in values if raw is not None]
+
+    async def delete_room(self, room: RuntimeRoom):
+        key = f"{self.prefix}:player_room"
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(self._room_key(room.id))
+        pipe.hdel(f"{self.prefix}:room_owner", room.id)
+        pipe.zrem(self._open_key(room.game_type), self._open_member(room))
+        await pipe.execute()
+        # Игрок мог уже перейти в другую комнату — снимаем только свои привязки
+        owners = await self.client.hmget(key, [player.id for player in room.players]) if room.players else []
+        stale = [player.id for player, owner in zip(room.players, owners) if self._text(owner) == room.id]
+        if stale:
+            await self.client.hdel(key, *stale)
+
+    async def set_player_room(self, player_id: str, room_id: str):
+        await self.client.hset(f"{self.prefix}:player_room", player_id, room_id)
+
+    async def get_player_room(self, player_id: str) -> Optional[str]:
+        return self._text(await self.client.hget(f"{self.prefix}:player_room", player_id))
+
+    async def first_open(self, game_type: GameType, bet_amount: int) -> Optional[str]:
+        members = await self.client.zrangebylex(
+            self._open_key(game_type), f"[{bet_amount:012d}:", f"({bet_amount:012d};", start=0, num=1
+        )
+        return self._text(members[0]).rsplit(":", 1)[1] if members else None
+
+    async def open_rooms(self, game_type: GameType, max_bet: Optional[int] = None) -> List[str]:
+        upper = "+" if max_bet is None else f"({max_bet + 1:012d}:"
+        members = await self.client.zrangebylex(self._open_key(game_type), "-", upper)
+        return [self._text(member).rsplit(":", 1)[1] for member in members]
+
+    async def room_owner(self, room_id: str) -> Optional[str]:
+        return self._text(await self.client.hget(f"{self.prefix}:room_owner", room_id))
+
+    async def call(self, node_id: str, op: str, /, **args) -> Any:
+        await self._ensure_listening()  # Ответ придёт в канал этого узла
+        request_id = f"{self.node_id}:{next(self._seq)}"
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            await self.client.publish(self._node_channel(node_id), codec.dumps_bytes(
+                {"id": request_id, "op": op, "args": args, "reply": self.node_id}
+            ))
+            async with asyncio.timeout(self.call_timeout):
+                return await future
+        except TimeoutError:
+            raise TimeoutError(f"Room node {node_id} did not answer {op}") from None
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def serve(self, handler: CommandHandler):
+        self._command_handler = handler
+        await self._ensure_listening()
+
+    async def publish(self, recipients: List[str], frame: str, coalesce_key: Optional[str] = None):
+        await self.client.publish(self.channel, codec.dumps_bytes({"r": recipients, "f": frame, "k": coalesce_key}))
+
+    async def subscribe(self, handler: EventHandler):
+        self._handlers.append(handler)
+        await self._ensure_listening()
+
+    async def _ensure_listening(self):
+        """Запускает слушателя каналов событий и команд и ждёт первой подписки."""
+        if self._listener is None:
+            self._subscribed = asyncio.Event()
+            self._listener = asyncio.ensure_future(self._listen())
+        await self._subscribed.wait()
+
+    async def _listen(self):
+        delay = self.reconnect_delay
+        while True:
+            try:
+                self._pubsub = self.client.pubsub()
+                await self._pubsub.subscribe(self.channel, self.node_channel)
+                self._subscribed.set()
+                delay = self.reconnect_delay
+                async for message in self._pubsub.listen():
+                    if message.get("type") == "message":
+                        self._on_message(message)
+                logger.warning("Room store subscription closed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Room store subscription lost: {e!r}")
+            await self._close_pubsub()
+            self.reconnects += 1
+            logger.info(f"Reconnecting room store subscription in {delay:.1f} s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _on_message(self, message: Dict[str, Any]):
+        try:
+            event = codec.loads(message["data"])
+            if self._text(message["channel"]) == self.channel:
+                for handler in self._handlers:
+                    handler(event["r"], event["f"], event["k"])
+            elif "op" in event:
+                task = asyncio.ensure_future(self._execute(event))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            else:
+                future = self._pending.get(event["id"])
+                if future is None or future.done():
+                    return
+                if "error" in event:
+                    error = ValueError if event["kind"] == "ValueError" else RuntimeError
+                    future.set_exception(error(event["error"]))
+                else:
+                    future.set_result(event["result"])
+        except Exception as e:
+            logger.error(f"Failed to deliver room event: {e!r}")
+
+    async def _execute(self, request: Dict[str, Any]):
+        """Выполняет команду другого узла и публикует ответ в его канал."""
+        try:
+            if self._command_handler is None:
+                raise RuntimeError(f"Room node {self.node_id} does not serve commands")
+            response = {"id": request["id"], "result": await self._command_handler(request["op"], request["args"])}
+        except Exception as e:
+            response = {"id": request["id"], "error": str(e), "kind": type(e).__name__}
+        try:
+            await self.client.publish(self._node_channel(request["reply"]), codec.dumps_bytes(response))
+        except Exception as e:
+            logger.error(f"Failed to answer room command {request['op']}: {e!r}")
+
+    async def _close_pubsub(self):
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.aclose()
+            except Exception:
+                pass
+            self._pubsub = None
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        for task in list(self._tasks):
+            task.cancel()
+        await self._close_pubsub()
+
+    @staticmethod
+    def _text(value: Any) -> Optional[str]:
+        return value.decode() if isinstance(value, bytes) else value
+
+
+def create_room_store() -> RoomStore:
+    """Хранилище комнат по настройкам: ROOM_STORE=memory (по умолчанию) или redis (REDIS_URL)."""
+    if settings.ROOM_STORE == "redis":
+        import redis.asyncio as redis
+        return RedisRoomStore(redis.from_url(settings.REDIS_URL))
+    return MemoryRoomStore()
@@ -0,0 +1,137 @@
+import copy
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Union
+
+from server.models import GameType, PlayerStatus, RoomStatus
+
+
+# Представления игрока и комнаты для игрового цикла в памяти.
+# Pydantic-модели Player и Room из server.models остаются схемами API: to_dict()
+# возвращает словарь в их форме, from_dict() принимает его обратно без валидации
+# (данные приходят из нашего же процесса, шарда или хранилища).
+
+def _datetime(value: Union[datetime, str, None]) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+@dataclass(slots=True, eq=False)
+class RuntimePlayer:
+    """Игрок в комнате (поля как у server.models.Player)."""
+    id: str
+    telegram_id: str
+    username: str
+    balance: int
+    status: PlayerStatus = PlayerStatus.WAITING
+    bet_amount: int = 0
+    is_creator: bool = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Словарь в форме схемы Player."""
+        return {
+            "id": self.id,
+            "telegram_id": self.telegram_id,
+            "username": self.username,
+            "balance": self.balance,
+            "status": self.status,
+            "bet_amount": self.bet_amount,
+            "is_creator": self.is_creator,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RuntimePlayer":
+        return cls(
+            id=data["id"],
+            telegram_id=data["telegram_id"],
+            username=data["username"],
+            balance=data["balance"],
+            status=PlayerStatus(data.get("status", PlayerStatus.WAITING)),
+            bet_amount=data.get("bet_amount", 0),
+            is_creator=data.get("is_creator", False),
+        )
+
+
+@dataclass(slots=True, eq=False)
+class RuntimeRoom:
+    """Игровая комната (поля и методы как у server.models.Room)."""
+    id: str
+    game_type: GameType
+    bet_amount: int
+    created_at: datetime
+    status: RoomStatus = RoomStatus.WAITING
+    players: List[RuntimePlayer] = field(default_factory=list)
+    max_players: int = 4
+    min_players: int = 2
+    pot: int = 0
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    timer_seconds: int = 60
+    game_seed: Optional[str] = None
+    game_state: Dict[str, Any] = field(default_factory=dict)
+    winner_ids: List[str] = field(default_factory=list)
+    version: int = 0
+    # Число игроков в статусе READY. Не входит в схему: считается при создании,
+    # дальше его поддерживает RoomManager при каждой смене статуса игрока
+    ready_count: int = field(default=0, repr=False)
+
+    def __post_init__(self):
+        self.ready_count = sum(1 for player in self.players if player.status == PlayerStatus.READY)
+
+    def can_join(self) -> bool:
+        return self.status == RoomStatus.WAITING and len(self.players) < self.max_players
+
+    def can_start(self) -> bool:
+        return self.ready_count >= self.min_players
+
+    def get_invite_link(self) -> str:
+        return f"https://t.me/your_bot?startapp=join_{self.id}"
+
+    def to_dict(self, include_version: bool = True) -> Dict[str, Any]:
+        """
+        Словарь в форме схемы Room (новые списки и словари — снимок не меняется вместе с комнатой).
+        Args:
+            include_version (bool): включать ли поле version
+        """
+        data = {
+            "id": self.id,
+            "game_type": self.game_type,
+            "status": self.status,
+            "players": [player.to_dict() for player in self.players],
+            "max_players": self.max_players,
+            "min_players": self.min_players,
+            "bet_amount": self.bet_amount,
+            "pot": self.pot,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "timer_seconds": self.timer_seconds,
+            "game_seed": self.game_seed,
+            "game_state": copy.deepcopy(self.game_state) if self.game_state else {},
+            "winner_ids": list(self.winner_ids),
+        }
+        if include_version:
+            data["version"] = self.version
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RuntimeRoom":
+        return cls(
+            id=data["id"],
+            game_type=GameType(data["game_type"]),
+            bet_amount=data["bet_amount"],
+            created_at=_datetime(data["created_at"]),
+            status=RoomStatus(data.get("status", RoomStatus.WAITING)),
+            players=[RuntimePlayer.from_dict(player) for player in data.get("players", [])],
+            max_players=data.get("max_players", 4),
+            min_players=data.get("min_players", 2),
+            pot=data.get("pot", 0),
+            started_at=_datetime(data.get("started_at")),
+            finished_at=_datetime(data.get("finished_at")),
+            timer_seconds=data.get("timer_seconds", 60),
+            game_seed=data.get("game_seed"),
+            game_state=data.get("game_state") or {},
+            winner_ids=list(data.get("winner_ids", [])),
+            version=data.get("version", 0),
+        )
@@ -0,0 +1,158 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class TimerHandle:
+    """Отменяемый таймер, возвращаемый TimerScheduler.call_later."""
+    __slots__ = ("when", "seq", "callback", "args", "key", "kind", "cancelled", "_scheduler")
+
+    def __init__(self, when: float, seq: int, callback: Callable[..., Awaitable[Any]], args: tuple,
+                 key: Optional[str], kind: str, scheduler: "TimerScheduler"):
+        self.when = when
+        self.seq = seq
+        self.callback = callback
+        self.args = args
+        self.key = key
+        self.kind = kind
+        self.cancelled = False
+        self._scheduler = scheduler
+
+    def __lt__(self, other: "TimerHandle") -> bool:
+        return (self.when, self.seq) < (other.when, other.seq)
+
+    def cancel(self) -> bool:
+        """
+        Отменяет таймер.
+        Returns:
+            bool: True если таймер ещё не сработал и был отменён
+        """
+        return self._scheduler._cancel(self)
+
+
+class TimerScheduler:
+    """
+    Единый планировщик таймеров комнат (ожидание лобби, выбор в RPS, переброс, очистка).
+    - Таймеры хранятся в одной куче; в цикле событий взведён только один
+      низкоуровневый таймер — на ближайший срок, поэтому ожидание не держит задач.
+    - Таймеры группируются по ключу (ID комнаты) и отменяются разом, когда комната
+      завершилась раньше срока.
+    - Сработавший таймер запускает свою корутину отдельной задачей.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._heap: List[TimerHandle] = []
+        self._seq = itertools.count()
+        # ключ -> активные таймеры
+        self._by_key: Dict[str, Set[TimerHandle]] = {}
+        # тип таймера -> число ожидающих
+        self._pending_by_kind: Dict[str, int] = {}
+        self._pending = 0
+        self._cancelled_in_heap = 0
+        self._armed: Optional[asyncio.TimerHandle] = None
+        self._armed_at: Optional[float] = None
+        self.fired = 0
+        self.cancelled = 0
+
+    def call_later(self, delay: float, callback: Callable[..., Awaitable[Any]], *args,
+                   key: Optional[str] = None, kind: str = "timer") -> TimerHandle:
+        """
+        Планирует вызов корутины через delay секунд.
+        Args:
+            delay (float): задержка в секундах
+            callback (Callable): корутинная функция
+            *args: аргументы callback
+            key (Optional[str]): ключ группы (обычно ID комнаты)
+            kind (str): тип таймера для метрик
+        Returns:
+            TimerHandle: отменяемый таймер
+        """
+        handle = TimerHandle(self._clock() + delay, next(self._seq), callback, args, key, kind, self)
+        heapq.heappush(self._heap, handle)
+        self._pending += 1
+        self._pending_by_kind[kind] = self._pending_by_kind.get(kind, 0) + 1
+        if key is not None:
+            self._by_key.setdefault(key, set()).add(handle)
+        if self._armed_at is None or handle.when < self._armed_at:
+            self._arm(handle.when)
+        return handle
+
+    def cancel_key(self, key: str, kind: Optional[str] = None) -> int:
+        """
+        Отменяет все ожидающие таймеры группы.
+        Args:
+            key (str): ключ группы
+            kind (Optional[str]): отменять только таймеры этого типа
+        Returns:
+            int: число отменённых таймеров
+        """
+        handles = [h for h in self._by_key.get(key, ()) if kind is None or h.kind == kind]
+        return sum(1 for handle in handles if self._cancel(handle))
+
+    def metrics(self) -> Dict[str, Any]:
+        """Счётчики планировщика: ожидающие таймеры (всего и по типам), сработавшие, отменённые."""
+        return {
+            "pending": self._pending,
+            "pending_by_kind": {kind: count for kind, count in self._pending_by_kind.items() if count},
+            "fired": self.fired,
+            "cancelled": self.cancelled,
+        }
+
+    def _cancel(self, handle: TimerHandle) -> bool:
+        if handle.cancelled:
+            return False
+        handle.cancelled = True
+        self._forget(handle)
+        self.cancelled += 1
+        self._cancelled_in_heap += 1
+        # Отменённые записи удаляются из кучи лениво; при большом количестве — пересборка
+        if self._cancelled_in_heap > 64 and self._cancelled_in_heap * 2 > len(self._heap):
+            self._heap = [h for h in self._heap if not h.cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled_in_heap = 0
+        return True
+
+    def _forget(self, handle: TimerHandle):
+        self._pending -= 1
+        self._pending_by_kind[handle.kind] -= 1
+        if handle.key is not None:
+            group = self._by_key.get(handle.key)
+            if group is not None:
+                group.discard(handle)
+                if not group:
+                    del self._by_key[handle.key]
+
+    def _arm(self, when: float):
+        if self._armed is not None:
+            self._armed.cancel()
+        loop = asyncio.get_running_loop()
+        self._armed_at = when
+        self._armed = loop.call_later(max(0.0, when - self._clock()), self._fire_due)
+
+    def _fire_due(self):
+        self._armed = None
+        self._armed_at = None
+        now = self._clock()
+        while self._heap and (self._heap[0].cancelled or self._heap[0].when <= now):
+            handle = heapq.heappop(self._heap)
+            if handle.cancelled:
+                self._cancelled_in_heap -= 1
+                continue
+            handle.cancelled = True
+            self._forget(handle)
+            self.fired += 1
+            task = asyncio.ensure_future(handle.callback(*handle.args))
+            task.add_done_callback(self._log_failure)
+        if self._heap:
+            self._arm(self._heap[0].when)
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Timer callback failed: {task.exception()!r}")
@@ -0,0 +1,110 @@
+"""
+Расчёт завершённой игры с базой (Database dice/RPS, /api/games/finish-game).
+
+Выплаты считаются в памяти (Payout на игрока) и применяются одной транзакцией
+фиксированным набором запросов — независимо от числа игроков:
+1. UPDATE game_rooms ... WHERE id = :room AND status = 'in_progress' — защита
+   от повторного расчёта: вторая попытка не найдёт комнату в игре;
+2. UPDATE users (executemany): stars_balance + prize, total_games + 1, wins + won;
+3. UPDATE game_participations (executemany): место, очки, выигрыш, данные игрока;
+4. INSERT transactions (executemany) — по строке на каждую ненулевую выплату.
+Балансы меняются выражениями на стороне базы (см. server.balances), поэтому
+параллельные списания и начисления не теряются.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy.orm import Session
+
+from server.database_sqlite import GameParticipation, GameRoom, Transaction, User
+
+users = User.__table__
+rooms = GameRoom.__table__
+participations = GameParticipation.__table__
+transactions = Transaction.__table__
+
+
+class AlreadySettled(ValueError):
+    """Комната не в игре: уже рассчитана другим запросом или ещё не начата."""
+
+
+@dataclass(slots=True)
+class Payout:
+    """Итог игрока в комнате."""
+    user_id: str
+    prize: int = 0                    # начисление: выигрыш или возврат ставки
+    won: bool = False                 # засчитать победу в статистику
+    position: Optional[int] = None    # 1 — победитель, 2 — проигравший, None — ничья
+    score: Optional[int] = None
+    player_data: Dict[str, Any] = field(default_factory=dict)
+    kind: str = "game_win"            # тип транзакции для prize > 0
+    description: str = ""
+
+
+_update_users = (
+    update(users)
+    .where(users.c.id == bindparam("uid"))
+    .values(
+        stars_balance=users.c.stars_balance + bindparam("prize"),
+        total_games=users.c.total_games + 1,
+        wins=users.c.wins + bindparam("won"),
+        updated_at=bindparam("now"),
+    )
+)
+
+_update_participations = (
+    update(participations)
+    .where(participations.c.room_id == bindparam("room"), participations.c.user_id == bindparam("uid"))
+    .values(
+        position=bindparam("position"),
+        score=bindparam("score"),
+        prize_won=bindparam("prize"),
+        player_data=bindparam("data"),
+        finished_at=bindparam("now"),
+    )
+)
+
+
+def settle_room(db: Session, room_id: str, payouts: List[Payout], game_data: Dict[str, Any],
+                finished_at: Optional[datetime] = None):
+    """
+    Применяет итоги комнаты; commit — за вызывающим кодом.
+    Из асинхронного кода: await db.run_sync(settle_room, room_id, payouts, game_data).
+    Args:
+        db (Session): сессия базы
+        room_id (str): ID комнаты в статусе in_progress
+        payouts (List[Payout]): итоги всех участников
+        game_data (Dict[str, Any]): итог игры для game_rooms.game_data
+        finished_at (Optional[datetime]): время завершения (по умолчанию сейчас)
+    Raises:
+        AlreadySettled: комната не в статусе in_progress
+    """
+    now = finished_at or datetime.utcnow()
+    connection = db.connection()
+    claimed = connection.execute(
+        update(rooms)
+        .where(rooms.c.id == room_id, rooms.c.status == "in_progress")
+        .values(status="finished", finished_at=now, game_data=game_data)
+    )
+    if claimed.rowcount != 1:
+        raise AlreadySettled(f"Room {room_id} is not in progress")
+    if not payouts:
+        return
+
+    connection.execute(_update_users, [
+        {"uid": p.user_id, "prize": p.prize, "won": int(p.won), "now": now} for p in payouts
+    ])
+    connection.execute(_update_participations, [
+        {"room": room_id, "uid": p.user_id, "position": p.position, "score": p.score,
+         "prize": p.prize, "data": p.player_data, "now": now}
+        for p in payouts
+    ])
+    rows = [
+        {"user_id": p.user_id, "type": p.kind, "amount": p.prize, "description": p.description,
+         "payment_method": "internal", "status": "success", "room_id": room_id, "created_at": now}
+        for p in payouts if p.prize
+    ]
+    if rows:
+        connection.execute(insert(transactions), rows)
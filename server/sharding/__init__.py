@@ -0,0 +1,4 @@
+from server.sharding.hashring import HashRing
+from server.sharding.router import ShardClient, ShardPool, ShardedRoomManager
+
+__all__ = ["HashRing", "ShardClient", "ShardPool", "ShardedRoomManager"]
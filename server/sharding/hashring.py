@@ -0,0 +1,39 @@
+import hashlib
+from bisect import bisect_right
+from typing import List, Tuple
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Консистентное хеширование ID комнат по шардам.
+    - Каждый шард представлен на кольце replicas виртуальными точками,
+      поэтому комнаты распределяются равномерно.
+    - При изменении числа шардов переезжает только ~1/N комнат.
+    - Поиск шарда — O(log(N * replicas)).
+    """
+
+    def __init__(self, shards: int, replicas: int = 128):
+        """
+        Args:
+            shards (int): число шардов
+            replicas (int): число виртуальных точек на шард
+        """
+        if shards < 1:
+            raise ValueError("HashRing needs at least one shard")
+        self.shards = shards
+        points: List[Tuple[int, int]] = sorted(
+            (_hash(f"shard-{shard}#{replica}"), shard)
+            for shard in range(shards)
+            for replica in range(replicas)
+        )
+        self._keys = [point for point, _ in points]
+        self._owners = [shard for _, shard in points]
+
+    def shard_for(self, key: str) -> int:
+        """Номер шарда, владеющего ключом (ID комнаты)."""
+        index = bisect_right(self._keys, _hash(key))
+        return self._owners[index % len(self._owners)]
@@ -0,0 +1,42 @@
+import asyncio
+import struct
+from typing import Any, Dict, Optional
+
+from server import codec
+
+# Фрейм IPC: 4 байта длины (big-endian) + JSON-сообщение
+_HEADER = struct.Struct(">I")
+
+
+def encode_frame(message: Dict[str, Any]) -> bytes:
+    """Кодирует сообщение во фрейм IPC (datetime и Enum сериализуются как в рассылке)."""
+    payload = codec.dumps_bytes(message)
+    return _HEADER.pack(len(payload)) + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[Dict[str, Any]]:
+    """
+    Читает один фрейм IPC.
+    Returns:
+        Optional[Dict]: сообщение или None, если соединение закрыто
+    """
+    try:
+        header = await reader.readexactly(_HEADER.size)
+        payload = await reader.readexactly(_HEADER.unpack(header)[0])
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+    return codec.loads(payload)
+
+
+class Channel:
+    """Запись фреймов в поток; write() атомарен, поэтому фреймы конкурентных задач не перемешиваются."""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+
+    async def send(self, message: Dict[str, Any]):
+        self.writer.write(encode_frame(message))
+        await self.writer.drain()
+
+    def close(self):
+        self.writer.close()
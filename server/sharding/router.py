@@ -0,0 +1,406 @@
+import asyncio
+import atexit
+import itertools
+import logging
+import multiprocessing
+import os
+import tempfile
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from fastapi import WebSocket
+
+from server.config import settings
+from server.models import GameType
+from server.runtime_models import RuntimeRoom
+from server.realtime.broadcast import BroadcastEngine
+from server.realtime.connection import ClientConnection, OverflowPolicy
+from server.realtime.heartbeat import HeartbeatMonitor
+from server.sharding.hashring import HashRing
+from server.sharding.protocol import Channel, read_frame
+from server.sharding.worker import run_shard
+
+logger = logging.getLogger(__name__)
+
+
+class ShardClient:
+    """Соединение маршрутизатора с одним шардом: запросы с ответами и входящие фреймы игрокам."""
+
+    def __init__(self, index: int, socket_path: str, on_push: Callable[[Dict[str, Any]], None]):
+        self.index = index
+        self.socket_path = socket_path
+        self.on_push = on_push
+        self._channel: Optional[Channel] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._seq = itertools.count()
+
+    async def connect(self, timeout: float = 10.0):
+        """Подключается к шарду, ожидая, пока процесс откроет сокет."""
+        async with asyncio.timeout(timeout):
+            while True:
+                try:
+                    reader, writer = await asyncio.open_unix_connection(self.socket_path)
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    await asyncio.sleep(0.05)
+        self._channel = Channel(writer)
+        self._reader_task = asyncio.ensure_future(self._read_loop(reader))
+
+    async def call(self, op: str, /, **args) -> Any:
+        """
+        Выполняет операцию на шарде.
+        Raises:
+            ValueError: если операция на шарде завершилась ValueError
+            RuntimeError: при любой другой ошибке шарда
+            ConnectionError: если соединение с шардом потеряно
+        """
+        if self._channel is None:
+            raise ConnectionError(f"Room shard {self.index} is not connected")
+        request_id = next(self._seq)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            await self._channel.send({"id": request_id, "op": op, "args": args})
+            return await future
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def _read_loop(self, reader: asyncio.StreamReader):
+        while True:
+            message = await read_frame(reader)
+            if message is None:
+                break
+            if "id" not in message:
+                self.on_push(message)
+                continue
+            future = self._pending.get(message["id"])
+            if future is None or future.done():
+                continue
+            if "error" in message:
+                error = ValueError if message["kind"] == "ValueError" else RuntimeError
+                future.set_exception(error(message["error"]))
+            else:
+                future.set_result(message["result"])
+
+        logger.error(f"Lost connection to room shard {self.index}")
+        self._channel = None
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(f"Room shard {self.index} disconnected"))
+
+    def close(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        if self._channel is not None:
+            self._channel.close()
+            self._channel = None
+
+
+class ShardPool:
+    """Процессы-шарды на одной машине; каждый слушает свой Unix-сокет."""
+
+    def __init__(self, shards: int, socket_dir: Optional[str] = None, log_level: int = logging.INFO):
+        """
+        Args:
+            shards (int): число процессов-шардов (обычно по числу ядер)
+            socket_dir (Optional[str]): каталог для сокетов (по умолчанию временный)
+            log_level (int): уровень логирования в процессах-шардах
+        """
+        self.log_level = log_level
+        self.socket_dir = socket_dir or tempfile.mkdtemp(prefix="room-shards-")
+        self.socket_paths = [os.path.join(self.socket_dir, f"shard-{i}.sock") for i in range(shards)]
+        self.processes: List[multiprocessing.Process] = []
+
+    def start(self):
+        """Запускает процессы-шарды (spawn: дочерний процесс не наследует цикл событий родителя)."""
+        if self.processes:
+            return
+        context = multiprocessing.get_context("spawn")
+        for index, path in enumerate(self.socket_paths):
+            process = context.Process(target=run_shard, args=(index, path, self.log_level), name=f"room-shard-{index}", daemon=True)
+            process.start()
+            self.processes.append(process)
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Останавливает процессы-шарды."""
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+        for process in self.processes:
+            process.join(timeout=5)
+        self.processes = []
+        for path in self.socket_paths:
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+class ShardedRoomManager:
+    """
+    Маршрутизатор комнат по процессам-шардам.
+    - Комната живёт в шарде, выбранном консистентным хешем её ID; все операции
+      с комнатой выполняются там.
+    - WebSocket игрока остаётся в этом процессе: шард присылает готовые фреймы,
+      маршрутизатор кладёт их в очередь ClientConnection игрока.
+    - Комната игрока (player_to_room) запоминается при входе и снимается по
+      уведомлению шарда об удалении комнаты ({"room_closed", "players"}).
+    - Игрок состоит в одной комнате за раз: комнаты разных шардов не видят друг
+      друга, поэтому вход в другую комнату отклоняет маршрутизатор.
+    - Интерфейс совпадает с RoomManager в той части, что использует main.py.
+    """
+
+    def __init__(self, socket_paths: List[str], pool: Optional[ShardPool] = None):
+        """
+        Args:
+            socket_paths (List[str]): сокеты шардов
+            pool (Optional[ShardPool]): пул, который нужно запустить при первом обращении
+        """
+        self.ring = HashRing(len(socket_paths))
+        self.pool = pool
+        self.shards = [ShardClient(i, path, self._on_push) for i, path in enumerate(socket_paths)]
+        self.player_to_room: Dict[str, str] = {}
+        # Игроки, чей вход в комнату ещё выполняется шардом
+        self._entering: Set[str] = set()
+        self.player_connections: Dict[str, ClientConnection] = {}
+        self.broadcaster = BroadcastEngine()
+        # WebSocket игроков живут здесь, поэтому и heartbeat ведёт маршрутизатор
+        self.heartbeat = HeartbeatMonitor(
+            self.player_connections,
+            self._on_connection_lost,
+            interval=settings.WS_HEARTBEAT_INTERVAL,
+            timeout=settings.WS_HEARTBEAT_TIMEOUT,
+            batch_size=settings.WS_HEARTBEAT_BATCH,
+            broadcaster=self.broadcaster
+        )
+        # player_id -> номер текущего подключения (фреймы старых подключений отбрасываются)
+        self._conn_ids: Dict[str, int] = {}
+        self._conn_seq = itertools.count(1)
+        self._started = False
+        self._start_lock = asyncio.Lock()
+
+    async def start(self):
+        """Запускает пул (если задан) и подключается ко всем шардам."""
+        async with self._start_lock:
+            if self._started:
+                return
+            if self.pool is not None:
+                self.pool.start()
+            await asyncio.gather(*(shard.connect() for shard in self.shards))
+            self._started = True
+
+    async def close(self):
+        """Закрывает соединения с шардами и останавливает пул."""
+        self.heartbeat.stop()
+        for connection in list(self.player_connections.values()):
+            await connection.close()
+        for shard in self.shards:
+            shard.close()
+        if self.pool is not None:
+            self.pool.stop()
+        self._started = False
+
+    def shard_for(self, room_id: str) -> ShardClient:
+        return self.shards[self.ring.shard_for(room_id)]
+
+    async def _call(self, owner_room_id: str, op: str, /, **args) -> Any:
+        if not self._started:
+            await self.start()
+        return await self.shard_for(owner_room_id).call(op, **args)
+
+    async def _call_all(self, op: str, /, **args) -> List[Any]:
+        if not self._started:
+            await self.start()
+        return await asyncio.gather(*(shard.call(op, **args) for shard in self.shards))
+
+    async def _enter_room(self, player_id: str, data: Optional[Dict[str, Any]]) -> Optional[RuntimeRoom]:
+        """Запоминает комнату игрока и подключает к ней его WebSocket, если он открыт."""
+        if data is None:
+            return None
+        room = RuntimeRoom.from_dict(data)
+        self.player_to_room[player_id] = room.id
+        conn_id = self._conn_ids.get(player_id)
+        if player_id in self.player_connections and conn_id is not None:
+            await self._call(room.id, "connect", player_id=player_id, conn_id=conn_id)
+        return room
+
+    # Комнаты
+
+    async def create_room(self, creator_id: str, telegram_id: str, username: str, game_type: GameType, bet_amount: int) -> RuntimeRoom:
+        if creator_id in self.player_to_room or creator_id in self._entering:
+            raise ValueError(f"Player {creator_id} is already in room {self.player_to_room.get(creator_id)}")
+        room_id = str(uuid.uuid4())[:8]
+        self._entering.add(creator_id)
+        try:
+            data = await self._call(room_id, "create_room", room_id=room_id, creator_id=creator_id,
+                                    telegram_id=telegram_id, username=username,
+                                    game_type=GameType(game_type).value, bet_amount=bet_amount)
+            return await self._enter_room(creator_id, data)
+        finally:
+            self._entering.discard(creator_id)
+
+    async def join_room(self, player_id: str, telegram_id: str, username: str, room_id: str) -> Optional[RuntimeRoom]:
+        current_room_id = self.player_to_room.get(player_id)
+        if current_room_id == room_id:
+            return await self.get_room(room_id)
+        if current_room_id is not None or player_id in self._entering:
+            return None
+        self._entering.add(player_id)
+        try:
+            data = await self._call(room_id, "join_room", player_id=player_id, telegram_id=telegram_id,
+                                    username=username, room_id=room_id)
+            return await self._enter_room(player_id, data)
+        finally:
+            self._entering.discard(player_id)
+
+    async def player_room(self, player_id: str) -> Optional[str]:
+        return self.player_to_room.get(player_id)
+
+    async def ready_player(self, player_id: str) -> Optional[RuntimeRoom]:
+        room_id = self.player_to_room.get(player_id)
+        if room_id is None:
+            return None
+        data = await self._call(room_id, "ready_player", player_id=player_id)
+        return RuntimeRoom.from_dict(data) if data is not None else None
+
+    async def handle_dice_action(self, player_id: str, room_id: str, action: str):
+        await self._call(room_id, "dice_action", player_id=player_id, room_id=room_id, action=action)
+
+    async def handle_rps_choice(self, player_id: str, choice: str):
+        room_id = self.player_to_room.get(player_id)
+        if room_id is not None:
+            await self._call(room_id, "rps_choice", player_id=player_id, choice=choice)
+
+    async def auto_match(self, player_id: str, telegram_id: str, username: str, game_type: GameType, bet_amount: int) -> Tuple[RuntimeRoom, bool]:
+        current_room_id = self.player_to_room.get(player_id)
+        if current_room_id is not None:
+            room = await self.get_room(current_room_id)
+            if room is not None:
+                return room, False
+
+        # Открытые комнаты ищутся во всех шардах; гонку за последнее место решает актор комнаты
+        for room_id in await self._call_all("first_open", game_type=GameType(game_type).value, bet_amount=bet_amount):
+            if room_id is not None:
+                room = await self.join_room(player_id, telegram_id, username, room_id)
+                if room is not None:
+                    return room, False
+
+        room = await self.create_room(player_id, telegram_id, username, game_type, bet_amount)
+        return room, True
+
+    async def get_room(self, room_id: str) -> Optional[RuntimeRoom]:
+        data = await self._call(room_id, "get_room", room_id=room_id)
+        return RuntimeRoom.from_dict(data) if data is not None else None
+
+    async def room_info(self, room_id: str, since_version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        return await self._call(room_id, "room_info", room_id=room_id, since_version=since_version)
+
+    async def available_rooms(self, game_type: GameType, max_bet: int = None) -> List[RuntimeRoom]:
+        per_shard = await self._call_all("available_rooms", game_type=GameType(game_type).value, max_bet=max_bet)
+        rooms = [RuntimeRoom.from_dict(data) for shard_rooms in per_shard for data in shard_rooms]
+        rooms.sort(key=lambda room: (room.bet_amount, room.created_at))
+        return rooms
+
+    async def stats(self) -> Dict[str, Any]:
+        per_shard = await self._call_all("stats")
+        players: Dict[str, int] = {}
+        for shard_stats in per_shard:
+            for status, count in shard_stats["players"].items():
+                players[status] = players.get(status, 0) + count
+        return {
+            "rooms_count": sum(s["rooms_count"] for s in per_shard),
+            "pending_timers": sum(s["pending_timers"] for s in per_shard),
+            "active_connections": len(self.player_connections),
+            "connections": self.heartbeat.stats(),
+            "players": players,
+            "shards": per_shard
+        }
+
+    async def debug_snapshot(self) -> Dict[str, Any]:
+        return {"shards": await self._call_all("debug")}
+
+    # WebSocket
+
+    async def connect_player(self, player_id: str, websocket: WebSocket, protocol: str = "json",
+                             resume_from: Optional[int] = None) -> ClientConnection:
+        """Регистрирует WebSocket игрока и подключает его к шарду его комнаты (шард всегда шлёт JSON)."""
+        self.heartbeat.start()
+        connection = ClientConnection(
+            player_id,
+            websocket,
+            max_queue=settings.WS_SEND_QUEUE_SIZE,
+            policy=OverflowPolicy(settings.WS_OVERFLOW_POLICY),
+            send_timeout=settings.WS_SEND_TIMEOUT,
+            on_close=self._on_connection_lost,
+            protocol=protocol
+        )
+        previous = self.player_connections.get(player_id)
+        conn_id = next(self._conn_seq)
+        self.player_connections[player_id] = connection
+        self._conn_ids[player_id] = conn_id
+        connection.start()
+        if previous is not None:
+            await previous.close()
+
+        room_id = self.player_to_room.get(player_id)
+        if room_id is not None:
+            await self._call(room_id, "connect", player_id=player_id, conn_id=conn_id, resume_from=resume_from)
+        return connection
+
+    async def resume_player(self, player_id: str, resume_from: int):
+        room_id = self.player_to_room.get(player_id)
+        if room_id is not None:
+            await self._call(room_id, "resume", player_id=player_id, resume_from=resume_from)
+
+    async def resync_player(self, player_id: str, since_version: Optional[int] = None):
+        room_id = self.player_to_room.get(player_id)
+        if room_id is not None:
+            await self._call(room_id, "resync", player_id=player_id, since_version=since_version)
+
+    async def disconnect_player(self, player_id: str, connection: Optional[ClientConnection] = None):
+        current = self.player_connections.get(player_id)
+        if connection is not None and current is not connection:
+            return
+        conn_id = self._conn_ids.pop(player_id, None)
+        if current is not None:
+            del self.player_connections[player_id]
+            await current.close()
+
+        room_id = self.player_to_room.get(player_id)
+        if room_id is not None and conn_id is not None:
+            await self._call(room_id, "disconnect", player_id=player_id, conn_id=conn_id)
+
+    async def _on_connection_lost(self, connection: ClientConnection):
+        await self.disconnect_player(connection.player_id, connection)
+
+    def _on_push(self, message: Dict[str, Any]):
+        """Фрейм или закрытие от шарда для текущего подключения игрока либо уведомление об удалённой комнате."""
+        if "room_closed" in message:
+            self._forget_room(message["room_closed"], message["players"])
+            return
+        player_id = message.get("push") or message.get("close")
+        connection = self.player_connections.get(player_id)
+        if connection is None or self._conn_ids.get(player_id) != message["conn"]:
+            return
+        if "frame" in message:
+            frame = message["frame"]
+            connection.enqueue(self.broadcaster.transcode(frame) if connection.binary else frame)
+        else:
+            # Шард отключил игрока (например, переполнение его очереди)
+            self.player_connections.pop(player_id, None)
+            self._conn_ids.pop(player_id, None)
+            asyncio.ensure_future(connection.close(message["code"]))
+
+    def _forget_room(self, room_id: str, player_ids: List[str]):
+        """Снимает привязки игроков к удалённой шардом комнате (если игрок не перешёл в другую)."""
+        for player_id in player_ids:
+            if self.player_to_room.get(player_id) == room_id:
+                del self.player_to_room[player_id]
+
+    async def _send_private_message(self, player_id: str, message: Dict):
+        connection = self.player_connections.get(player_id)
+        if connection is not None:
+            connection.enqueue(self.broadcaster.encode_for(connection, message))
+
+    async def _send_to_player(self, player_id: str, message_type: str, data: Dict):
+        await self._send_private_message(player_id, {"type": message_type, "data": data})
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import os
+import signal
+from typing import Any, Dict, List, Optional, Set
+
+from server.models import GameType
+from server.runtime_models import RuntimeRoom
+from server.game_history import create_history_writer
+from server.ledger import create_ledger
+from server.room_manager import RoomManager
+from server.room_store import create_room_store
+from server.sharding.protocol import Channel, read_frame
+
+logger = logging.getLogger(__name__)
+
+
+class ShardSocket:
+    """
+    Заменяет WebSocket внутри процесса-шарда.
+    Настоящий сокет игрока живёт в процессе-маршрутизаторе; фреймы пересылаются
+    ему через IPC вместе с номером подключения, чтобы устаревшие подключения
+    не влияли на новое.
+    """
+
+    def __init__(self, channel: Channel, player_id: str, conn_id: int):
+        self.channel = channel
+        self.player_id = player_id
+        self.conn_id = conn_id
+
+    async def send_text(self, data: str):
+        await self.channel.send({"push": self.player_id, "conn": self.conn_id, "frame": data})
+
+    async def close(self, code: int = 1000):
+        await self.channel.send({"close": self.player_id, "conn": self.conn_id, "code": code})
+
+
+def _room(room: Optional[RuntimeRoom]) -> Optional[Dict[str, Any]]:
+    return room.to_dict() if room is not None else None
+
+
+class ShardServer:
+    """
+    Процесс-шард: собственный RoomManager и Unix-сокет для запросов маршрутизатора.
+    Запрос — {"id", "op", "args"}, ответ — {"id", "result"} или {"id", "error", "kind"}.
+    Запросы выполняются конкурентно; порядок команд одной комнаты обеспечивает её актор.
+    """
+
+    def __init__(self, index: int, socket_path: str):
+        self.index = index
+        self.socket_path = socket_path
+        self.manager = RoomManager(
+            store=create_room_store(), heartbeat=False, history=create_history_writer(), ledger=create_ledger(),
+            on_room_closed=self._room_closed
+        )
+        # Подключённые маршрутизаторы: им рассылаются уведомления об удалённых комнатах
+        self.channels: Set[Channel] = set()
+
+    async def serve(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self._handle_client, path=self.socket_path)
+        logger.info(f"Room shard {self.index} listening on {self.socket_path}")
+        # ShardPool.stop() шлёт SIGTERM: перед выходом дописываем историю игр
+        stopping = asyncio.Event()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopping.set)
+        async with server:
+            await stopping.wait()
+        await self.manager.close()
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        channel = Channel(writer)
+        self.channels.add(channel)
+        tasks = set()
+        try:
+            while True:
+                message = await read_frame(reader)
+                if message is None:
+                    break
+                task = asyncio.ensure_future(self._handle_request(channel, message))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            self.channels.discard(channel)
+            channel.close()
+
+    async def _room_closed(self, room_id: str, players: List[str]):
+        """Сообщает маршрутизаторам, что игроки удалённой комнаты больше в ней не состоят."""
+        for channel in list(self.channels):
+            try:
+                await channel.send({"room_closed": room_id, "players": players})
+            except ConnectionError:
+                pass  # Маршрутизатор отключился
+
+    async def _handle_request(self, channel: Channel, message: Dict[str, Any]):
+        handler = getattr(self, f"_op_{message['op']}", None)
+        try:
+            if handler is None:
+                raise ValueError(f"Unknown shard operation: {message['op']}")
+            response = {"id": message["id"], "result": await handler(channel, **message.get("args", {}))}
+        except Exception as e:
+            response = {"id": message["id"], "error": str(e), "kind": type(e).__name__}
+        try:
+            await channel.send(response)
+        except ConnectionError:
+            pass  # Маршрутизатор отключился
+
+    # Операции шарда
+
+    async def _op_create_room(self, channel, room_id, creator_id, telegram_id, username, game_type, bet_amount):
+        return _room(await self.manager.create_room(
+            creator_id, telegram_id, username, GameType(game_type), bet_amount, room_id=room_id
+        ))
+
+    async def _op_join_room(self, channel, player_id, telegram_id, username, room_id):
+        return _room(await self.manager.join_room(player_id, telegram_id, username, room_id))
+
+    async def _op_ready_player(self, channel, player_id):
+        return _room(await self.manager.ready_player(player_id))
+
+    async def _op_dice_action(self, channel, player_id, room_id, action):
+        await self.manager.handle_dice_action(player_id, room_id, action)
+
+    async def _op_rps_choice(self, channel, player_id, choice):
+        await self.manager.handle_rps_choice(player_id, choice)
+
+    async def _op_get_room(self, channel, room_id):
+        return _room(await self.manager.get_room(room_id))
+
+    async def _op_room_info(self, channel, room_id, since_version=None):
+        return await self.manager.room_info(room_id, since_version)
+
+    async def _op_first_open(self, channel, game_type, bet_amount):
+        return self.manager.matchmaker.first(GameType(game_type), bet_amount)
+
+    async def _op_available_rooms(self, channel, game_type, max_bet=None):
+        return [room.to_dict() for room in await self.manager.available_rooms(GameType(game_type), max_bet)]
+
+    async def _op_connect(self, channel, player_id, conn_id, resume_from=None):
+        await self.manager.connect_player(player_id, ShardSocket(channel, player_id, conn_id), resume_from=resume_from)
+
+    async def _op_disconnect(self, channel, player_id, conn_id):
+        connection = self.manager.player_connections.get(player_id)
+        if connection is not None and getattr(connection.websocket, "conn_id", None) == conn_id:
+            await self.manager.disconnect_player(player_id, connection)
+
+    async def _op_resync(self, channel, player_id, since_version=None):
+        await self.manager.resync_player(player_id, since_version)
+
+    async def _op_resume(self, channel, player_id, resume_from):
+        await self.manager.resume_player(player_id, resume_from)
+
+    async def _op_stats(self, channel):
+        return {"shard": self.index, **await self.manager.stats()}
+
+    async def _op_debug(self, channel):
+        return {"shard": self.index, **await self.manager.debug_snapshot()}
+
+
+def run_shard(index: int, socket_path: str, log_level: int = logging.INFO):
+    """Точка входа процесса-шарда."""
+    logging.basicConfig(level=log_level)
+    try:
+        asyncio.run(ShardServer(index, socket_path).serve())
+    except KeyboardInterrupt:
+        pass
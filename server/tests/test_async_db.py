@@ -0,0 +1,51 @@
+import asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from server import game_api
+from server.api import nft
+from server.database_sqlite import Base, NFTItem, User, UserNFT, async_database_url
+
+def test_async_database_url():
+    assert async_database_url("sqlite:///./test.db") == "sqlite+aiosqlite:///./test.db"
+    assert async_database_url("postgresql://u:p@db/app") == "postgresql+asyncpg://u:p@db/app"
+    assert async_database_url("postgres://u:p@db/app") == "postgresql+asyncpg://u:p@db/app"
+    assert async_database_url("postgresql+psycopg://u:p@db/app") == "postgresql+psycopg://u:p@db/app"
+
+async def make_session():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    return async_sessionmaker(engine, expire_on_commit=False)
+
+def test_game_api_handlers_on_async_session():
+    async def scenario():
+        sessions = await make_session()
+        async with sessions() as db:
+            db.add_all([User(id="u1", telegram_id="tg1", username="Alice", stars_balance=100),
+                        User(id="u2", telegram_id="tg2", username="Bob", stars_balance=100)])
+            await db.commit()
+            created = await game_api.create_game_room("dice", 10, 2, "tg1", db=db)
+            joined = await game_api.join_game_room(created["room_id"], "tg2", db=db)
+            rooms = await game_api.get_available_rooms(db=db)
+        assert joined["current_players"] == 2
+        assert [(room["id"], room["creator"]) for room in rooms["rooms"]] == [(created["room_id"], "Alice")]
+    asyncio.run(scenario())
+
+def test_equip_nft_unequips_same_type():
+    async def scenario():
+        sessions = await make_session()
+        async with sessions() as db:
+            db.add(User(id="u1", telegram_id="tg1", username="Alice"))
+            db.add_all([NFTItem(id=f"item-{kind}-{i}", name="n", image_url="u", rarity="common", nft_type=kind, stars_value=1)
+                        for kind in ("avatar", "frame") for i in range(2)])
+            db.add_all([UserNFT(id=f"own-{kind}-{i}", user_id="u1", nft_item_id=f"item-{kind}-{i}",
+                                acquired_from="gift", is_equipped=True)
+                        for kind in ("avatar", "frame") for i in range(2)])
+            await db.commit()
+            await nft.equip_nft("tg1", "own-avatar-1", db=db)
+        async with sessions() as db:
+            return dict((await db.execute(select(UserNFT.id, UserNFT.is_equipped))).all())
+    assert asyncio.run(scenario()) == {
+        "own-avatar-0": False, "own-avatar-1": True, "own-frame-0": True, "own-frame-1": True
+    }
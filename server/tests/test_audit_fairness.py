@@ -0,0 +1,27 @@
+import pytest
+from server.benchmarks.audit_fairness import (
+    analyse_dice, analyse_rps, chi2_sf, chi_square, failures, rps_outcome_probabilities, simulate
+)
+
+@pytest.mark.parametrize("statistic, dof, p_value", [
+    (3.841458820694124, 1, 0.05),
+    (18.307038053275146, 10, 0.05),
+    (0.5, 4, 0.9735009788),
+    (40.0, 3, 1.0655090334e-08),
+])
+def test_chi2_sf_matches_tables(statistic, dof, p_value):
+    assert chi2_sf(statistic, dof) == pytest.approx(p_value, rel=1e-4)
+
+def test_chi_square_flags_biased_counts():
+    fair = {face: 1 / 6 for face in range(1, 7)}
+    assert chi_square({face: 1000 for face in range(1, 7)}, fair)["p_value"] == pytest.approx(1.0)
+    assert chi_square({1: 1300, 2: 1000, 3: 1000, 4: 1000, 5: 1000, 6: 700}, fair)["p_value"] < 1e-6
+    assert sum(rps_outcome_probabilities(4).values()) == pytest.approx(1.0)
+
+def test_small_simulation_keeps_invariants():
+    dice = analyse_dice(3, simulate("dice", 3, 300, workers=1))
+    rps = analyse_rps(4, simulate("rps", 4, 300, workers=1, seed=7))
+    assert dice["games"] == sum(int(v) for v in dice["reroll_depth"].values()) == 300
+    assert dice["rounds"] >= 300 and dice["violations"] == 0
+    assert sum(rps["outcomes"].values()) == 300 and rps["violations"] == 0
+    assert not failures({"dice": dice, "rps": rps}, alpha=0.0)
@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from server import game_api
+from server.balances import complete_pending, credit, debit, transactions
+from server.database_sqlite import Base, GameParticipation, GameRoom, Transaction, User
+from server.db_engine import create_async_db_engine, create_db_engine
+from server.ledger import BalanceLedger, LedgerStore
+
+
+async def make_database(path, balances):
+    engine = create_async_db_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        await connection.execute(insert(User), [
+            {"id": user_id, "telegram_id": f"tg-{user_id}", "username": user_id, "stars_balance": balance}
+            for user_id, balance in balances.items()
+        ])
+    return engine, async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+def test_parallel_withdrawals_never_overdraw(tmp_path):
+    async def scenario():
+        engine, sessions = await make_database(tmp_path / "balances.db", {"u1": 1000})
+
+        async def withdraw():
+            # Как withdraw_ton: отдельная сессия и commit на запрос
+            async with sessions() as db:
+                balance = await debit(db, "u1", 7, type="withdraw_ton", status="pending")
+                await db.commit()
+                return balance
+
+        results = await asyncio.gather(*(withdraw() for _ in range(300)))
+        async with sessions() as db:
+            balance = await db.scalar(select(User.stars_balance).where(User.id == "u1"))
+            rows, total = (await db.execute(select(func.count(), func.sum(Transaction.amount)))).one()
+        await engine.dispose()
+        return results, balance, rows, total
+
+    results, balance, rows, total = asyncio.run(scenario())
+    succeeded = [r for r in results if r is not None]
+    assert len(succeeded) == 1000 // 7
+    assert min(succeeded) == balance == 1000 % 7
+    assert (rows, total) == (len(succeeded), -7 * len(succeeded))
+
+
+def test_ledger_holds_and_withdrawals_never_overdraw(tmp_path):
+    async def scenario():
+        path = tmp_path / "ledger.db"
+        engine, sessions = await make_database(path, {"u1": 1000})
+        sync_engine = create_db_engine(f"sqlite:///{path}")
+        ledger = BalanceLedger(LedgerStore(sessionmaker(sync_engine)), flush_interval=0.01)
+        await ledger.open_account("tg-u1")
+
+        async def withdraw():
+            async with sessions() as db:
+                balance = await debit(db, "u1", 7, type="withdraw_ton", status="pending")
+                await db.commit()
+                return balance is not None
+
+        # Ставки ledger (синхронная сессия в потоке) вперемешку с REST-выводами
+        results = await asyncio.gather(*(
+            ledger.hold(f"room-{i}", "tg-u1", 7) if i % 2 else withdraw() for i in range(300)
+        ))
+        held = [f"room-{i}" for i, ok in enumerate(results) if ok and i % 2]
+        for room_id in held[:10]:
+            ledger.settle(room_id, {"tg-u1": 14})
+        for room_id in held[10:]:
+            ledger.release(room_id)
+        await ledger.close()
+        async with sessions() as db:
+            balance = await db.scalar(select(User.stars_balance).where(User.id == "u1"))
+            total = await db.scalar(select(func.sum(Transaction.amount)))
+        await engine.dispose()
+        sync_engine.dispose()
+        return results, held, balance, total
+
+    results, held, balance, total = asyncio.run(scenario())
+    assert results.count(True) == 1000 // 7
+    assert len(held) >= 10
+    spent = 7 * (results.count(True) - len(held) + 10)
+    assert balance == 1000 - spent + 10 * 14
+    assert total == balance - 1000
+
+
+def test_pending_payment_is_credited_once(tmp_path):
+    async def scenario():
+        engine, sessions = await make_database(tmp_path / "payments.db", {"u1": 0})
+        async with sessions() as db:
+            await db.execute(insert(Transaction).values(id="t1", user_id="u1", type="deposit", amount=50, status="pending"))
+            await db.commit()
+
+        async def webhook():
+            async with sessions() as db:
+                completed = await complete_pending(db, transactions.c.id == "t1", telegram_payment_id="p1")
+                if completed:
+                    await credit(db, completed.user_id, completed.amount)
+                await db.commit()
+                return completed is not None
+
+        delivered = await asyncio.gather(*(webhook() for _ in range(20)))
+        async with sessions() as db:
+            balance = await db.scalar(select(User.stars_balance).where(User.id == "u1"))
+        await engine.dispose()
+        return delivered, balance
+
+    delivered, balance = asyncio.run(scenario())
+    assert delivered.count(True) == 1
+    assert balance == 50
+
+
+def test_start_game_debits_all_or_nobody(tmp_path):
+    async def scenario():
+        engine, sessions = await make_database(tmp_path / "games.db", {"rich": 100, "poor": 5})
+        async with sessions() as db:
+            db.add(GameRoom(id="r1", game_type="dice", status="waiting", bet_amount=10, creator_id="rich", prize_pool=20))
+            db.add_all([GameParticipation(room_id="r1", user_id=u) for u in ("rich", "poor")])
+            await db.commit()
+        async with sessions() as db:
+            with pytest.raises(HTTPException) as error:
+                await game_api.start_game("r1", "tg-rich", db=db)
+        async with sessions() as db:
+            balances = dict((await db.execute(select(User.id, User.stars_balance))).all())
+            rows = await db.scalar(select(func.count()).select_from(Transaction))
+            status = await db.scalar(select(GameRoom.status))
+        await engine.dispose()
+        return error.value, balances, rows, status
+
+    error, balances, rows, status = asyncio.run(scenario())
+    assert error.status_code == 400 and "poor" in error.detail
+    assert balances == {"rich": 100, "poor": 5}
+    assert (rows, status) == (0, "waiting")
@@ -0,0 +1,36 @@
+import json
+from datetime import datetime
+import pytest
+from server.codec import CODECS, CodecResponse, JsonCodec
+from server.models import GameType, RoomStatus
+
+PAYLOAD = {
+    "type": "room_snapshot",
+    "room": {"game_type": GameType.DICE, "status": RoomStatus.WAITING, "created_at": datetime(2026, 1, 2, 3, 4, 5, 6)},
+    "text": "Привет",
+    "nested": [1, 2.5, None, True],
+}
+
+def available_codecs():
+    codecs = []
+    for factory in CODECS.values():
+        try:
+            codecs.append(factory())
+        except ImportError:
+            pass
+    return codecs
+
+@pytest.mark.parametrize("codec", available_codecs(), ids=lambda codec: codec.name)
+def test_backends_agree_with_stdlib(codec):
+    expected = json.loads(JsonCodec().dumps(PAYLOAD))
+    assert expected["room"] == {"game_type": "dice", "status": "waiting", "created_at": "2026-01-02T03:04:05.000006"}
+    assert codec.loads(codec.dumps(PAYLOAD)) == expected
+    assert codec.loads(codec.dumps_bytes(PAYLOAD)) == expected
+    assert "Привет" in codec.dumps(PAYLOAD)
+    with pytest.raises(ValueError):
+        codec.loads("{not json")
+
+def test_response_class_renders_with_codec():
+    response = CodecResponse({"status": RoomStatus.PLAYING})
+    assert json.loads(response.body) == {"status": "playing"}
+    assert response.media_type == "application/json"
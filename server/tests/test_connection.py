@@ -0,0 +1,58 @@
+import asyncio
+from server.realtime.connection import ClientConnection, OverflowPolicy
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.closed_with = None
+
+    async def send_text(self, data):
+        self.sent.append(data)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+def test_drop_oldest_keeps_newest_frames():
+    conn = ClientConnection("p1", FakeWebSocket(), max_queue=2, policy=OverflowPolicy.DROP_OLDEST)
+    for frame in ["a", "b", "c"]:
+        assert conn.enqueue(frame)
+    assert [f for f, _ in conn._queue] == ["b", "c"]
+    assert conn.dropped == 1
+
+def test_coalesce_replaces_stale_snapshot():
+    conn = ClientConnection("p1", FakeWebSocket(), max_queue=2, policy=OverflowPolicy.COALESCE)
+    assert conn.enqueue("snap1", "room:r1")
+    assert conn.enqueue("result")
+    assert conn.enqueue("snap2", "room:r1")
+    assert [f for f, _ in conn._queue] == ["result", "snap2"]
+    # Снимка для замены нет — клиент отключается
+    assert not conn.enqueue("other")
+
+def test_disconnect_policy_closes_and_notifies():
+    async def scenario():
+        lost = []
+        async def on_close(connection):
+            lost.append(connection.player_id)
+        ws = FakeWebSocket()
+        conn = ClientConnection("p1", ws, max_queue=1, policy=OverflowPolicy.DISCONNECT, on_close=on_close)
+        assert conn.enqueue("a")
+        assert not conn.enqueue("b")
+        conn.start()
+        await asyncio.sleep(0.01)
+        return conn, ws, lost
+    conn, ws, lost = asyncio.run(scenario())
+    assert conn.closed
+    assert ws.closed_with == 1013
+    assert lost == ["p1"]
+
+def test_writer_sends_in_order():
+    async def scenario():
+        ws = FakeWebSocket()
+        conn = ClientConnection("p1", ws)
+        conn.start()
+        for frame in ["1", "2", "3"]:
+            conn.enqueue(frame)
+        await asyncio.sleep(0.01)
+        await conn.close()
+        return ws
+    assert asyncio.run(scenario()).sent == ["1", "2", "3"]
@@ -0,0 +1,43 @@
+import asyncio
+
+from sqlalchemy import text
+
+from server.db_engine import async_database_url, create_async_db_engine, create_db_engine, engine_options
+
+
+def test_sqlite_file_engine_sets_pragmas(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert connection.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+        assert connection.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+        assert connection.exec_driver_sql("PRAGMA mmap_size").scalar() == 256 * 1024 * 1024
+    assert engine.echo is False
+    engine.dispose()
+
+
+def test_async_sqlite_engine_sets_pragmas(tmp_path):
+    async def scenario():
+        engine = create_async_db_engine(async_database_url(f"sqlite:///{tmp_path / 'app.db'}"))
+        async with engine.connect() as connection:
+            journal = (await connection.execute(text("PRAGMA journal_mode"))).scalar()
+        await engine.dispose()
+        return journal
+    assert asyncio.run(scenario()) == "wal"
+
+
+def test_engine_options_per_backend():
+    memory = engine_options("sqlite://")
+    assert memory == {"echo": False}
+    sqlite_file = engine_options("sqlite:///./app.db")
+    assert sqlite_file["pool_size"] == 10 and "pool_recycle" not in sqlite_file
+    postgres = engine_options("postgresql+asyncpg://user@db/app")
+    assert postgres["pool_pre_ping"] is True
+    assert (postgres["pool_size"], postgres["max_overflow"], postgres["pool_recycle"]) == (10, 20, 1800)
+
+
+def test_memory_engine_skips_wal():
+    engine = create_db_engine("sqlite://")
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "memory"
+    engine.dispose()
@@ -0,0 +1,72 @@
+import asyncio
+import json
+from server.models import GameType
+from server.realtime.delta import diff, apply_patch
+from server.room_manager import RoomManager
+
+class FakeWebSocket:
+    def __init__(self):
+        self.messages = []
+
+    async def send_text(self, data):
+        self.messages.append(json.loads(data))
+
+    async def close(self, code=1000):
+        pass
+
+def test_diff_roundtrip():
+    old = {"a": 1, "players": [{"id": "1", "status": "waiting"}], "gone": True}
+    new = {"a": 2, "players": [{"id": "1", "status": "ready"}, {"id": "2", "status": "waiting"}], "x/y": None}
+    assert apply_patch(old, diff(old, new)) == new
+    assert apply_patch(new, diff(new, old)) == old
+    assert diff(new, new) == []
+
+def test_ready_sends_small_patch_and_versions_chain():
+    async def scenario():
+        manager = RoomManager()
+        room = await manager.create_room("1", "tg1", "Alice", GameType.DICE, 100)
+        ws = FakeWebSocket()
+        await manager.connect_player("1", ws)
+        await manager.join_room("2", "tg2", "Bob", room.id)
+        await manager.ready_player("1")
+        await asyncio.sleep(0.01)
+        return manager, room, ws
+    manager, room, ws = asyncio.run(scenario())
+
+    snapshot, joined, ready = ws.messages
+    assert snapshot["type"] == "room_snapshot"
+    state, version = snapshot["room"], snapshot["version"]
+    for message in (joined, ready):
+        assert message["base_version"] == version
+        state = apply_patch(state, message["patch"])
+        version = message["version"]
+
+    assert version == room.version
+    assert state == json.loads(manager.broadcaster.encode(manager.room_states.snapshot(room)))
+    # Изменение готовности — несколько полей, а не вся комната
+    assert {op["path"] for op in ready["patch"]} == {"/players/0/status", "/players/0/balance", "/pot"}
+
+def test_last_patch_marks_room_finished():
+    async def scenario():
+        manager = RoomManager()
+        room = await manager.create_room("1", "tg1", "Alice", GameType.RPS, 100)
+        ws = FakeWebSocket()
+        await manager.connect_player("1", ws)
+        await manager.join_room("2", "tg2", "Bob", room.id)
+        await manager.ready_player("1")
+        await manager.ready_player("2")
+        await manager.handle_rps_choice("1", "rock")
+        await manager.handle_rps_choice("2", "scissors")
+        await asyncio.sleep(0.01)
+        manager.timers.cancel_key(room.id)
+        return ws
+    ws = asyncio.run(scenario())
+
+    state = ws.messages[0]["room"]
+    for message in ws.messages[1:]:
+        state = apply_patch(state, message["patch"])
+    last = ws.messages[-1]
+    # Клиент, применяющий только патчи, видит завершение игры в последнем событии
+    assert last["type"] == "game_finished"
+    assert {"op": "replace", "path": "/status", "value": "finished"} in last["patch"]
+    assert state["status"] == "finished" and state["finished_at"] is not None
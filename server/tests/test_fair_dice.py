@@ -0,0 +1,42 @@
+import hashlib
+from collections import Counter
+from server.games import fair_dice
+from server.games.dice_game import DiceGame
+from server.models import Player
+
+PLAYERS = ["1", "player-2", "игрок-3", "4"]
+
+def test_batched_rolls_match_reference():
+    seed, nonce = "1700000000000000-abcd1234-ef567890", "0123456789abcdef"
+    assert fair_dice.roll_round(seed, nonce, PLAYERS, 3) == {
+        player_id: fair_dice.roll_dice(seed, nonce, player_id, 3) for player_id in PLAYERS
+    }
+    rounds = fair_dice.roll_rounds(seed, nonce, PLAYERS, rounds=200, first_round=5)
+    for offset, dice in enumerate(rounds):
+        assert dice == [fair_dice.roll_dice(seed, nonce, player_id, 5 + offset) for player_id in PLAYERS]
+
+def test_rejected_bytes_are_skipped():
+    # Каждая грань получает ровно 42 байта из 252 принимаемых
+    assert Counter(fair_dice._FACES) == {0: 4, **{face: 42 for face in range(1, 7)}}
+    # Находим сообщение, у которого первый байт дайджеста отбрасывается
+    seed = next(
+        f"seed{i}" for i in range(10000)
+        if hashlib.sha256(f"seed{i}-n-p-round1".encode()).digest()[0] >= fair_dice.ACCEPT_BELOW
+    )
+    digest = hashlib.sha256(f"{seed}-n-p-round1".encode()).digest()
+    accepted = [b % 6 + 1 for b in digest if b < fair_dice.ACCEPT_BELOW]
+    assert fair_dice.roll_dice(seed, "n", "p") == tuple(accepted[:2])
+    assert fair_dice.roll_round(seed, "n", ["p"]) == {"p": tuple(accepted[:2])}
+    assert fair_dice.verify_roll(seed, "n", "p", 1, *accepted[:2])
+
+def test_dice_game_uses_batched_round():
+    players = [Player(id=player_id, telegram_id=player_id, username=player_id, balance=1000) for player_id in PLAYERS]
+    game = DiceGame("room", players, bet_amount=10)
+    for player_id in PLAYERS:
+        result = game.player_roll_action(player_id)["result"]
+        assert (result["dice1"], result["dice2"]) == game._generate_dice_for_player(player_id, game.round_number)
+        assert game.verify_result(player_id, result["dice1"], result["dice2"])
+    first_round = game.roll_round()
+    game.prepare_reroll()
+    assert game.roll_round() == fair_dice.roll_round(game.game_seed, game.nonce, PLAYERS, 2)
+    assert game.roll_round() is not first_round
@@ -0,0 +1,154 @@
+import asyncio
+import json
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from server.database_sqlite import Base, GameParticipation, GameRoom, User
+from server.batch_writer import BatchSink, BatchWriter
+from server.game_history import DatabaseHistorySink, FileHistorySink
+from server.models import GameType
+from server.room_manager import RoomManager
+
+class ListSink(BatchSink):
+    def __init__(self, fail_times=0):
+        self.batches = []
+        self.fail_times = fail_times
+
+    def write(self, records):
+        if self.fail_times:
+            self.fail_times -= 1
+            raise RuntimeError("database is locked")
+        self.batches.append(list(records))
+
+def record(room_id, players=(("p1", "tg1"), ("p2", "tg2")), winners=("p1",), history_id=None):
+    return {
+        "history_id": history_id or f"h-{room_id}", "room_id": room_id, "game_type": "dice", "status": "finished", "bet_amount": 10, "pot": 20,
+        "created_at": "2024-01-01T12:00:00", "finished_at": "2024-01-01T12:01:00", "winners": list(winners),
+        "players": [{"id": pid, "telegram_id": tg, "username": pid, "is_creator": i == 0,
+                     "prize": 20 if pid in winners else 0, "refund": 0, "score": 7, "data": {}}
+                    for i, (pid, tg) in enumerate(players)],
+    }
+
+def test_writer_batches_by_size_and_time():
+    async def scenario():
+        sink = ListSink()
+        writer = BatchWriter(sink, batch_size=200, flush_interval=0.05)
+        for i in range(450):
+            writer.submit(record(f"r{i}"))
+        await asyncio.sleep(0.01)
+        assert [len(batch) for batch in sink.batches] == [200, 200]  # Полные пачки — сразу
+        await asyncio.sleep(0.1)
+        assert [len(batch) for batch in sink.batches] == [200, 200, 50]  # Остаток — по времени
+        await writer.close()
+        return writer
+    writer = asyncio.run(scenario())
+    assert writer.stats() == {"pending": 0, "written": 450, "batches": 3, "failures": 0, "dropped": 0}
+
+def test_failed_batch_is_retried_in_order():
+    async def scenario():
+        sink = ListSink(fail_times=2)
+        writer = BatchWriter(sink, batch_size=10, flush_interval=0.01)
+        for i in range(3):
+            writer.submit(record(f"r{i}"))
+        await asyncio.sleep(0.1)
+        await writer.close()
+        return sink, writer
+    sink, writer = asyncio.run(scenario())
+    assert [[r["room_id"] for r in batch] for batch in sink.batches] == [["r0", "r1", "r2"]]
+    assert writer.failures == 2 and writer.dropped == 0
+
+def test_database_sink_bulk_insert_is_idempotent():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    with session_factory() as db:
+        db.add(User(id="u1", telegram_id="tg1", username="Alice"))
+        db.commit()
+
+    sink = DatabaseHistorySink(session_factory)
+    batch = [record("a"), record("b", winners=())]
+    sink.write(batch)
+    sink.write(batch)  # Повтор пачки после сбоя не создаёт дублей
+
+    with session_factory() as db:
+        rooms = {room.id: room for room in db.scalars(select(GameRoom))}
+        assert set(rooms) == {"h-a", "h-b"}
+        assert rooms["h-a"].creator_id == "u1" and rooms["h-a"].game_data["players"][1]["id"] == "p2"
+        participations = db.scalars(select(GameParticipation).order_by(GameParticipation.room_id)).all()
+        # Участие пишется только для зарегистрированного пользователя tg1
+        assert [(p.room_id, p.user_id, p.position, p.prize_won) for p in participations] == [
+            ("h-a", "u1", 1, 20), ("h-b", "u1", None, 0)
+        ]
+
+def test_database_sink_keeps_rooms_with_same_short_id():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    with session_factory() as db:
+        db.add(User(id="u1", telegram_id="tg1", username="Alice"))
+        # Комната REST API с тем же коротким ID
+        db.add(GameRoom(id="a1b2c3d4", game_type="dice", status="waiting", bet_amount=10, creator_id="u1"))
+        db.commit()
+
+    sink = DatabaseHistorySink(session_factory)
+    first = record("a1b2c3d4", history_id="11111111-0000-4000-8000-000000000001")
+    sink.write([first])
+    # Позже другая комната получила тот же короткий ID; первая пачка повторяется после сбоя
+    sink.write([first, record("a1b2c3d4", winners=(), history_id="22222222-0000-4000-8000-000000000002")])
+
+    with session_factory() as db:
+        rooms = dict(db.execute(select(GameRoom.id, GameRoom.status)).all())
+        participations = db.scalar(select(func.count()).select_from(GameParticipation))
+    assert rooms == {"a1b2c3d4": "waiting", "11111111-0000-4000-8000-000000000001": "finished",
+                     "22222222-0000-4000-8000-000000000002": "finished"}
+    assert participations == 2
+
+def test_database_sink_keeps_batch_with_unregistered_creator():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    # Внешние ключи проверяются, как в PostgreSQL
+    event.listen(engine, "connect", lambda connection, _: connection.execute("PRAGMA foreign_keys=ON"))
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    with session_factory() as db:
+        db.add(User(id="u1", telegram_id="tg1", username="Alice"))
+        db.commit()
+
+    sink = DatabaseHistorySink(session_factory)
+    # Создатель комнаты "guest" не зарегистрирован, остальные комнаты — обычные
+    sink.write([record("a"), record("guest", players=(("p9", "tg9"), ("p1", "tg1"))), record("b")])
+
+    with session_factory() as db:
+        rooms = {room.id: room.creator_id for room in db.scalars(select(GameRoom))}
+        assert rooms == {"h-a": "u1", "h-guest": None, "h-b": "u1"}
+        assert db.scalar(select(GameParticipation.user_id).where(GameParticipation.room_id == "h-guest")) == "u1"
+
+def test_file_sink_appends_segments(tmp_path):
+    sink = FileHistorySink(str(tmp_path), segment_bytes=1)
+    sink.write([record("a"), record("b")])
+    sink.write([record("c")])
+    sink.close()
+    segments = sorted(tmp_path.iterdir())
+    assert len(segments) == 2
+    lines = [json.loads(line) for segment in segments for line in segment.read_text().splitlines()]
+    assert [line["room_id"] for line in lines] == ["a", "b", "c"]
+
+def test_room_manager_records_finished_games():
+    async def scenario():
+        sink = ListSink()
+        manager = RoomManager(heartbeat=False, history=BatchWriter(sink, flush_interval=0.01))
+        room = await manager.create_room("1", "tg1", "Alice", GameType.RPS, 10)
+        await manager.join_room("2", "tg2", "Bob", room.id)
+        await manager.ready_player("1")
+        await manager.ready_player("2")
+        await manager.handle_rps_choice("1", "rock")
+        await manager.handle_rps_choice("2", "scissors")
+        await manager.close()
+        return sink
+    sink = asyncio.run(scenario())
+    [[entry]] = sink.batches
+    assert entry["game_type"] == "rps" and entry["status"] == "finished"
+    assert len(entry["history_id"]) == 36 and entry["history_id"] != entry["room_id"]
+    assert entry["winners"] == ["1"] and entry["result"] == "win"
+    assert {p["id"]: (p["prize"], p["data"]["choice"]) for p in entry["players"]} == {
+        "1": (20, "rock"), "2": (0, "scissors")
+    }
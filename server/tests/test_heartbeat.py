@@ -0,0 +1,38 @@
+import asyncio
+import json
+from server.room_manager import RoomManager
+
+class FakeWebSocket:
+    def __init__(self):
+        self.messages = []
+        self.closed = False
+
+    async def send_text(self, data):
+        self.messages.append(json.loads(data))
+
+    async def close(self, code=1000):
+        self.closed = True
+
+def test_sweep_pings_idle_and_reaps_dead_connections():
+    async def scenario():
+        manager = RoomManager()
+        manager.heartbeat.stop()
+        sockets = {player_id: FakeWebSocket() for player_id in ("active", "idle", "dead")}
+        connections = {player_id: await manager.connect_player(player_id, ws) for player_id, ws in sockets.items()}
+        manager.heartbeat.batch_size = 2
+
+        now = connections["active"].last_seen + 1000
+        connections["active"].last_seen = now - 1
+        connections["idle"].last_seen = now - manager.heartbeat.interval - 1
+        connections["dead"].last_seen = now - manager.heartbeat.timeout - 1
+        await manager.heartbeat.sweep(now)
+        await asyncio.sleep(0.01)
+        return manager, sockets
+
+    manager, sockets = asyncio.run(scenario())
+
+    assert sockets["active"].messages == []
+    assert sockets["idle"].messages == [{"type": "ping"}]
+    assert sockets["dead"].closed
+    assert set(manager.player_connections) == {"active", "idle"}
+    assert manager.heartbeat.stats() == {"live": 1, "idle": 1, "reaped": 1}
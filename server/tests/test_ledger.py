@@ -0,0 +1,158 @@
+import asyncio
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from server.balances import debit
+from server.database_sqlite import Base, Transaction, User
+from server.db_engine import create_async_db_engine, create_db_engine
+from server.ledger import BalanceLedger, LedgerStore
+from server.models import GameType
+from server.room_manager import RoomManager
+
+def make_store(balances):
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    with session_factory() as db:
+        db.add_all(User(id=f"u-{tg}", telegram_id=tg, username=tg, stars_balance=balance) for tg, balance in balances.items())
+        db.commit()
+    return LedgerStore(session_factory), session_factory
+
+def db_balances(session_factory):
+    with session_factory() as db:
+        return dict(db.execute(select(User.telegram_id, User.stars_balance)).all())
+
+def test_holds_settle_and_refund():
+    async def scenario():
+        store, session_factory = make_store({"tg1": 100, "tg2": 15})
+        ledger = BalanceLedger(store, flush_interval=0.01)
+        assert await ledger.open_account("tg1") == 100
+        assert await ledger.open_account("tg2") == 15
+        assert await ledger.open_account("tg3") == 0  # Нет в базе
+
+        assert await ledger.hold("room-a", "tg1", 10) and await ledger.hold("room-a", "tg2", 10)
+        assert db_balances(session_factory) == {"tg1": 90, "tg2": 5}  # Ставки списаны в базе сразу
+        assert not await ledger.hold("room-b", "tg2", 10)  # В базе осталось 5
+        assert not await ledger.hold("room-b", "tg3", 10)
+        ledger.settle("room-a", {"tg1": 20})
+        assert (ledger.available("tg1"), ledger.available("tg2")) == (110, 5)
+
+        assert await ledger.hold("room-c", "tg1", 50)
+        ledger.release("room-c")  # Отмена: ставка возвращается начислением
+        assert ledger.available("tg1") == 110
+        await asyncio.sleep(0.05)
+        assert db_balances(session_factory) == {"tg1": 110, "tg2": 5}
+
+        for tg in ("tg1", "tg2", "tg3"):
+            ledger.leave(tg)
+        assert ledger.accounts == {}
+        await ledger.close()
+        with session_factory() as db:
+            rows = db.execute(select(Transaction.user_id, Transaction.type, Transaction.amount)
+                              .order_by(Transaction.user_id, Transaction.type, Transaction.amount)).all()
+        assert rows == [("u-tg1", "bet", -50), ("u-tg1", "bet", -10), ("u-tg1", "refund", 50), ("u-tg1", "win", 20),
+                        ("u-tg2", "bet", -10)]
+    asyncio.run(scenario())
+
+def test_stake_is_refunded_when_account_closes_during_reserve():
+    async def scenario():
+        store, session_factory = make_store({"tg1": 100})
+        ledger = BalanceLedger(store, flush_interval=0.01)
+        reserve = store.reserve
+
+        def reserve_and_leave(telegram_id, amount, room_id):
+            balance = reserve(telegram_id, amount, room_id)
+            ledger.leave(telegram_id)  # Комната удалена, пока шёл запрос к базе
+            return balance
+
+        store.reserve = reserve_and_leave
+        await ledger.open_account("tg1")
+        held = await ledger.hold("room-a", "tg1", 30)
+        await ledger.close()
+        with session_factory() as db:
+            kinds = db.execute(select(Transaction.type, Transaction.amount).order_by(Transaction.type)).all()
+        return held, ledger.accounts, db_balances(session_factory), kinds
+
+    held, accounts, balances, kinds = asyncio.run(scenario())
+    assert not held and accounts == {}
+    assert balances == {"tg1": 100}
+    assert kinds == [("bet", -30), ("refund", 30)]
+
+def test_rest_debit_cannot_spend_held_stake(tmp_path):
+    async def scenario():
+        path = tmp_path / "ledger.db"
+        engine = create_db_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(engine)
+        session_factory = sessionmaker(bind=engine)
+        with session_factory() as db:
+            db.add(User(id="u-tg1", telegram_id="tg1", username="tg1", stars_balance=100))
+            db.commit()
+        async_engine = create_async_db_engine(f"sqlite+aiosqlite:///{path}")
+        sessions = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+        ledger = BalanceLedger(LedgerStore(session_factory), flush_interval=0.01)
+        await ledger.open_account("tg1")
+        assert await ledger.hold("room-a", "tg1", 60)
+        # Пока комната в игре, игрок выводит звёзды через REST (withdraw_ton)
+        async with sessions() as db:
+            withdrawn = await debit(db, "u-tg1", 50, type="withdraw_ton", status="pending")
+            await db.commit()
+        ledger.settle("room-a", {})  # Ставка проиграна
+        await ledger.close()
+        await async_engine.dispose()
+        engine.dispose()
+        return withdrawn, db_balances(session_factory)
+
+    withdrawn, balances = asyncio.run(scenario())
+    # Резерв уже списан в базе: на вывод 50 из оставшихся 40 средств не хватает
+    assert withdrawn is None
+    assert balances == {"tg1": 40}
+
+def test_player_is_in_one_room_at_a_time():
+    async def scenario():
+        store, session_factory = make_store({"tg1": 100, "tg2": 100})
+        manager = RoomManager(heartbeat=False, ledger=BalanceLedger(store, flush_interval=0.01))
+        first = await manager.create_room("1", "tg1", "Alice", GameType.DICE, 10)
+        second = await manager.create_room("2", "tg2", "Bob", GameType.DICE, 10)
+        joined = await manager.join_room("1", "tg1", "Alice", second.id)
+        try:
+            await manager.create_room("1", "tg1", "Alice", GameType.RPS, 10)
+            created = True
+        except ValueError:
+            created = False
+        accounts = {tg: account.rooms for tg, account in manager.ledger.accounts.items()}
+        await manager.close()
+        return first, second, joined, created, accounts
+    first, second, joined, created, accounts = asyncio.run(scenario())
+    assert joined is None and not created
+    assert [p.id for p in second.players] == ["2"]
+    assert accounts == {"tg1": 1, "tg2": 1}
+
+def test_room_manager_settles_through_ledger():
+    async def scenario():
+        store, session_factory = make_store({"tg1": 100, "tg2": 100, "tg3": 5})
+        manager = RoomManager(heartbeat=False, ledger=BalanceLedger(store, flush_interval=0.01))
+        room = await manager.create_room("1", "tg1", "Alice", GameType.DICE, 10)
+        await manager.join_room("2", "tg2", "Bob", room.id)
+        await manager.join_room("3", "tg3", "Carol", room.id)
+        assert [p.balance for p in room.players] == [100, 100, 5]
+        assert await manager.ready_player("3") is None  # Баланс в базе меньше ставки
+        await manager.ready_player("1")
+        await manager.ready_player("2")
+        game = manager.game_engines[room.id]
+        while not game.game_finished:
+            for player in ("1", "2"):
+                await manager.handle_dice_action(player, room.id, "roll")
+            if not game.game_finished:
+                await manager._tick(room.id, "reroll")
+        await manager._tick(room.id, "cleanup")
+        await manager.close()
+        return game, session_factory
+    game, session_factory = asyncio.run(scenario())
+    [winner] = game.winners
+    assert db_balances(session_factory) == {
+        "tg1": 110 if winner == "1" else 90,
+        "tg2": 110 if winner == "2" else 90,
+        "tg3": 5
+    }
@@ -0,0 +1,45 @@
+import asyncio
+from datetime import datetime
+from server.matchmaker import MatchmakingIndex
+from server.models import GameType
+from server.runtime_models import RuntimeRoom
+from server.room_manager import RoomManager
+
+def make_room(room_id, bet, game_type=GameType.DICE):
+    return RuntimeRoom(id=room_id, game_type=game_type, bet_amount=bet, created_at=datetime.now())
+
+def test_index_filters_by_max_bet_in_bet_order():
+    index = MatchmakingIndex()
+    for room_id, bet in [("a", 100), ("b", 10), ("c", 50), ("d", 10), ("e", 500)]:
+        index.add(make_room(room_id, bet))
+    index.add(make_room("rps", 10, GameType.RPS))
+    assert list(index.rooms(GameType.DICE, 50)) == ["b", "d", "c"]
+    assert list(index.rooms(GameType.DICE)) == ["b", "d", "c", "a", "e"]
+    assert list(index.rooms(GameType.RPS, 5)) == []
+
+def test_index_remove_drops_empty_bucket():
+    index = MatchmakingIndex()
+    index.add(make_room("a", 10))
+    index.add(make_room("b", 20))
+    assert index.remove("a")
+    assert not index.remove("a")
+    assert index.first(GameType.DICE, 10) is None
+    assert list(index.rooms(GameType.DICE, 15)) == []
+    assert list(index.rooms(GameType.DICE)) == ["b"]
+
+def test_auto_match_fills_oldest_room_then_creates():
+    async def scenario():
+        manager = RoomManager()
+        first, created = await manager.auto_match("1", "tg1", "p1", GameType.DICE, 100)
+        assert created
+        for i in range(2, 5):
+            room, created = await manager.auto_match(str(i), f"tg{i}", f"p{i}", GameType.DICE, 100)
+            assert not created and room.id == first.id
+        # Комната заполнена и ушла из матчмейкера
+        assert manager.get_available_rooms(GameType.DICE) == []
+        fifth, created = await manager.auto_match("5", "tg5", "p5", GameType.DICE, 100)
+        assert created and fifth.id != first.id
+        # Повторный вызов возвращает текущую комнату игрока
+        again, created = await manager.auto_match("5", "tg5", "p5", GameType.DICE, 100)
+        assert not created and again.id == fifth.id
+    asyncio.run(scenario())
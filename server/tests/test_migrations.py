@@ -0,0 +1,38 @@
+from datetime import datetime
+
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, inspect, text
+
+from server.benchmarks.bench_indexes import QUERIES, migration_config
+from server.database_sqlite import Base
+
+
+def test_migrations_match_models_and_downgrade(tmp_path):
+    url = f"sqlite:///{tmp_path / 'migrations.db'}"
+    config = migration_config(url)
+    command.upgrade(config, "head")
+    engine = create_engine(url)
+    with engine.connect() as connection:
+        assert compare_metadata(MigrationContext.configure(connection), Base.metadata) == []
+
+    command.downgrade(config, "0001")
+    assert "ix_transactions_user_id_created_at" not in {i["name"] for i in inspect(engine).get_indexes("transactions")}
+    command.downgrade(config, "base")
+    assert inspect(engine).get_table_names() == ["alembic_version"]
+    engine.dispose()
+
+
+def test_hot_queries_use_indexes(tmp_path):
+    url = f"sqlite:///{tmp_path / 'plans.db'}"
+    command.upgrade(migration_config(url), "head")
+    engine = create_engine(url)
+    with engine.connect() as connection:
+        for name, sql, _ in QUERIES:
+            plan = " ".join(row[-1] for row in connection.execute(
+                text(f"EXPLAIN QUERY PLAN {sql}"), {"now": datetime.utcnow(), "key": "x"}
+            ))
+            assert "INDEX" in plan, (name, plan)
+            assert "TEMP B-TREE" not in plan, (name, plan)
+    engine.dispose()
@@ -0,0 +1,63 @@
+import asyncio
+import json
+import msgpack
+import pytest
+from server.models import GameType
+from server.realtime.msgpack_protocol import decode_action, decode_event, encode_event
+from server.room_manager import RoomManager
+
+class FakeWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def send_text(self, data):
+        self.frames.append(data)
+
+    async def send_bytes(self, data):
+        self.frames.append(data)
+
+    async def close(self, code=1000):
+        pass
+
+def test_event_roundtrip_and_compactness():
+    event = {
+        "type": "player_ready", "room_id": "a1b2c3d4", "data": {"player_id": "7", "ready_count": 1},
+        "base_version": 4, "version": 5,
+        "patch": [{"op": "replace", "path": "/players/0/status", "value": "ready"},
+                  {"op": "remove", "path": "/players/3"}],
+    }
+    frame = encode_event(event)
+    assert decode_event(frame) == event
+    assert len(frame) < len(json.dumps(event, separators=(",", ":"))) * 0.7
+
+    custom = {"type": "bonus_round", "round": 2}
+    assert decode_event(encode_event(custom)) == custom
+
+def test_decode_action_rejects_garbage():
+    assert decode_action(msgpack.packb({"action": "ready"})) == {"action": "ready"}
+    with pytest.raises(ValueError):
+        decode_action(msgpack.packb([1, 2, 3]))
+    with pytest.raises(ValueError):
+        decode_action(b"\xc1")
+
+def test_msgpack_and_json_clients_get_same_events():
+    async def scenario():
+        manager = RoomManager()
+        room = await manager.create_room("1", "tg1", "Alice", GameType.DICE, 100)
+        json_ws, binary_ws = FakeWebSocket(), FakeWebSocket()
+        await manager.connect_player("1", json_ws)
+        await manager.join_room("2", "tg2", "Bob", room.id)
+        await manager.connect_player("2", binary_ws, protocol="msgpack")
+        await manager.ready_player("1")
+        await manager._send_private_message("2", {"type": "pong"})
+        await asyncio.sleep(0.01)
+        return json_ws.frames, binary_ws.frames
+
+    json_frames, binary_frames = asyncio.run(scenario())
+
+    assert all(isinstance(frame, str) for frame in json_frames)
+    assert all(isinstance(frame, bytes) for frame in binary_frames)
+    decoded = [decode_event(frame) for frame in binary_frames]
+    assert [m["type"] for m in decoded] == ["room_snapshot", "player_ready", "pong"]
+    # Событие комнаты одинаково для обоих форматов
+    assert decoded[1] == json.loads(json_frames[-1])
@@ -0,0 +1,44 @@
+import asyncio
+from collections import Counter
+from server.models import GameType, PlayerStatus
+from server.room_actor import Tick
+from server.room_manager import RoomManager
+
+def recount(manager):
+    """Индексы, пересчитанные полным обходом комнат."""
+    players = {p.id: p for room in manager.rooms.values() for p in room.players}
+    statuses = Counter(p.status for p in players.values())
+    ready = {room.id: sum(p.status == PlayerStatus.READY for p in room.players) for room in manager.rooms.values()}
+    return players, statuses, ready
+
+def assert_indexes_consistent(manager):
+    players, statuses, ready = recount(manager)
+    assert manager.player_index == players
+    assert +manager.status_counts == statuses
+    assert {room.id: room.ready_count for room in manager.rooms.values()} == ready
+
+def test_indexes_follow_state_transitions():
+    async def scenario():
+        manager = RoomManager()
+        first = await manager.create_room("1", "tg1", "Alice", GameType.RPS, 100)
+        second = await manager.create_room("3", "tg3", "Carol", GameType.DICE, 50)
+        await manager.join_room("2", "tg2", "Bob", first.id)
+        await manager.ready_player("1")
+        await manager.disconnect_player("3")
+        await asyncio.sleep(0.01)
+        assert_indexes_consistent(manager)
+        assert first.ready_count == 1 and not first.can_start()
+        assert manager._get_player_name("2") == "Bob"
+
+        await manager.ready_player("2")
+        await asyncio.sleep(0.01)
+        assert_indexes_consistent(manager)
+        assert manager.status_counts[PlayerStatus.PLAYING] == 2
+        assert (await manager.stats())["players"] == {"playing": 2, "disconnected": 1}
+
+        await manager.actors[second.id].submit(Tick("cleanup"))
+        return manager
+
+    manager = asyncio.run(scenario())
+    assert_indexes_consistent(manager)
+    assert "3" not in manager.player_index and "3" not in manager.player_to_room
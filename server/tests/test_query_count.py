@@ -0,0 +1,21 @@
+import asyncio
+
+from server.benchmarks.bench_queries import measure
+
+
+def test_reads_do_not_grow_with_players_and_rooms():
+    small = asyncio.run(measure(players=2, rooms=3))
+    large = asyncio.run(measure(players=4, rooms=20))
+    assert {name: counter.reads for name, counter in small.items() if not name.startswith("rooms")} == \
+        {name: counter.reads for name, counter in large.items() if not name.startswith("rooms")}
+    assert large["rooms (20 open)"].count == 1
+    assert large["start-game"].reads == 3   # пользователь, комната, участники с пользователями
+    assert large["dice play"].reads == 2    # комната, участники с пользователями
+    assert large["rps play"].reads == 2
+
+
+def test_settlement_queries_do_not_grow_with_players():
+    small = asyncio.run(measure(players=2, rooms=1))
+    large = asyncio.run(measure(players=8, rooms=1))
+    for name in ("start-game", "finish-game", "dice play", "rps play"):
+        assert small[name].count == large[name].count, name
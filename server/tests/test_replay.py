@@ -0,0 +1,102 @@
+import asyncio
+import json
+from server.models import GameType
+from server.realtime.delta import apply_patch
+from server.realtime.replay import ReplayLog
+from server.room_manager import RoomManager
+
+class FakeWebSocket:
+    def __init__(self):
+        self.messages = []
+
+    async def send_text(self, data):
+        self.messages.append(json.loads(data))
+
+    async def close(self, code=1000):
+        pass
+
+def test_replay_log_returns_missed_events_or_none():
+    log = ReplayLog(capacity=3)
+    for i in range(5):
+        seq = log.next_seq("r1")
+        log.append("r1", seq, f"event-{seq}")
+
+    assert log.last_seq("r1") == 5
+    assert log.since("r1", 3) == ["event-4", "event-5"]
+    assert log.since("r1", 2) == ["event-3", "event-4", "event-5"]
+    assert log.since("r1", 5) == []
+    # Вытеснено из журнала или номер из будущего — только снимок
+    assert log.since("r1", 1) is None
+    assert log.since("r1", 6) is None
+    assert log.since("other", 0) == []
+
+    log.forget("r1")
+    assert log.last_seq("r1") == 0
+
+def test_reconnect_resumes_from_last_seq():
+    async def scenario():
+        manager = RoomManager()
+        manager.replay = ReplayLog(capacity=2)
+        room = await manager.create_room("1", "tg1", "Alice", GameType.DICE, 100)
+        first = FakeWebSocket()
+        await manager.connect_player("1", first)
+        await manager.join_room("2", "tg2", "Bob", room.id)
+        await asyncio.sleep(0.01)
+        await manager.disconnect_player("1")
+
+        # Пока Alice отключена, Bob подтверждает ставку
+        await manager.ready_player("2")
+        second = FakeWebSocket()
+        await manager.connect_player("1", second, resume_from=first.messages[-1]["seq"])
+        await asyncio.sleep(0.01)
+
+        stale = FakeWebSocket()
+        await manager.connect_player("1", stale, resume_from=0)
+        await asyncio.sleep(0.01)
+        return manager, room, first, second, stale
+
+    manager, room, first, second, stale = asyncio.run(scenario())
+
+    snapshot, joined = first.messages
+    assert [m["type"] for m in second.messages] == ["player_disconnected", "player_ready"]
+    assert [m["seq"] for m in second.messages] == [joined["seq"] + 1, joined["seq"] + 2]
+
+    # Пропущенные патчи досылаются по порядку и дают текущее состояние комнаты
+    state = apply_patch(snapshot["room"], joined["patch"])
+    for message in second.messages:
+        state = apply_patch(state, message["patch"])
+    assert state == json.loads(manager.broadcaster.encode(manager.room_states.snapshot(room)))
+
+    # Разрыв больше журнала — полный снимок с текущим seq
+    assert stale.messages[0]["type"] == "room_snapshot"
+    assert stale.messages[0]["seq"] == manager.replay.last_seq(room.id)
+
+def test_resume_after_finish_rebuilds_finished_room():
+    async def scenario():
+        manager = RoomManager()
+        room = await manager.create_room("1", "tg1", "Alice", GameType.RPS, 100)
+        first = FakeWebSocket()
+        await manager.connect_player("1", first)
+        await manager.join_room("2", "tg2", "Bob", room.id)
+        await manager.ready_player("1")
+        await manager.ready_player("2")
+        await manager.handle_rps_choice("1", "rock")
+        await asyncio.sleep(0.01)
+        await manager.disconnect_player("1")
+
+        # Игра завершается, пока Alice отключена
+        await manager.handle_rps_choice("2", "scissors")
+        second = FakeWebSocket()
+        await manager.connect_player("1", second, resume_from=first.messages[-1]["seq"])
+        await asyncio.sleep(0.01)
+        manager.timers.cancel_key(room.id)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+
+    state = first.messages[0]["room"]
+    for message in first.messages[1:] + second.messages:
+        state = apply_patch(state, message["patch"])
+    assert second.messages[-1]["type"] == "game_finished"
+    # Досланные события дают завершённую комнату, а не комнату в игре
+    assert state["status"] == "finished" and state["winner_ids"] == ["1"]
@@ -0,0 +1,80 @@
+import asyncio
+import random
+from server.models import GameType, PlayerStatus, RoomStatus
+from server.room_manager import RoomManager
+
+ROOMS = 500
+COMMANDS = 100_000
+WAVE = 1000
+BET = 100
+START_BALANCE = 1000
+
+def test_interleaved_commands_keep_pot_and_balance_invariants():
+    rng = random.Random(42)
+
+    async def scenario():
+        manager = RoomManager()
+        in_flight = {}
+        overlaps = []
+        dispatch = manager._dispatch
+
+        # Проверяем, что команды одной комнаты никогда не выполняются одновременно
+        async def checked_dispatch(room_id, command):
+            in_flight[room_id] = in_flight.get(room_id, 0) + 1
+            if in_flight[room_id] > 1:
+                overlaps.append(room_id)
+            try:
+                return await dispatch(room_id, command)
+            finally:
+                in_flight[room_id] -= 1
+        manager._dispatch = checked_dispatch
+
+        room_ids = []
+        for r in range(ROOMS):
+            game_type = GameType.DICE if r % 2 else GameType.RPS
+            room = await manager.create_room(f"r{r}-p0", f"tg{r}-0", "p0", game_type, BET)
+            manager.actors[room.id].handler = checked_dispatch
+            room_ids.append(room.id)
+
+        async def command(room_index):
+            room_id = room_ids[room_index]
+            player_id = f"r{room_index}-p{rng.randrange(4)}"
+            kind = rng.choices(["join", "ready", "roll", "choose", "tick"], [20, 25, 25, 25, 5])[0]
+            try:
+                if kind == "join":
+                    await manager.join_room(player_id, "tg" + player_id, player_id, room_id)
+                elif kind == "ready":
+                    await manager.ready_player(player_id)
+                elif kind == "roll":
+                    await manager.handle_dice_action(player_id, room_id, "roll")
+                elif kind == "choose":
+                    await manager.handle_rps_choice(player_id, rng.choice(["rock", "paper", "scissors"]))
+                else:
+                    await manager._tick(room_id, rng.choices(["room_wait", "rps_choice", "reroll"], [1, 5, 4])[0])
+            except ValueError:
+                pass  # Игра ещё не началась или комната уже закрыта
+
+        # Команды отправляются волнами: внутри волны все команды конкурируют друг с другом
+        for _ in range(COMMANDS // WAVE):
+            await asyncio.gather(*(command(rng.randrange(ROOMS)) for _ in range(WAVE)))
+        return manager, overlaps
+
+    manager, overlaps = asyncio.run(scenario())
+
+    assert overlaps == []
+    statuses = set()
+    for room in manager.rooms.values():
+        statuses.add(room.status)
+        initial = START_BALANCE * len(room.players)
+        balances = sum(p.balance for p in room.players)
+        assert all(p.balance >= 0 for p in room.players)
+        if room.status in (RoomStatus.WAITING, RoomStatus.PLAYING):
+            locked = [p for p in room.players if p.status in (PlayerStatus.READY, PlayerStatus.PLAYING)]
+            assert room.pot == BET * len(locked)
+            assert balances + room.pot == initial
+        elif room.status == RoomStatus.CANCELLED:
+            assert balances == initial
+        else:
+            # Выплачен весь банк, кроме остатка от деления между победителями
+            assert 0 <= initial - balances < len(room.players)
+    assert RoomStatus.FINISHED in statuses
@@ -0,0 +1,168 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+import pytest
+from server.models import GameType, RoomStatus
+from server.room_manager import RoomManager
+from server.room_store import MemoryRoomStore, RedisRoomStore
+from server.runtime_models import RuntimePlayer, RuntimeRoom
+
+class FakeWebSocket:
+    def __init__(self):
+        self.messages = []
+
+    async def send_text(self, data):
+        self.messages.append(json.loads(data))
+
+    async def close(self, code=1000):
+        pass
+
+def redis_store(server=None):
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisRoomStore(fakeredis.FakeAsyncRedis(server=server or fakeredis.FakeServer()))
+
+def make_room(room_id, bet, created_at, game_type=GameType.DICE):
+    player = RuntimePlayer(id=f"{room_id}-p", telegram_id="tg", username="p", balance=1000, bet_amount=bet)
+    return RuntimeRoom(id=room_id, game_type=game_type, players=[player], bet_amount=bet, created_at=created_at)
+
+@pytest.mark.parametrize("backend", ["memory", "redis"])
+def test_store_rooms_players_and_open_index(backend):
+    async def scenario():
+        store = MemoryRoomStore() if backend == "memory" else redis_store()
+        now = datetime.now()
+        rooms = [make_room("a", 200, now), make_room("c", 100, now),
+                 make_room("b", 100, now + timedelta(seconds=1)), make_room("d", 500, now, GameType.RPS)]
+        for room in rooms:
+            await store.save_room(room)
+            await store.set_player_room(room.players[0].id, room.id)
+
+        assert await store.first_open(GameType.DICE, 100) == "c"
+        assert await store.open_rooms(GameType.DICE) == ["c", "b", "a"]
+        assert await store.open_rooms(GameType.DICE, max_bet=150) == ["c", "b"]
+        assert await store.open_rooms(GameType.RPS, max_bet=100) == []
+
+        # Начавшаяся игра выходит из матчмейкинга, но комната остаётся доступной
+        rooms[1].status = RoomStatus.PLAYING
+        await store.save_room(rooms[1])
+        assert await store.first_open(GameType.DICE, 100) == "b"
+        assert (await store.get_room("c")).status == RoomStatus.PLAYING
+
+        await store.delete_room(rooms[2])
+        assert await store.get_room("b") is None
+        assert await store.get_player_room("b-p") is None
+        assert await store.get_player_room("a-p") == "a"
+        assert [room.id for room in await store.get_rooms(["a", "b", "c"])] == ["a", "c"]
+        assert await store.open_rooms(GameType.DICE) == ["a"]
+    asyncio.run(scenario())
+
+def test_two_nodes_share_lobby_and_events():
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def scenario():
+        server = fakeredis.FakeServer()
+        node_a = RoomManager(store=redis_store(server))
+        node_b = RoomManager(store=redis_store(server))
+
+        room = await node_a.create_room("1", "tg1", "Alice", GameType.DICE, 100)
+        # Игрок подключён ко второму узлу, а комнатой владеет первый
+        ws = FakeWebSocket()
+        await node_b.connect_player("2", ws)
+        await node_a.join_room("2", "tg2", "Bob", room.id)
+        await asyncio.sleep(0.05)
+
+        available = await node_b.available_rooms(GameType.DICE)
+        info = await node_b.room_info(room.id)
+        await node_a.store.close()
+        await node_b.store.close()
+        return room, available, info, ws.messages
+
+    room, available, info, messages = asyncio.run(scenario())
+
+    assert [r.id for r in available] == [room.id]
+    assert info["version"] == room.version
+    assert [p["id"] for p in info["room"]["players"]] == ["1", "2"]
+    assert [m["type"] for m in messages] == ["player_joined"]
+
+def test_memory_store_is_view_over_manager_indexes():
+    async def scenario():
+        manager = RoomManager()
+        room = await manager.create_room("1", "tg1", "Alice", GameType.DICE, 100)
+        return manager, room, await manager.store.first_open(GameType.DICE, 100), await manager.store.get_player_room("1")
+    manager, room, first, player_room = asyncio.run(scenario())
+    # Второй копии комнат, привязок и матчмейкера нет
+    assert manager.store.rooms is manager.rooms
+    assert manager.store.player_to_room is manager.player_to_room
+    assert manager.store.index is manager.matchmaker
+    assert first == room.id and player_room == room.id
+
+def test_second_node_matches_and_plays_in_remote_room():
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def scenario():
+        server = fakeredis.FakeServer()
+        node_a = RoomManager(store=redis_store(server))
+        node_b = RoomManager(store=redis_store(server))
+        try:
+            room = await node_a.create_room("1", "tg1", "Alice", GameType.DICE, 100)
+            ws = FakeWebSocket()
+            await node_b.connect_player("2", ws)
+            # Матчмейкинг второго узла находит комнату первого, присоединение выполняет владелец
+            matched, created = await node_b.auto_match("2", "tg2", "Bob", GameType.DICE, 100)
+            await node_b.resync_player("2")  # Снимок комнаты другого узла
+            await node_a.ready_player("1")
+            ready = await node_b.ready_player("2")
+            await node_b.handle_dice_action("2", room.id, "roll")
+            await asyncio.sleep(0.05)
+            player = node_a.player_index["2"]
+            return room, matched, created, ready, player, node_b.rooms, ws.messages
+        finally:
+            await node_a.store.close()
+            await node_b.store.close()
+
+    room, matched, created, ready, player, b_rooms, messages = asyncio.run(scenario())
+
+    assert matched.id == room.id and not created
+    assert [p.id for p in matched.players] == ["1", "2"]
+    assert ready.status == RoomStatus.PLAYING and b_rooms == {}
+    types = [m["type"] for m in messages]
+    assert types[:2] == ["player_joined", "room_snapshot"] and "game_start" in types
+    assert [p["id"] for p in messages[1]["room"]["players"]] == ["1", "2"]
+    # Бросок со второго узла выполнен актором комнаты на первом
+    assert "dice_roll_result" in types and player.status.value == "playing"
+
+def test_redis_listener_reconnects_after_connection_error():
+    fakeredis = pytest.importorskip("fakeredis")
+    from redis.exceptions import ConnectionError as RedisConnectionError
+
+    class BrokenPubSub:
+        async def subscribe(self, *channels):
+            pass
+
+        async def listen(self):
+            raise RedisConnectionError("Connection reset by peer")
+            yield
+
+        async def aclose(self):
+            pass
+
+    async def scenario():
+        store = RedisRoomStore(fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer()), reconnect_delay=0.01)
+        connect = store.client.pubsub
+        attempts = []
+
+        def pubsub():
+            attempts.append(1)
+            return BrokenPubSub() if len(attempts) <= 2 else connect()
+
+        store.client.pubsub = pubsub
+        received = []
+        await store.subscribe(lambda recipients, frame, key: received.append(frame))
+        await asyncio.sleep(0.1)
+        await store.publish(["1"], "frame-after-reconnect")
+        await asyncio.sleep(0.05)
+        await store.close()
+        return store, received
+
+    store, received = asyncio.run(scenario())
+    assert store.reconnects == 2
+    assert received == ["frame-after-reconnect"]
@@ -0,0 +1,34 @@
+import json
+from datetime import datetime
+from server.models import GameType, PlayerStatus, Room, RoomStatus
+from server.realtime.broadcast import BroadcastEngine
+from server.runtime_models import RuntimePlayer, RuntimeRoom
+
+def make_room():
+    room = RuntimeRoom(id="r1", game_type=GameType.RPS, bet_amount=100, created_at=datetime.now())
+    room.players.append(RuntimePlayer(id="1", telegram_id="tg1", username="Alice", balance=900,
+                                      status=PlayerStatus.READY, bet_amount=100, is_creator=True))
+    room.players.append(RuntimePlayer(id="2", telegram_id="tg2", username="Bob", balance=1000))
+    room.pot = 100
+    room.version = 3
+    return room
+
+def test_to_dict_matches_api_schema():
+    room = make_room()
+    assert Room(**room.to_dict()).dict() == room.to_dict()
+    assert "version" not in room.to_dict(include_version=False)
+
+def test_roundtrip_through_json():
+    room = make_room()
+    restored = RuntimeRoom.from_dict(json.loads(BroadcastEngine().encode(room.to_dict())))
+    assert restored.to_dict() == room.to_dict()
+    assert restored.status == RoomStatus.WAITING and restored.players[0].status == PlayerStatus.READY
+    assert restored.can_join() and not restored.can_start()
+
+def test_to_dict_is_a_snapshot():
+    room = make_room()
+    snapshot = room.to_dict()
+    room.players[0].balance = 0
+    room.winner_ids.append("1")
+    assert snapshot["players"][0]["balance"] == 900
+    assert snapshot["winner_ids"] == []
@@ -0,0 +1,37 @@
+import asyncio
+from server.scheduler import TimerScheduler
+
+def test_timers_fire_in_order_and_cancel_by_key():
+    async def scenario():
+        timers = TimerScheduler()
+        fired = []
+        async def record(name):
+            fired.append(name)
+        timers.call_later(0.03, record, "late", key="room1", kind="cleanup")
+        timers.call_later(0.01, record, "early", key="room2", kind="room_wait")
+        handle = timers.call_later(0.02, record, "cancelled", key="room2", kind="rps_choice")
+        assert timers.metrics()["pending_by_kind"] == {"cleanup": 1, "room_wait": 1, "rps_choice": 1}
+        assert handle.cancel()
+        assert not handle.cancel()
+        timers.call_later(0.02, record, "room3", key="room3")
+        assert timers.cancel_key("room3") == 1
+        await asyncio.sleep(0.06)
+        return timers, fired
+    timers, fired = asyncio.run(scenario())
+    assert fired == ["early", "late"]
+    metrics = timers.metrics()
+    assert metrics["pending"] == 0
+    assert metrics["fired"] == 2
+    assert metrics["cancelled"] == 2
+
+def test_earlier_timer_rearms_scheduler():
+    async def scenario():
+        timers = TimerScheduler()
+        fired = asyncio.Event()
+        async def done():
+            fired.set()
+        timers.call_later(10, done)
+        timers.call_later(0.01, done)
+        await asyncio.wait_for(fired.wait(), 1)
+        return timers
+    assert asyncio.run(scenario()).metrics()["pending"] == 1
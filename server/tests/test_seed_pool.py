@@ -0,0 +1,71 @@
+import asyncio
+import hashlib
+from server.games import fair_dice
+from server.games.dice_game import DiceGame
+from server.games.seed_pool import SeedPool
+from server.models import GameType, Player
+from server.room_manager import RoomManager
+
+def test_pool_take_and_refill():
+    async def scenario():
+        pool = SeedPool(size=8, low_water=4, batch=3)
+        pool.fill()
+        taken = [pool.take() for _ in range(5)]
+        for seed, seed_hash in taken:
+            assert hashlib.sha256(seed.encode()).hexdigest() == seed_hash
+        assert len({seed for seed, _ in taken}) == 5
+        await asyncio.sleep(0.01)
+        assert pool.stats() == {"available": 8, "taken": 5, "misses": 0}
+
+        empty = SeedPool(size=2)
+        empty.take()
+        assert empty.misses == 1
+    asyncio.run(scenario())
+
+def test_dice_game_keeps_commitment_across_rerolls():
+    players = [Player(id=pid, telegram_id=pid, username=pid, balance=100) for pid in ("1", "2")]
+    seed, seed_hash = SeedPool(size=1).take()
+    game = DiceGame("room", players, bet_amount=10, seed=seed, seed_hash=seed_hash)
+    state = game.get_game_state()
+    assert state["game_seed_hash"] == seed_hash and "game_seed" not in state
+    nonce = game.nonce
+    game.prepare_reroll()
+    game._prepare_reroll()
+    assert (game.game_seed, game.nonce, game.round_number) == (seed, nonce, 3)
+
+def test_verify_batch():
+    seed, nonce = "s" * 64, "n"
+    seed_hash = fair_dice.commitment(seed)
+    dice = fair_dice.roll_dice(seed, nonce, "p1", 2)
+    other = fair_dice.roll_dice(seed, nonce, "p2", 1)
+    rounds = [
+        {"seed": seed, "nonce": nonce, "player_id": "p1", "round": 2, "dice1": dice[0], "dice2": dice[1], "seed_hash": seed_hash},
+        {"seed": seed, "nonce": nonce, "player_id": "p2", "round": 1, "dice1": other[0], "dice2": other[1] % 6 + 1},
+        {"seed": seed, "nonce": nonce, "player_id": "p1", "round": 2, "dice1": dice[0], "dice2": dice[1], "seed_hash": "0" * 64},
+    ]
+    results = fair_dice.verify_batch(rounds)
+    assert [r["valid"] for r in results] == [True, False, False]
+    assert [r["commitment_ok"] for r in results] == [True, None, False]
+    assert results[1]["dice"] == list(other)
+
+def test_seed_hidden_until_results():
+    async def scenario():
+        manager = RoomManager()
+        room = await manager.create_room("1", "tg1", "Alice", GameType.DICE, 10)
+        await manager.join_room("2", "tg2", "Bob", room.id)
+        await manager.ready_player("1")
+        await manager.ready_player("2")
+        await asyncio.sleep(0.01)
+        game = manager.game_engines[room.id]
+        snapshot = room.to_dict()
+        assert snapshot["game_seed"] is None
+        assert snapshot["game_state"]["seed_hash"] == fair_dice.commitment(game.game_seed)
+        while not game.game_finished:
+            for player in ("1", "2"):
+                await manager.handle_dice_action(player, room.id, "roll")
+            if not game.game_finished:
+                assert room.game_seed is None
+                await manager._tick(room.id, "reroll")  # Ничья: не ждём таймер переброса
+        assert room.game_seed == game.game_seed
+        manager.heartbeat.stop()
+    asyncio.run(scenario())
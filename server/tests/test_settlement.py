@@ -0,0 +1,58 @@
+import pytest
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from server.database_sqlite import Base, GameParticipation, GameRoom, Transaction, User
+from server.games.database_rps import DatabaseRPSGame
+from server.settlement import AlreadySettled, Payout, settle_room
+
+
+def make_room(players, status="in_progress", bet=10):
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    sessions = sessionmaker(engine)
+    with sessions() as db:
+        db.execute(insert(User), [
+            {"id": f"u{i}", "telegram_id": f"tg{i}", "username": f"user{i}", "stars_balance": 100, "total_games": 0, "wins": 0}
+            for i in range(players)
+        ])
+        db.add(GameRoom(id="r1", game_type="rps", status=status, bet_amount=bet, creator_id="u0",
+                        prize_pool=bet * players, current_players=players))
+        db.execute(insert(GameParticipation), [{"room_id": "r1", "user_id": f"u{i}"} for i in range(players)])
+        db.commit()
+    return sessions
+
+
+def test_settle_room_applies_payouts_in_one_pass():
+    sessions = make_room(3)
+    with sessions() as db:
+        settle_room(db, "r1", [
+            Payout("u0", prize=30, won=True, position=1, score=12, player_data={"total": 12}, description="win"),
+            Payout("u1", position=2, score=5),
+            Payout("u2", position=2, score=7),
+        ], {"winner_ids": ["u0"]})
+        db.commit()
+
+        users = {u.id: (u.stars_balance, u.total_games, u.wins) for u in db.scalars(select(User))}
+        assert users == {"u0": (130, 1, 1), "u1": (100, 1, 0), "u2": (100, 1, 0)}
+        participations = {p.user_id: (p.position, p.score, p.prize_won) for p in db.scalars(select(GameParticipation))}
+        assert participations == {"u0": (1, 12, 30), "u1": (2, 5, 0), "u2": (2, 7, 0)}
+        assert [(t.user_id, t.type, t.amount, t.room_id) for t in db.scalars(select(Transaction))] == \
+            [("u0", "game_win", 30, "r1")]
+        room = db.get(GameRoom, "r1")
+        assert (room.status, room.game_data) == ("finished", {"winner_ids": ["u0"]})
+
+        with pytest.raises(AlreadySettled):
+            settle_room(db, "r1", [Payout("u0", prize=30, won=True)], {})
+        db.rollback()
+        assert db.get(User, "u0").stars_balance == 130
+
+
+def test_rps_full_draw_refunds_every_bet():
+    sessions = make_room(3)
+    with sessions() as db:
+        result = DatabaseRPSGame("r1", db).play_round({"tg0": "rock", "tg1": "paper", "tg2": "scissors"})
+        assert result["winners"] == []
+        assert sorted(u.stars_balance for u in db.scalars(select(User))) == [110, 110, 110]
+        assert {t.type for t in db.scalars(select(Transaction))} == {"game_refund"}
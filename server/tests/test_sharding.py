@@ -0,0 +1,148 @@
+import asyncio
+import json
+from collections import Counter
+from server.config import settings
+from server.models import GameType, PlayerStatus, RoomStatus
+from server.sharding import HashRing, ShardPool, ShardedRoomManager
+from server.sharding.worker import ShardServer
+
+class FakeWebSocket:
+    def __init__(self):
+        self.messages = []
+
+    async def send_text(self, data):
+        self.messages.append(json.loads(data))
+
+    async def close(self, code=1000):
+        pass
+
+def test_ring_is_balanced_and_stable():
+    keys = [f"room-{i}" for i in range(20000)]
+    ring = HashRing(4)
+    load = Counter(ring.shard_for(key) for key in keys)
+    assert all(abs(count - 5000) < 1000 for count in load.values())
+
+    # При добавлении шарда переезжает примерно 1/5 комнат, и только на новый шард
+    grown = HashRing(5)
+    moved = [key for key in keys if ring.shard_for(key) != grown.shard_for(key)]
+    assert len(moved) < len(keys) * 0.3
+    assert all(grown.shard_for(key) == 4 for key in moved)
+
+def test_rooms_routed_to_owning_shard_with_websocket_events(monkeypatch):
+    # Шарды — отдельные процессы с настройками из окружения: демо-балансы, без записи в базу
+    monkeypatch.setenv("LEDGER", "off")
+    monkeypatch.setenv("GAME_HISTORY", "off")
+
+    async def scenario():
+        pool = ShardPool(2)
+        manager = ShardedRoomManager(pool.socket_paths, pool)
+        try:
+            rooms = [await manager.create_room(f"c{i}", f"tg{i}", f"c{i}", GameType.DICE, 100) for i in range(20)]
+            snapshot = await manager.debug_snapshot()
+            for shard in snapshot["shards"]:
+                owned = {room.id for room in rooms if manager.ring.shard_for(room.id) == shard["shard"]}
+                assert set(shard["rooms"]) == owned
+
+            room = rooms[0]
+            ws = FakeWebSocket()
+            await manager.connect_player("p2", ws)
+            joined = await manager.join_room("p2", "tg-p2", "Bob", room.id)
+            await manager.ready_player("c0")
+            ready = await manager.ready_player("p2")
+            info = await manager.room_info(room.id)
+            stats = await manager.stats()
+            await asyncio.sleep(0.05)
+            return joined, ready, info, stats, ws.messages
+        finally:
+            await manager.close()
+
+    joined, ready, info, stats, messages = asyncio.run(scenario())
+
+    assert [p.id for p in joined.players] == ["c0", "p2"]
+    assert ready.status == RoomStatus.PLAYING
+    assert all(p.status == PlayerStatus.PLAYING for p in ready.players)
+    assert info["version"] == ready.version
+    assert stats["rooms_count"] == 20 and len(stats["shards"]) == 2
+    # Фреймы шарда доходят до WebSocket в процессе маршрутизатора
+    types = [m["type"] for m in messages]
+    assert types[0] == "room_snapshot"
+    assert "game_start" in types
+
+def test_room_cleanup_prunes_router_and_rejoin_goes_to_other_shard(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "LEDGER", "off")
+    monkeypatch.setattr(settings, "GAME_HISTORY", "off")
+
+    async def scenario():
+        # Шарды в этом же процессе: удаление комнаты запускается напрямую, без ожидания таймеров
+        paths = [str(tmp_path / f"shard-{i}.sock") for i in range(2)]
+        shards = [ShardServer(i, path) for i, path in enumerate(paths)]
+        servers = [await asyncio.start_unix_server(shard._handle_client, path=shard.socket_path) for shard in shards]
+        manager = ShardedRoomManager(paths)
+        try:
+            first = await manager.create_room("c0", "tg0", "Alice", GameType.DICE, 100)
+            owner = manager.ring.shard_for(first.id)
+            await manager.join_room("p1", "tg1", "Bob", first.id)
+            assert manager.player_to_room["p1"] == first.id
+
+            await shards[owner].manager._tick(first.id, "cleanup")
+            await asyncio.sleep(0.05)
+            pruned = dict(manager.player_to_room)
+
+            # Новая комната того же игрока живёт в другом шарде
+            other = first
+            while manager.ring.shard_for(other.id) == owner:
+                other = await manager.create_room(f"c-{other.id}", "tg2", "Carol", GameType.DICE, 100)
+            rejoined = await manager.join_room("p1", "tg1", "Bob", other.id)
+            ready = await manager.ready_player("p1")
+            return first, pruned, other, rejoined, ready, manager.player_to_room["p1"]
+        finally:
+            await manager.close()
+            for server in servers:
+                server.close()
+            for shard in shards:
+                await shard.manager.close()
+
+    first, pruned, other, rejoined, ready, current = asyncio.run(scenario())
+
+    assert "c0" not in pruned and "p1" not in pruned
+    assert rejoined.id == other.id and current == other.id
+    # ready ушёл в шард новой комнаты, а не в удалённую комнату старого шарда
+    assert ready.id == other.id
+    assert next(p for p in ready.players if p.id == "p1").status == PlayerStatus.READY
+
+def test_router_keeps_player_in_one_room(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "LEDGER", "off")
+    monkeypatch.setattr(settings, "GAME_HISTORY", "off")
+
+    async def scenario():
+        paths = [str(tmp_path / f"shard-{i}.sock") for i in range(2)]
+        shards = [ShardServer(i, path) for i, path in enumerate(paths)]
+        servers = [await asyncio.start_unix_server(shard._handle_client, path=shard.socket_path) for shard in shards]
+        manager = ShardedRoomManager(paths)
+        try:
+            rooms = [await manager.create_room("c0", "tg0", "c0", GameType.DICE, 100)]
+            while manager.ring.shard_for(rooms[-1].id) == manager.ring.shard_for(rooms[0].id):
+                rooms.append(await manager.create_room(f"c{len(rooms)}", "tg", "c", GameType.DICE, 100))
+            rooms = [rooms[0], rooms[-1]]
+            # Одновременный вход в комнаты разных шардов: шарды не знают друг о друге
+            entered = await asyncio.gather(*(manager.join_room("p1", "tg-p1", "Bob", room.id) for room in rooms))
+            try:
+                await manager.create_room("p1", "tg-p1", "Bob", GameType.DICE, 100)
+                created = True
+            except ValueError:
+                created = False
+            infos = [await manager.get_room(room.id) for room in rooms]
+            return entered, created, infos, manager.player_to_room["p1"]
+        finally:
+            await manager.close()
+            for server in servers:
+                server.close()
+            for shard in shards:
+                await shard.manager.close()
+
+    entered, created, infos, current = asyncio.run(scenario())
+
+    assert [room is not None for room in entered] == [True, False]
+    assert not created
+    assert current == entered[0].id
+    assert [[p.id for p in info.players if p.id == "p1"] for info in infos] == [["p1"], []]